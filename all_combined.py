@@ -2,82 +2,184 @@
 
 import generate_input
 import interleaving as il
+import budget_scheduler
 import click_model_v2 as cm
 import power_analysis as pa
+import results_store
+import stratified_sampler
+import sweep
+import work_queue
+from functools import partial
+from itertools import chain
+from instrumentation import metrics
+from simulation_memo import SimulationMemo
 
 
-def main():
+def main(n_workers=None, root_seed=0, memo_path='./simulation_memo.db',
+        queue_path=None, results_path='./sweep_results.csv', budget=None,
+        metrics_path=None, n_per_bin=None, n_conflicts=None,
+        report_path=None):
 
-    length_interleaving = 3
-
-    inputs = generate_input.gen_input_pairs(length_interleaving, 2)
-
-    #Click model training
-    print('LOG :: TRAINING')
-    rcm = cm.RCM()
-    pbm = cm.PBM()
-    database = cm.read_yandex("./YandexRelPredChallenge.txt")
-    rcm.learn(database, length_interleaving)
-    pbm.learn(database, 3, 5, length_interleaving)
-    print('LOG :: DONE TRAINING')
+    if metrics_path is not None:
+        metrics.stream = open(metrics_path, 'a')
 
+    length_interleaving = 3
     n_simulations = 500
-    click_model_fs = [rcm.get_clicks, pbm.get_clicks]
-    interleaving_fs = [il.td_interleaving, il.prob_interleaving]
-    bin_set_labels = [
-        'RCM & Team-Draft Interleaving',
-        'RCM & Probabilistic Interleaving',
-        'PBM & Team-Draft Interleaving',
-        'PBM & Probabilistic Interleaving'
+    memo = SimulationMemo(memo_path, root_seed)
+
+    click_model_names = ['RCM', 'PBM']
+    interleaving_fs = [il.td_interleaving, il.prob_interleaving,
+        il.optimized_interleaving]
+    interleaving_names = [
+        'Team-Draft Interleaving',
+        'Probabilistic Interleaving',
+        'Optimized Interleaving'
     ]
+    bin_set_labels = [click_model_name + ' & ' + interleaving_name
+        for click_model_name in click_model_names
+        for interleaving_name in interleaving_names]
 
     n_bins = 10
     cut_sides = 0.05
-    bins = [[[] for _ in range(n_bins)]
-        for _ in range(len(bin_set_labels))]
-
-    for l, pair in enumerate(inputs):
-
-        print('LOG :: ' + str(l + 1) + ' / ' + str(len(inputs))
-            + ' INPUTS')
-
-        dERR = generate_input.ERR(pair[1]) - generate_input.ERR(pair[0])
-        if dERR >= cut_sides and dERR < 1.0 - cut_sides:
-
-            for i, click_model_f in enumerate(click_model_fs):
-                for j, interleaving_f in enumerate(interleaving_fs):
 
-                    ij = i*len(interleaving_fs)+j
-                    print('  LOG :: ' + str(ij + 1) + ' / '
-                        + str(len(bins)) + ' BINS')
-
-                    permutations = generate_input.add_conflicts(pair)
-
-                    for k, permutation in enumerate(permutations):
-
-                        print('    LOG :: ' + str(k + 1) + ' / '
-                            + str(len(permutations)) + ' PERMUTATIONS')
-
-                        p = pa.interleaving_simulation(
-                            permutation, n_simulations,
-                            interleaving_f, click_model_f,
-                            length_interleaving)
-                        bins[ij][int(dERR * 10)].append(
-                            pa.compute_sample_size(p))
+    with metrics.stage('tasks'):
+        if n_per_bin is None:
+            inputs = generate_input.iter_input_pairs(length_interleaving, 2)
+        else:
+            # Draw pairs per bin instead of enumerating all of them.
+            inputs = stratified_sampler.sample_input_pairs(
+                length_interleaving, 2, n_per_bin, n_bins, cut_sides,
+                seed=root_seed)
+        conflicts_func = generate_input.add_conflicts
+        if n_conflicts is not None:
+            conflicts_func = partial(stratified_sampler.sample_conflicts,
+                k=n_conflicts, seed=root_seed)
+        tasks = sweep.get_tasks(inputs, len(click_model_names),
+            len(interleaving_fs), n_bins, cut_sides,
+            conflicts_func=conflicts_func)
+
+    # Resume from the results of earlier runs.
+    settings = {
+        'length_interleaving' : length_interleaving,
+        'n_simulations' : n_simulations,
+        'root_seed' : root_seed,
+        'cut_sides' : cut_sides,
+        'bin_set_labels' : bin_set_labels,
+        'budget' : budget
+    }
+    if n_per_bin is not None or n_conflicts is not None:
+        settings['n_per_bin'] = n_per_bin
+        settings['n_conflicts'] = n_conflicts
+    store = results_store.ResultsStore(results_path, settings)
+    done = store.get_done()
+    todo = [task for task in tasks if task[0] not in done]
+    metrics.emit('resume', stored=len(done), total=len(tasks))
+
+    if todo != []:
+
+        #Click model training
+        rcm = cm.RCM()
+        pbm = cm.PBM()
+        with metrics.stage('read_log'):
+            database = cm.read_yandex("./YandexRelPredChallenge.txt")
+        with metrics.stage('train_rcm'):
+            rcm.learn(database, length_interleaving)
+        with metrics.stage('train_pbm'):
+            pbm.learn(database, 3, 5, length_interleaving)
+
+        click_model_fs = [rcm.get_clicks, pbm.get_clicks]
+
+        with metrics.stage('simulate', n_tasks=len(todo)):
+            n_todo = len(todo)
+            hits = []
+            if budget is None:
+                # Stored outcomes are neither simulated nor counted
+                # as simulations.
+                hits, todo = sweep.split_memo_hits(todo, memo,
+                    click_model_fs, interleaving_fs, n_simulations,
+                    length_interleaving)
+            if budget is not None:
+                # Spread the budget over the tasks instead of simulating
+                # each of them n_simulations times. A resumed run schedules
+                # all tasks again, so it spends the budget as a run that
+                # was not interrupted; batches are seeded by task and index
+                # and finished ones are read from the memo.
+                results = (result for result in budget_scheduler.schedule(
+                    tasks, click_model_fs, interleaving_fs,
+                    length_interleaving, budget, n_workers=n_workers,
+                    root_seed=root_seed, memo=memo) if result[0] not in done)
+            elif queue_path is None:
+                results = sweep.run_sweep(todo, click_model_fs,
+                    interleaving_fs, n_simulations, length_interleaving,
+                    n_workers, root_seed=root_seed, memo=memo,
+                    func=sweep.run_task_timed)
+            else:
+                # Workers started with work_queue.py drain the queue.
+                results = work_queue.coordinate(queue_path, todo,
+                    (click_model_fs, interleaving_fs, n_simulations,
+                    length_interleaving, root_seed, memo))
+
+            # Seconds spent simulating per method, summed over workers.
+            seconds = {}
+            for l, result in enumerate(chain(hits, results)):
+                task_id, i, j, _, p, counts = result[:6]
+                label = bin_set_labels[i * len(interleaving_names) + j]
+
+                metrics.count('tasks')
+                if l < len(hits):
+                    metrics.count('memo_hits')
+                else:
+                    metrics.count('simulations', sum(counts))
+                    metrics.count('ties', counts[2])
+                    metrics.count('simulations:' + label, sum(counts))
+                if len(result) > 6:
+                    seconds[label] = seconds.get(label, 0.0) + result[6]
+                if (l + 1) % 100 == 0 or l + 1 == n_todo:
+                    metrics.emit('progress', done=l + 1, total=n_todo)
+
+                store.append(tasks[task_id], click_model_names[i],
+                    interleaving_names[j], p, counts)
+
+            for label, method_seconds in seconds.items():
+                n = metrics.counters['simulations:' + label]
+                metrics.emit('method', method=label, simulations=n,
+                    seconds=round(method_seconds, 6),
+                    per_second=n / method_seconds)
+
+    store.close()
+    memo.close()
+
+    with metrics.stage('bins'):
+        rows = store.read()
+        _, bins = results_store.get_bins(rows, n_bins, cut_sides,
+            bin_set_labels=bin_set_labels)
+    with metrics.stage('bootstrap'):
+        _, cis = results_store.get_bootstrap_cis(rows, n_bins, cut_sides,
+            bin_set_labels=bin_set_labels, seed=root_seed)
 
     bin_sets = []
     bin_labels = pa.get_bin_labels(n_bins)
-    for bin_set, label in zip(bins, bin_set_labels):
+    for bin_set, bin_cis, label in zip(bins, cis, bin_set_labels):
         print('===== ' + label + ' =====')
         bin_info = pa.process_bins(bin_set)
+        for info, ci in zip(bin_info, bin_cis):
+            if info['has_info']:
+                info.update(ci)
         pa.print_bin_info(bin_info)
         bin_sets.append(bin_info)
 
-    pa.plot_bin_info(bin_sets, bin_set_labels, bin_labels)
+    metrics.print_summary()
+    if metrics_path is not None:
+        metrics.stream.close()
+        metrics.stream = None
+
+    if report_path is None:
+        pa.plot_bin_info(bin_sets, bin_set_labels, bin_labels)
+    else:
+        # Render to files for runs without a display.
+        pa.write_report(bin_sets, bin_set_labels, bin_labels, report_path)
 
     return
 
 if __name__ == '__main__':
     main()
-
-
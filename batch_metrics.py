@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+
+from collections import OrderedDict
+from functools import partial
+
+import numpy as np
+
+import generate_input
+
+
+# Number of metric tables kept per process, the least recently used
+# table is dropped first.
+MAX_TABLES = 16
+# Metric values of all lists, by metric, length and number of grades.
+_tables = OrderedDict()
+
+def get_relevance_table(max_grade):
+    """Creates a table of probabilities of relevance of `generate_input.ERR`,
+    in which grades are normalized by the maximum grade of their list.
+
+    Parameters
+    ----------
+    max_grade : int
+        Highest relevance grade.
+
+    Returns
+    -------
+    out : numpy array
+        Array in which `out[max_g, g]` is the probability of relevance
+        of grade `g` in a list of which the maximum grade is `max_g`.
+    """
+    g = np.arange(max_grade + 1)
+    return (2.0 ** g - 1)[None, :] / 2.0 ** g[:, None]
+
+def err(grades):
+    """Calculates Expected Reciprocal Rank for every row of a matrix
+    of relevance grades, with the same results as `generate_input.ERR`.
+
+    Parameters
+    ----------
+    grades : numpy array
+        Integer array of shape (number of lists, length).
+
+    Returns
+    -------
+    out : numpy array
+        Expected Reciprocal Rank of every list.
+    """
+    grades = np.asarray(grades)
+    out = np.zeros(len(grades))
+    if grades.size == 0:
+        return out
+    max_g = grades.max(axis=1)
+    R = get_relevance_table(int(grades.max()))[max_g[:, None], grades]
+    p = np.ones(len(grades))
+    # Ranks are added in the order of `generate_input.ERR`,
+    # which keeps the results identical.
+    for r in range(1, grades.shape[1] + 1):
+        out += p * R[:, r - 1] / float(r)
+        p *= 1 - R[:, r - 1]
+    return out
+
+def ndcg(grades, k=None):
+    """Calculates normalized Discounted Cumulative Gain at rank `k`
+    for every row of a matrix of relevance grades. Lists without
+    relevant documents get 0.
+
+    Parameters
+    ----------
+    grades : numpy array
+        Integer array of shape (number of lists, length).
+    k : int
+        Rank up to which gains are counted, defaults to the length.
+
+    Returns
+    -------
+    out : numpy array
+        nDCG of every list.
+    """
+    grades = np.asarray(grades)[:, :k]
+    discounts = 1 / np.log2(np.arange(2, grades.shape[1] + 2))
+    dcg = ((2.0 ** grades - 1) * discounts).sum(axis=1)
+    ideal = -np.sort(-grades, axis=1)
+    idcg = ((2.0 ** ideal - 1) * discounts).sum(axis=1)
+    out = np.zeros(len(grades))
+    np.divide(dcg, idcg, out=out, where=idcg > 0)
+    return out
+
+def rbp(grades, persistence=0.8, max_grade=1):
+    """Calculates Rank-Biased Precision for every row of a matrix
+    of relevance grades.
+
+    Parameters
+    ----------
+    grades : numpy array
+        Integer array of shape (number of lists, length).
+    persistence : float
+        Probability that a user continues to the next rank.
+    max_grade : int
+        Grade that counts as fully relevant, lower grades count
+        in proportion and higher grades as fully relevant.
+
+    Returns
+    -------
+    out : numpy array
+        RBP of every list.
+    """
+    grades = np.asarray(grades)
+    relevance = np.minimum(grades, max_grade) / float(max_grade)
+    weights = (1 - persistence) * persistence ** np.arange(grades.shape[1])
+    return (relevance * weights).sum(axis=1)
+
+def precision(grades, k=None, threshold=1):
+    """Calculates precision at rank `k` for every row of a matrix
+    of relevance grades.
+
+    Parameters
+    ----------
+    grades : numpy array
+        Integer array of shape (number of lists, length).
+    k : int
+        Rank up to which documents are counted, defaults to the length.
+    threshold : int
+        Lowest grade that counts as relevant.
+
+    Returns
+    -------
+    out : numpy array
+        Precision of every list.
+    """
+    grades = np.asarray(grades)[:, :k]
+    return (grades >= threshold).mean(axis=1)
+
+def get_metric_table(metric, length, n):
+    """Calculates a metric for all possible lists of relevance grades.
+    Tables are calculated once per process and then reused, at most
+    `MAX_TABLES` of them are kept.
+
+    Parameters
+    ----------
+    metric : function(numpy array) -> numpy array
+        Metric of every row of a matrix of relevance grades.
+    length : int
+        Length of the lists.
+    n : int
+        Number of relevance grades.
+
+    Returns
+    -------
+    out : numpy array
+        Metric of every list in the order of `generate_input.gen_input`,
+        so the metric of a list is found at its grades read as a number
+        in base `n`.
+    """
+    if isinstance(metric, partial):
+        # Equal partials share a table, although they are distinct objects.
+        key = (metric.func, metric.args,
+            tuple(sorted(metric.keywords.items())), length, n)
+    else:
+        key = (metric, length, n)
+    if key in _tables:
+        _tables.move_to_end(key)
+    else:
+        powers = n ** np.arange(length - 1, -1, -1, dtype=np.int64)
+        codes = np.arange(n ** length, dtype=np.int64)
+        _tables[key] = metric((codes[:, None] // powers) % n)
+        if len(_tables) > MAX_TABLES:
+            _tables.popitem(last=False)
+    return _tables[key]
+
+def get_deltas(pairs, metric=err, max_table_size=2**20):
+    """Calculates the difference in a metric between the second
+    and the first list of every pair.
+
+    Parameters
+    ----------
+    pairs : numpy array
+        Integer array of shape (number of pairs, 2, length), such as
+        created by `generate_input.get_input_pairs_array`.
+    metric : function(numpy array) -> numpy array
+        Metric of every row of a matrix of relevance grades.
+    max_table_size : int
+        Largest number of possible lists for which the metric is looked
+        up in `get_metric_table` instead of calculated for every pair.
+
+    Returns
+    -------
+    out : numpy array
+        Metric of the second list minus that of the first list.
+    """
+    pairs = np.asarray(pairs)
+    if pairs.size == 0:
+        return np.zeros(len(pairs))
+    length = pairs.shape[2]
+    n = int(pairs.max()) + 1
+    if n ** length > max_table_size:
+        return metric(pairs[:, 1]) - metric(pairs[:, 0])
+    table = get_metric_table(metric, length, n)
+    codes = pairs.astype(np.int64) @ (n ** np.arange(length - 1, -1, -1))
+    return table[codes[:, 1]] - table[codes[:, 0]]
+
+def get_bin_indices(deltas, n_bins=10, cut_sides=0.05):
+    """Sorts metric differences into bins.
+
+    Parameters
+    ----------
+    deltas : numpy array
+        Metric differences, see `get_deltas`.
+    n_bins : int
+        Number of bins between 0 and 1.
+    cut_sides : float
+        Amount by which first and last bin have their ranges cut.
+
+    Returns
+    -------
+    out : numpy array
+        Bin index of every difference, -1 for differences
+        outside of the bins.
+    """
+    deltas = np.asarray(deltas)
+    inside = (deltas >= cut_sides) & (deltas < 1.0 - cut_sides)
+    out = np.full(len(deltas), -1, dtype=np.int64)
+    out[inside] = (deltas[inside] * n_bins).astype(np.int64)
+    return out
+
+
+def main():
+    length = 5
+    n = 3
+    for name, metric in [('ERR', err), ('nDCG', ndcg), ('RBP', rbp),
+            ('P@3', partial(precision, k=3))]:
+        counts = np.zeros(10, dtype=np.int64)
+        for _, pairs in generate_input.iter_input_pairs_arrays(length, n):
+            bins = get_bin_indices(get_deltas(pairs, metric))
+            counts += np.bincount(bins[bins >= 0], minlength=10)
+        print(name, 'pairs per bin:', counts.tolist())
+    return
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import generate_input
+import interleaving as il
+import click_model_v2 as cm
+import power_analysis as pa
+import random_streams
+import synthetic_log
+from instrumentation import get_peak_rss_mb, metrics
+
+
+# Sizes of the fixed inputs of every benchmark, per tier.
+TIERS = {
+    'small' : {
+        'log_sessions' : 20000,
+        'em_sessions' : 5000,
+        'em_iterations' : 10,
+        'interleavings' : 50000,
+        'clicks' : 200000,
+        'simulation_pairs' : 40,
+        'simulations' : 500,
+        'repeat' : 3
+    },
+    'large' : {
+        'log_sessions' : 2000000,
+        'em_sessions' : 200000,
+        'em_iterations' : 10,
+        'interleavings' : 2000000,
+        'clicks' : 10000000,
+        'simulation_pairs' : 400,
+        'simulations' : 5000,
+        'repeat' : 1
+    }
+}
+
+def get_pairs(length=3, n=2):
+    """Lists the ranking pairs with id conflicts of all input pairs.
+
+    Parameters
+    ----------
+    length : int
+        Length of a ranking.
+    n : int
+        Number of relevance grades.
+
+    Returns
+    -------
+    out : list
+        A list of ranking pairs, see `generate_input.add_conflicts`.
+    """
+    return [permutation for pair in generate_input.iter_input_pairs(length, n)
+        for permutation in generate_input.add_conflicts(pair)]
+
+def get_trained_pbm(gammas=(0.9, 0.6, 0.4)):
+    """Creates a PBM with fixed parameters instead of training it.
+
+    Parameters
+    ----------
+    gammas : array_like
+        Probability of examining every rank.
+
+    Returns
+    -------
+    out : PBM
+        Click model with the given `gammas`.
+    """
+    pbm = cm.PBM()
+    pbm.gammas = list(gammas)
+    return pbm
+
+
+def bench_read_yandex(size, tmp_dir):
+    path = os.path.join(tmp_dir, 'log.txt')
+    n_lines = synthetic_log.write_log(path, size['log_sessions'])
+    yield
+    cm.read_yandex(path)
+    yield n_lines, 'lines'
+
+def bench_pbm_learn(size, tmp_dir):
+    path = os.path.join(tmp_dir, 'em_log.txt')
+    synthetic_log.write_log(path, size['em_sessions'])
+    database = cm.read_yandex(path)
+    pbm = cm.PBM()
+    yield
+    # A fixed number of iterations instead of learning until convergence.
+    for _ in range(size['em_iterations']):
+        pbm._learn(database, 3)
+    yield size['em_iterations'], 'EM iterations'
+
+def _bench_interleaving(size, interleaving_func):
+    pairs = get_pairs()
+    pairs = [pairs[l % len(pairs)] for l in range(size['interleavings'])]
+    yield
+    for pair in pairs:
+        interleaving_func(pair, 3)
+    yield len(pairs), 'interleavings'
+
+def bench_td_interleaving(size, tmp_dir):
+    return _bench_interleaving(size, il.td_interleaving)
+
+def bench_prob_interleaving(size, tmp_dir):
+    return _bench_interleaving(size, il.prob_interleaving)
+
+def _bench_clicks(size, click_model):
+    grades = [[0, 0, 1], [1, 0, 0], [1, 1, 0], [0, 1, 0]]
+    grades = [grades[l % len(grades)] for l in range(size['clicks'])]
+    yield
+    for relevance_grades in grades:
+        click_model.get_clicks(relevance_grades)
+    yield len(grades), 'click simulations'
+
+def bench_rcm_clicks(size, tmp_dir):
+    rcm = cm.RCM()
+    rcm.rho = 0.3
+    return _bench_clicks(size, rcm)
+
+def bench_pbm_clicks(size, tmp_dir):
+    return _bench_clicks(size, get_trained_pbm())
+
+def bench_interleaving_simulation(size, tmp_dir):
+    pairs = get_pairs()
+    step = max(1, len(pairs) // size['simulation_pairs'])
+    pairs = pairs[::step][:size['simulation_pairs']]
+    click_model_func = get_trained_pbm().get_clicks
+    yield
+    for pair in pairs:
+        pa.interleaving_simulation(pair, size['simulations'],
+            il.td_interleaving, click_model_func, 3)
+    yield len(pairs) * size['simulations'], 'simulations'
+
+# Benchmarks by name. Every benchmark is a generator that prepares its
+# inputs before its first yield and then runs the measured work
+# and yields the amount of work done and its unit.
+BENCHMARKS = {
+    'read_yandex' : bench_read_yandex,
+    'pbm_learn' : bench_pbm_learn,
+    'td_interleaving' : bench_td_interleaving,
+    'prob_interleaving' : bench_prob_interleaving,
+    'rcm_clicks' : bench_rcm_clicks,
+    'pbm_clicks' : bench_pbm_clicks,
+    'interleaving_simulation' : bench_interleaving_simulation
+}
+
+
+def run_benchmark(name, size, tmp_dir, seed=0, trace_memory=True):
+    """Runs a benchmark with fixed seeds.
+
+    The work is timed `size['repeat']` times and the fastest run
+    is reported. Peak memory is measured in a separate run with
+    `tracemalloc`, so tracing does not slow down the timed runs.
+
+    Parameters
+    ----------
+    name : str
+        Name of the benchmark in `BENCHMARKS`.
+    size : dict
+        Sizes of the inputs, see `TIERS`.
+    tmp_dir : str
+        Directory for temporary files.
+    seed : int
+        Seed of the random stream.
+    trace_memory : bool
+        Whether to measure the peak memory of the work.
+
+    Returns
+    -------
+    out : dict
+        A dictionary containing the amount of work `count`, its `unit`,
+        the fastest time `seconds`, the throughput `per_second`
+        and the peak traced memory `peak_mb`.
+    """
+    out = {'seconds' : float('inf')}
+    for l in range(size['repeat'] + trace_memory):
+        random_streams.seed(seed)
+        bench = BENCHMARKS[name](size, tmp_dir)
+        next(bench)
+        tracing = l == size['repeat']
+        if tracing:
+            tracemalloc.start()
+        start = time.perf_counter()
+        count, unit = next(bench)
+        seconds = time.perf_counter() - start
+        if tracing:
+            out['peak_mb'] = tracemalloc.get_traced_memory()[1] / 2 ** 20
+            tracemalloc.stop()
+        else:
+            out['seconds'] = min(out['seconds'], seconds)
+        out['count'] = count
+        out['unit'] = unit
+    out['per_second'] = out['count'] / out['seconds']
+    return out
+
+def run(tier='small', names=None, seed=0, trace_memory=True):
+    """Runs the benchmarks of a tier.
+
+    Parameters
+    ----------
+    tier : str
+        Name of the tier in `TIERS`.
+    names : array_like
+        Names of the benchmarks to run, defaults to all of them.
+    seed : int
+        Seed of the random stream.
+    trace_memory : bool
+        Whether to measure the peak memory of every benchmark.
+
+    Returns
+    -------
+    out : dict
+        A dictionary describing the tier and machine, containing
+        the results of `run_benchmark` by name in `results`.
+    """
+    if names is None:
+        names = list(BENCHMARKS)
+    out = {
+        'tier' : tier,
+        'seed' : seed,
+        'python' : platform.python_version(),
+        'platform' : platform.platform(),
+        'time' : time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'results' : {}
+    }
+    # Keep the events of instrumented code out of the output.
+    stream = metrics.stream
+    metrics.stream = None
+    try:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for name in names:
+                result = run_benchmark(name, TIERS[tier], tmp_dir, seed,
+                    trace_memory)
+                out['results'][name] = result
+                print(name.ljust(24), str(round(result['per_second'], 1))
+                    .rjust(12), result['unit'] + ' / s', ' peak',
+                    round(result.get('peak_mb', 0.0), 1), 'MB')
+    finally:
+        metrics.stream = stream
+    out['peak_rss_mb'] = get_peak_rss_mb()
+    return out
+
+def compare(results, baseline, tolerance=0.1):
+    """Compares throughput against a baseline.
+
+    Parameters
+    ----------
+    results : dict
+        Results of `run`.
+    baseline : dict
+        Results of `run` to compare against.
+    tolerance : float
+        Relative loss of throughput that is not counted as a regression.
+
+    Returns
+    -------
+    regressions : list
+        Names of the benchmarks of which the throughput
+        dropped by more than `tolerance`.
+    """
+    if results['tier'] != baseline['tier']:
+        print('warning: comparing tier', results['tier'],
+            'against baseline tier', baseline['tier'])
+    regressions = []
+    for name, result in results['results'].items():
+        if name not in baseline['results']:
+            print(name.ljust(24), 'not in baseline')
+            continue
+        ratio = result['per_second'] \
+            / baseline['results'][name]['per_second']
+        status = ''
+        if ratio < 1 - tolerance:
+            status = 'REGRESSION'
+            regressions.append(name)
+        elif ratio > 1 + tolerance:
+            status = 'improvement'
+        print(name.ljust(24), (str(round(ratio, 3)) + 'x').rjust(8), status)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmarks ingest, training and simulation.')
+    parser.add_argument('--tier', choices=list(TIERS), default='small')
+    parser.add_argument('--only', nargs='*', choices=list(BENCHMARKS),
+        help='benchmarks to run, defaults to all')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--no-memory', action='store_true',
+        help='skip the traced run that measures peak memory')
+    parser.add_argument('--output', help='path to write the results JSON to')
+    parser.add_argument('--baseline',
+        help='path to results JSON to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.1,
+        help='relative throughput loss that is not a regression')
+    args = parser.parse_args()
+    results = run(args.tier, args.only, args.seed, not args.no_memory)
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        print('===== COMPARED TO ' + args.baseline + ' =====')
+        if compare(results, baseline, args.tolerance) != []:
+            sys.exit(1)
+    return
+
+
+if __name__ == '__main__':
+    main()
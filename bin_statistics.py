@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+
+import random
+from math import ceil
+
+
+class KLLSketch:
+    """KLL Sketch
+    ==========
+
+    Streaming quantile sketch of Karnin, Lang and Liberty.
+
+    Values are kept in compactors, one per level, in which a value
+    stands for 2**level values of the stream. When the sketch is full,
+    a compactor is sorted and every other value moves up a level,
+    so memory stays bounded by about `3 * k` values. Sketches of
+    separate streams can be merged. Quantiles are exact as long as
+    no compaction has happened.
+    """
+    def __init__(self, k=256, seed=0):
+        """Initializes class parameters.
+
+        Parameters
+        ----------
+        k : int
+            Capacity of the highest compactor, higher values give
+            more accurate quantiles.
+        seed : int
+            Seed of the choices of which values are kept.
+        """
+        self.k = k
+        self.random = random.Random(seed)
+        self.compactors = [[]]
+        self.size = 0
+
+    def get_capacity(self, level):
+        """Determines the capacity of the compactor at a level.
+
+        Parameters
+        ----------
+        level : int
+            Level of the compactor.
+
+        Returns
+        -------
+        out : int
+            Number of values the compactor can hold.
+        """
+        depth = len(self.compactors) - level - 1
+        return max(2, int(ceil(self.k * (2.0 / 3) ** depth)))
+
+    def update(self, value):
+        """Adds a value to the sketch.
+
+        Parameters
+        ----------
+        value : float
+            Value to add.
+
+        Returns
+        -------
+        None
+        """
+        self.compactors[0].append(value)
+        self.size += 1
+        if self.size >= self.get_max_size():
+            self.compress()
+        return
+
+    def get_max_size(self):
+        """Determines the number of values the sketch can hold.
+
+        Returns
+        -------
+        out : int
+            Sum of the capacities of all compactors.
+        """
+        return sum(self.get_capacity(level)
+            for level in range(len(self.compactors)))
+
+    def compress(self):
+        """Compacts the lowest compactor that is over capacity
+        until the sketch is within its size.
+
+        Returns
+        -------
+        None
+        """
+        while self.size >= self.get_max_size():
+            for level, compactor in enumerate(self.compactors):
+                if len(compactor) >= self.get_capacity(level):
+                    if level + 1 == len(self.compactors):
+                        self.compactors.append([])
+                    compactor.sort()
+                    offset = self.random.random() < 0.5
+                    self.compactors[level + 1] += compactor[offset::2]
+                    self.size += len(compactor[offset::2]) - len(compactor)
+                    del compactor[:]
+                    break
+        return
+
+    def merge(self, other):
+        """Adds the values of another sketch to the sketch.
+
+        Parameters
+        ----------
+        other : KLLSketch
+            Sketch to merge.
+
+        Returns
+        -------
+        None
+        """
+        while len(self.compactors) < len(other.compactors):
+            self.compactors.append([])
+        for level, compactor in enumerate(other.compactors):
+            self.compactors[level] += compactor
+        self.size += other.size
+        self.compress()
+        return
+
+    def get_weighted_values(self):
+        """Lists the values in the sketch with their weights.
+
+        Returns
+        -------
+        out : list
+            A sorted list of (value, weight) tuples.
+        """
+        return sorted((value, 2 ** level)
+            for level, compactor in enumerate(self.compactors)
+            for value in compactor)
+
+    def quantile(self, q):
+        """Estimates a quantile, interpolating linearly between
+        the values around it.
+
+        Parameters
+        ----------
+        q : float
+            Quantile between 0 and 1.
+
+        Returns
+        -------
+        out : float
+            Estimated quantile, `None` if the sketch is empty.
+        """
+        values = self.get_weighted_values()
+        if values == []:
+            return None
+        total = sum(weight for _, weight in values)
+        rank = q * (total - 1)
+        # Every value covers the ranks from its first to its last copy.
+        first = 0
+        for l, (value, weight) in enumerate(values):
+            last = first + weight - 1
+            if rank <= last:
+                return value
+            if l + 1 < len(values) and rank < last + 1:
+                following = values[l + 1][0]
+                return value + (rank - last) * (following - value)
+            first = last + 1
+        return values[-1][0]
+
+
+class BinStatistics:
+    """Bin Statistics
+    ==============
+
+    Accumulator of the sample sizes in a bin.
+
+    Keeps exact counts, minimum and maximum, and a `KLLSketch`
+    for percentiles, so memory stays bounded however many values
+    are added. Sample sizes of -1 (proportions of exactly 0.5)
+    are counted as excluded. Accumulators of parallel workers
+    can be merged.
+    """
+    def __init__(self, k=256, seed=0):
+        """Initializes class parameters.
+
+        Parameters
+        ----------
+        k : int
+            Accuracy parameter of the sketch, see `KLLSketch`.
+        seed : int
+            Seed of the sketch.
+        """
+        self.n = 0
+        self.n_excluded = 0
+        self.min = None
+        self.max = None
+        self.sketch = KLLSketch(k, seed)
+
+    def add(self, value):
+        """Adds a sample size.
+
+        Parameters
+        ----------
+        value : int
+            Sample size, -1 is counted as excluded.
+
+        Returns
+        -------
+        None
+        """
+        if value == -1:
+            self.n_excluded += 1
+            return
+        self.n += 1
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        self.sketch.update(value)
+        return
+
+    def extend(self, values):
+        """Adds sample sizes.
+
+        Parameters
+        ----------
+        values : iterable
+            Sample sizes, see `add`.
+
+        Returns
+        -------
+        None
+        """
+        for value in values:
+            self.add(value)
+        return
+
+    def merge(self, other):
+        """Adds the sample sizes of another accumulator.
+
+        Parameters
+        ----------
+        other : BinStatistics
+            Accumulator to merge.
+
+        Returns
+        -------
+        None
+        """
+        self.n += other.n
+        self.n_excluded += other.n_excluded
+        for value in [other.min, other.max]:
+            if value is not None:
+                self.min = value if self.min is None else min(self.min, value)
+                self.max = value if self.max is None else max(self.max, value)
+        self.sketch.merge(other.sketch)
+        return
+
+    def percentile(self, q):
+        """Estimates a percentile of the sample sizes.
+
+        Parameters
+        ----------
+        q : float
+            Percentile between 0 and 100.
+
+        Returns
+        -------
+        out : int
+            Percentile rounded up, `None` without sample sizes.
+        """
+        value = self.sketch.quantile(q / 100.0)
+        return None if value is None else int(ceil(value))
+
+    def get_info(self, percentiles=()):
+        """Summarizes the sample sizes in the format of
+        `power_analysis.process_bins`.
+
+        Parameters
+        ----------
+        percentiles : array_like
+            Percentiles between 0 and 100 to add.
+
+        Returns
+        -------
+        out : dict
+            A dictionary containing `min`, `max`, `median` and
+            `has_info`, as well as the number of sample sizes `n`,
+            the number of excluded sample sizes `n_excluded`
+            and the requested `percentiles`.
+        """
+        out = {'has_info' : self.n > 0, 'n' : self.n,
+            'n_excluded' : self.n_excluded}
+        if self.n > 0:
+            out['min'] = self.min
+            out['max'] = self.max
+            out['median'] = self.percentile(50)
+            out['percentiles'] = {q : self.percentile(q) for q in percentiles}
+        return out
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+
+import numpy as np
+
+import power_analysis as pa
+import sweep
+
+
+def get_log_sample_size(p, alpha=0.05, beta=0.10, max_n=1e8):
+    """Computes the log of the sample size of power analysis
+    without rounding, for arrays of proportions.
+
+    Parameters
+    ----------
+    p : numpy array
+        Proportions for which sample sizes are to be calculated.
+    alpha : float
+        Type I error parameter.
+    beta : float
+        Type II error parameter.
+    max_n : float
+        Sample size that is returned for proportions close to 0.5.
+
+    Returns
+    -------
+    out : numpy array
+        Log of the sample sizes, see `power_analysis.compute_sample_size`.
+    """
+    z_alpha = pa.get_z(1 - alpha)
+    z_beta = pa.get_z(1 - beta)
+    diff = np.abs(p - 0.5)
+    with np.errstate(divide='ignore'):
+        n = ((z_alpha * 0.5 + z_beta * np.sqrt(p * (1 - p))) / diff) ** 2
+    return np.log(np.minimum(n, max_n))
+
+def get_uncertainty(counts, bin_ids, alpha=0.05, beta=0.10, z=2.0):
+    """Estimates how much the simulations of each task add to
+    the uncertainty of the median sample size of its bin.
+
+    The standard error of the log sample size of a task is the largest
+    change of the log sample size when its proportion of wins moves
+    by one binomial standard error. Unlike a derivative, this does not
+    vanish at a proportion of 0.5 or where sample sizes are clipped.
+    Only tasks whose interval of `z` standard errors contains
+    the median of their bin can change that median, the others
+    get an uncertainty of 0.
+
+    Parameters
+    ----------
+    counts : numpy array
+        Numbers of wins of both rankings and number of ties per task.
+    bin_ids : numpy array
+        Index of the bin of every task. Tasks of different click model
+        and interleaving combinations must be in different bins.
+    alpha : float
+        Type I error parameter.
+    beta : float
+        Type II error parameter.
+    z : float
+        Width of the intervals in standard errors.
+
+    Returns
+    -------
+    out : numpy array
+        Standard error of the log sample size of every task that can
+        change the median of its bin, 0 for other tasks.
+    """
+    decisive = counts[:, 0] + counts[:, 1]
+    # Smoothed proportions keep the standard errors of small batches finite.
+    p = (counts[:, 1] + 0.5) / (decisive + 1.0)
+    se_p = np.sqrt(p * (1 - p) / (decisive + 1.0))
+    log_n = get_log_sample_size(p, alpha, beta)
+    se = np.maximum(
+        np.abs(get_log_sample_size(np.minimum(p + se_p, 1.0), alpha, beta)
+            - log_n),
+        np.abs(get_log_sample_size(np.maximum(p - se_p, 0.0), alpha, beta)
+            - log_n))
+    out = np.zeros(len(counts))
+    for bin_id in np.unique(bin_ids):
+        in_bin = bin_ids == bin_id
+        median = np.median(log_n[in_bin])
+        pivotal = in_bin & (np.abs(log_n - median) <= z * se)
+        out[pivotal] = se[pivotal]
+    return out
+
+def allocate(uncertainty, bin_ids, n_batches):
+    """Divides batches of simulations over tasks. Bins get batches
+    in proportion to the largest uncertainty of their tasks,
+    tasks within a bin in proportion to their own uncertainty.
+
+    Parameters
+    ----------
+    uncertainty : numpy array
+        Uncertainty of every task, see `get_uncertainty`.
+    bin_ids : numpy array
+        Index of the bin of every task.
+    n_batches : int
+        Number of batches to divide.
+
+    Returns
+    -------
+    out : numpy array
+        Number of batches for every task.
+    """
+    weights = np.zeros(len(uncertainty))
+    for bin_id in np.unique(bin_ids):
+        in_bin = bin_ids == bin_id
+        total = uncertainty[in_bin].sum()
+        if total > 0:
+            weights[in_bin] = uncertainty[in_bin].max() \
+                * uncertainty[in_bin] / total
+    if weights.sum() == 0:
+        return np.zeros(len(uncertainty), dtype=int)
+    share = weights / weights.sum() * n_batches
+    out = np.floor(share).astype(int)
+    # Hand out the remaining batches to the largest remainders.
+    remainder = n_batches - out.sum()
+    out[np.argsort(out - share)[:remainder]] += 1
+    return out
+
+def schedule(tasks, click_model_fs, interleaving_fs, length_interleaving,
+        budget, batch_size=50, pilot=100, round_size=None, tolerance=0.05,
+        alpha=0.05, beta=0.10, n_workers=None, root_seed=0, memo=None):
+    """Spends a total simulation budget over tasks in rounds,
+    each round giving more simulations to the tasks that make
+    the median sample size of their bin most uncertain.
+
+    Rounds only depend on the outcomes of earlier batches, so with
+    a memo of the batches an interrupted schedule that is run again
+    replays the finished batches without simulating them.
+
+    Parameters
+    ----------
+    tasks : array_like
+        Tasks as created by `sweep.get_tasks`.
+    click_model_fs : array_like
+        Functions to simulate user clicks.
+    interleaving_fs : array_like
+        Functions to interleave pairs of ranking combinations.
+    length_interleaving : int
+        Length of the interleaved lists.
+    budget : int
+        Total number of simulations.
+    batch_size : int
+        Number of simulations per batch.
+    pilot : int
+        Number of simulations per task before the first round.
+        Is lowered if the budget does not cover it.
+    round_size : int
+        Number of batches per round, defaults to the number of tasks.
+    tolerance : float
+        Uncertainty of the log sample size below which tasks get
+        no further simulations.
+    alpha : float
+        Type I error parameter.
+    beta : float
+        Type II error parameter.
+    n_workers : int
+        Number of worker processes, see `sweep.run_sweep`.
+    root_seed : int
+        Seed of the whole schedule.
+    memo : SimulationMemo
+        Store of earlier batch results. Is ignored if `None`.
+
+    Returns
+    -------
+    out : generator
+        Generator of task results in task order, see `sweep.run_task`,
+        that yields the tasks after the last round.
+    """
+    tasks = list(tasks)
+    if round_size is None:
+        round_size = len(tasks)
+    index = {task[0] : l for l, task in enumerate(tasks)}
+    n_bins = max(task[3] for task in tasks) + 1
+    bin_ids = np.array([(task[1] * len(interleaving_fs) + task[2]) * n_bins
+        + task[3] for task in tasks])
+    counts = np.zeros((len(tasks), 3), dtype=int)
+    n_batches = np.zeros(len(tasks), dtype=int)
+
+    def run(sizes):
+        batches = [(task, int(size), int(n_batches[l]))
+            for l, (task, size) in enumerate(zip(tasks, sizes)) if size > 0]
+        for task_id, _, batch_counts in sweep.run_sweep(batches,
+                click_model_fs, interleaving_fs, None, length_interleaving,
+                n_workers, root_seed=root_seed, memo=memo,
+                func=sweep.run_batch):
+            counts[index[task_id]] += batch_counts
+            n_batches[index[task_id]] += 1
+
+    # Pilot simulations for every task.
+    run(np.full(len(tasks), max(1, min(pilot, budget // len(tasks)))))
+    # Rounds of simulations for the most uncertain tasks.
+    while counts.sum() + batch_size <= budget:
+        uncertainty = get_uncertainty(counts, bin_ids, alpha, beta)
+        uncertainty[uncertainty < tolerance] = 0
+        n_round = min(round_size, (budget - counts.sum()) // batch_size)
+        allocation = allocate(uncertainty, bin_ids, n_round)
+        if allocation.sum() == 0:
+            break
+        run(allocation * batch_size)
+
+    for task, (wins_p, wins_e, ties) in zip(tasks, counts):
+        if wins_p + wins_e == 0:
+            p = 0.5
+        else:
+            p = int(wins_e) / float(wins_p + wins_e)
+        yield (task[0], task[1], task[2], task[3], p,
+            [int(wins_p), int(wins_e), int(ties)])
+    return
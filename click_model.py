@@ -5,11 +5,13 @@
 import numpy as np
 import pandas as pd
 import csv
-import random
+
+import random_streams
+from instrumentation import metrics
 
 class PBM:
     def __init__(self, seed=42, epsilon=0.1):
-        random.seed(seed)
+        self.random = random_streams.RandomStream(seed)
         self.epsilon = epsilon
         self.gammas = []  #### Test values
         self.click_probabilities = []
@@ -88,7 +90,7 @@ class PBM:
         clicks = []
         while len(clicks) == 0:
             for i in range(len(interleaved_list)):
-                if random.random() < self.click_probabilities[i]:
+                if self.random.random() < self.click_probabilities[i]:
                     clicks.append(i)
                     
         count = 0
@@ -134,7 +136,7 @@ class PBM:
         clicks = df[df.type_action == 1]
 
         alpha = 0
-        gammas = [random.random() for i in range(6)]
+        gammas = [self.random.random() for i in range(6)]
         
         for i in range(10):
             for j in range(len(gammas)):
@@ -154,8 +156,9 @@ class PBM:
                     
                 gammas[j] = count / counter
             
-            print("Training " + str((i+1)/(10) * 100)+ "% complete")
-            print(gammas)
+            metrics.count('em_iterations')
+            metrics.emit('em_iteration', model='PBM', progress=(i + 1) / 10.0,
+                gammas=gammas)
         
         self.gammas = gammas
         
@@ -163,7 +166,7 @@ class PBM:
 
 class RCM:
     def __init__(self, seed=42):
-        random.seed(seed)
+        self.random = random_streams.RandomStream(seed)
         self.rho = 0
         
     def train_rho(self, file="YandexRelPredChallenge.txt"):
@@ -207,7 +210,7 @@ class RCM:
         clicks = []
         while len(clicks) == 0:
             for i in range(len(interleaved_list)):
-                if random.random() < self.rho:
+                if self.random.random() < self.rho:
                     clicks.append(i)
         
         count = 0
@@ -1,11 +1,11 @@
 #!/usr/bin/env python3
 
-from random import random
-import matplotlib.pyplot as plt
+import random_streams
+from instrumentation import metrics
 
 
-def read_yandex(path, n=-1):
-    """Reads yandex database.
+def iter_yandex(path, n=-1):
+    """Reads yandex database one entry at a time.
     
     Parameters
     ----------
@@ -16,10 +16,10 @@ def read_yandex(path, n=-1):
     
     Returns
     -------
-    out : list
-        A list of dictionaries representing database entries.
+    out : generator
+        Generator of dictionaries representing database entries,
+        see `read_yandex`.
     """
-    out = []
     with open(path) as f:
         for i, l in enumerate(f):
             if n >= 0 and i > n:
@@ -34,8 +34,24 @@ def read_yandex(path, n=-1):
             if item['a'] == 'q':
                 item['r_id'] = int(data[4])
                 item['urls'] = [int(x) for x in data[5:]]
-            out.append(item)
-    return out
+            yield item
+
+def read_yandex(path, n=-1):
+    """Reads yandex database.
+    
+    Parameters
+    ----------
+    path : str
+        Path to database file.
+    n : int
+        Number of lines to read. Is ignored if value is lower than 0.
+    
+    Returns
+    -------
+    out : list
+        A list of dictionaries representing database entries.
+    """
+    return list(iter_yandex(path, n))
 
 
 class RCM:
@@ -52,7 +68,7 @@ class RCM:
     def __init__(self):
         """Initializes class parameters.
         """
-        self.rho = random()
+        self.rho = random_streams.random()
     
     def learn(self, database, n=-1):
         """Learns class parameters.
@@ -80,6 +96,16 @@ class RCM:
         self.rho = n_clicks / float(n_docs)
         return
     
+    def get_params(self):
+        """Returns the parameters that determine simulated clicks.
+        
+        Returns
+        -------
+        out : dict
+            A dictionary containing `rho`.
+        """
+        return {'rho' : self.rho}
+    
     def get_p(self, relevance_grades):
         """Determines chance of clicking on a document.
         
@@ -117,7 +143,7 @@ class RCM:
         p = self.get_p(relevance_grades)
         out = []
         for i in range(len(p)):
-            if random() <= p[i]:
+            if random_streams.random() <= p[i]:
                 out.append(i)
         return out
 
@@ -192,14 +218,14 @@ class PBM:
             gamma_length = len(q_urls)
             # Extend gammas and gamma_sum.
             while len(self.gammas) < gamma_length:
-                self.gammas.append(random())
+                self.gammas.append(random_streams.random())
             while len(gamma_sum) < gamma_length:
                 gamma_sum.append(0)
             for r, _id in enumerate(q_urls):
                 uq = str((_id, q_id))
                 # Extend alphas and alpha_sum.
                 if self.alphas.get(uq) == None:
-                    self.alphas[uq] = random()
+                    self.alphas[uq] = random_streams.random()
                 if alpha_sum.get(uq) == None:
                     alpha_sum[uq] = {'sum' : 0, 'length' : 0}
                 # Update alphs_sum and gamma_sum.
@@ -293,6 +319,8 @@ class PBM:
         convergence = False
         while convergence == False:
             self._learn(database, n_rank)
+            metrics.count('em_iterations')
+            metrics.emit('em_iteration', model='PBM', gammas=self.gammas)
             prev_gammas.append(
                 [round(gamma, n_decimals) for gamma in self.gammas])
             if len(prev_gammas) >= n_consecutive:
@@ -308,6 +336,19 @@ class PBM:
                         break
         return
     
+    def get_params(self):
+        """Returns the parameters that determine simulated clicks.
+        
+        The parameters in `alphas` are left out, as clicks are simulated
+        with `epsilon` instead.
+        
+        Returns
+        -------
+        out : dict
+            A dictionary containing `gammas`.
+        """
+        return {'gammas' : list(self.gammas)}
+    
     def get_p(self, relevance_grades, epsilon=1e-1):
         """Determines chance of clicking on a document.
         
@@ -353,10 +394,10 @@ class PBM:
             List of indices of the documents that were clicked on
             in the simulation.
         """
-        p = self.get_p(relevance_grades)
+        p = self.get_p(relevance_grades, epsilon)
         out = []
         for i in range(len(p)):
-            if random() <= p[i]:
+            if random_streams.random() <= p[i]:
                 out.append(i)
         return out
 
@@ -372,6 +413,7 @@ def main():
     for _ in range(1000):
         for i in cm.get_clicks(relevance_grades):
             counter[i] += 1
+    import matplotlib.pyplot as plt
     plt.bar(range(len(counter)), counter)
     plt.show()
 
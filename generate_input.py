@@ -1,5 +1,9 @@
 #!/usr/bin/env python3
 
+from itertools import islice, product
+
+import numpy as np
+
 
 def gen_input_unsorted(length, n):
     """Creates a list of all possible combinations of relevance scores.
@@ -43,12 +47,7 @@ def gen_input(length, n):
         A sorted list containing all possible combinations
         of relevance scores.
     """
-    if length > 0:
-        out = gen_input_unsorted(length, n)
-        out.sort()
-    else:
-        out = []
-    return out
+    return list(iter_input(length, n))
 
 def gen_input_pairs(length, n):
     """Creates a sorted list of all possible pairs of combinations
@@ -67,10 +66,152 @@ def gen_input_pairs(length, n):
         A sorted list containing all possible pairs of combinations
         of relevance scores.
     """
-    out = gen_input(length * 2, n)
-    for i in range(len(out)):
-        out[i] = (out[i][:length], out[i][length:])
-    return out
+    return list(iter_input_pairs(length, n))
+
+
+def iter_input(length, n):
+    """Iterates over all possible combinations of relevance scores
+    in the sorted order of `gen_input` without creating them all at once.
+    
+    Parameters
+    ----------
+    length : int
+        Length of a combination of relevance scores.
+    n : int
+        Maximum relevance score
+    
+    Returns
+    -------
+    out : generator
+        A generator of lists of relevance scores.
+    """
+    if length > 0:
+        for combination in product(range(n), repeat=length):
+            yield list(combination)
+
+def iter_input_pairs(length, n, start=0, stop=None):
+    """Iterates over all possible pairs of combinations of relevance
+    scores in the sorted order of `gen_input_pairs` without
+    creating them all at once.
+    
+    Parameters
+    ----------
+    length : int
+        Length of a combination of relevance scores.
+    n : int
+        Maximum relevance score
+    start : int
+        Index of the first pair.
+    stop : int
+        Index after the last pair, defaults to the number of pairs.
+    
+    Returns
+    -------
+    out : generator
+        A generator of tuples of two lists of relevance scores.
+    """
+    for combination in islice(iter_input(length * 2, n), start, stop):
+        yield (combination[:length], combination[length:])
+
+def count_input_pairs(length, n):
+    """Counts all possible pairs of combinations of relevance scores.
+    
+    Parameters
+    ----------
+    length : int
+        Length of a combination of relevance scores.
+    n : int
+        Maximum relevance score
+    
+    Returns
+    -------
+    out : int
+        Number of pairs created by `gen_input_pairs`.
+    """
+    return n ** (length * 2) if length > 0 else 0
+
+def get_input_pair(index, length, n):
+    """Creates the pair of combinations of relevance scores
+    at an index of `gen_input_pairs` without creating the others.
+    
+    Parameters
+    ----------
+    index : int
+        Index of the pair.
+    length : int
+        Length of a combination of relevance scores.
+    n : int
+        Maximum relevance score
+    
+    Returns
+    -------
+    out : tuple
+        Tuple of two lists of relevance scores.
+    """
+    if not 0 <= index < count_input_pairs(length, n):
+        raise IndexError('pair index out of range')
+    combination = []
+    for _ in range(length * 2):
+        index, score = divmod(index, n)
+        combination.append(score)
+    combination.reverse()
+    return (combination[:length], combination[length:])
+
+def get_input_pairs_array(length, n, start=0, stop=None, dtype=np.int8):
+    """Creates a range of pairs of combinations of relevance scores
+    of `gen_input_pairs` as one integer array.
+    
+    Parameters
+    ----------
+    length : int
+        Length of a combination of relevance scores.
+    n : int
+        Maximum relevance score
+    start : int
+        Index of the first pair.
+    stop : int
+        Index after the last pair, defaults to the number of pairs.
+    dtype : numpy dtype
+        Integer type of the relevance scores.
+    
+    Returns
+    -------
+    out : numpy array
+        Array of shape (number of pairs, 2, length) in which
+        `out[i]` is the pair at index `start + i`.
+    """
+    total = count_input_pairs(length, n)
+    stop = total if stop is None else min(stop, total)
+    index = np.arange(start, max(start, stop), dtype=np.int64)
+    powers = n ** np.arange(length * 2 - 1, -1, -1, dtype=np.int64)
+    out = (index[:, None] // powers) % n
+    return out.astype(dtype).reshape(len(index), 2, length)
+
+def iter_input_pairs_arrays(length, n, chunk_size=2**20, dtype=np.int8):
+    """Iterates over all possible pairs of combinations of relevance
+    scores in chunks of `get_input_pairs_array`.
+    
+    Parameters
+    ----------
+    length : int
+        Length of a combination of relevance scores.
+    n : int
+        Maximum relevance score
+    chunk_size : int
+        Number of pairs per chunk.
+    dtype : numpy dtype
+        Integer type of the relevance scores.
+    
+    Returns
+    -------
+    out : generator
+        A generator of tuples of the index of the first pair
+        of a chunk and the array of the chunk.
+    """
+    total = count_input_pairs(length, n)
+    for start in range(0, total, chunk_size):
+        yield start, get_input_pairs_array(length, n, start,
+            start + chunk_size, dtype)
 
 
 def get_conflicts(n, length, _in=[], ordered=False):
@@ -95,19 +236,99 @@ def get_conflicts(n, length, _in=[], ordered=False):
         A value of 0 indicates no conflict,
         a value higher than indicates a conflict.
     """
-    if (len(_in) < length and n <= length):
-        out = []
-        # Add all possible conflicts.
-        for i in [x for x in range(1, n + 1) if x not in _in]:
-            out += get_conflicts(n, length, _in + [i], ordered)
-            if ordered:
-                break
-        # Add absence of a conflict if possible.
-        if (length - len(_in) > n - sum([1 for i in _in if i != 0])):
-            out += get_conflicts(n, length, _in + [0], ordered)
-        return out
-    else:
-        return [_in]
+    return list(iter_conflict_ids(n, length, list(_in), ordered))
+
+def iter_conflict_ids(n, length, _in=[], ordered=False, grades=None,
+        conflict_grades=None):
+    """Iterates over all possible id conflicts in the order
+    of `get_conflicts`, leaving out those that cannot match grades.
+    
+    Parameters
+    ----------
+    n : int
+        Total possible number of id conflicts at a time.
+    length: int
+        Length of the list containing id conflicts.
+    _in : array_like
+        Array of current id conflicts.
+    ordered : bool
+        Indicates whether id conflict numbers are to appear in order
+        or are permitted to appear in any order.
+    grades : array_like
+        Relevance grades of the ranking the id conflicts are for.
+        Is ignored if `None`.
+    conflict_grades : dict
+        Relevance grade of every id conflict number, an id conflict
+        is only placed at a rank with the same grade.
+    
+    Returns
+    -------
+    out : generator
+        A generator of lists of id conflicts.
+    """
+    if not (len(_in) < length and n <= length):
+        yield _in
+        return
+    rank = len(_in)
+    # Add all possible conflicts.
+    for i in [x for x in range(1, n + 1) if x not in _in]:
+        if grades is None or conflict_grades[i] == grades[rank]:
+            if _can_place(n, _in + [i], grades, conflict_grades):
+                yield from iter_conflict_ids(n, length, _in + [i], ordered,
+                    grades, conflict_grades)
+        if ordered:
+            break
+    # Add absence of a conflict if possible.
+    if (length - rank > n - sum([1 for i in _in if i != 0])):
+        if _can_place(n, _in + [0], grades, conflict_grades):
+            yield from iter_conflict_ids(n, length, _in + [0], ordered,
+                grades, conflict_grades)
+
+def _can_place(n, _in, grades, conflict_grades):
+    # Checks whether the grades of the remaining ranks
+    # can hold the conflicts that are not placed yet.
+    if grades is None:
+        return True
+    needed = [conflict_grades[i] for i in range(1, n + 1) if i not in _in]
+    left = list(grades[len(_in):])
+    for grade in needed:
+        if grade not in left:
+            return False
+        left.remove(grade)
+    return True
+
+def iter_conflicts(pair, representatives=True):
+    """Iterates over all valid ways of adding id conflicts to a tuple
+    of combinations of relevance grades, only creating conflicts
+    between documents with matching relevance grades.
+    
+    Parameters
+    ----------
+    pair : tuple
+        Tuple of combinations of relevance grades.
+    representatives : bool
+        Whether to only number conflicts in order of appearance
+        in the first ranking, which yields one pair for every way
+        of numbering the same conflicts (see `canonical_pair`)
+        in the order of `add_conflicts`. Otherwise every numbering
+        is yielded.
+    
+    Returns
+    -------
+    out : generator
+        A generator of tuples of combinations of relevance grades
+        with id conflicts, see `add_conflicts`.
+    """
+    length = len(pair[0])
+    for n in range(length + 1):
+        for ids0 in iter_conflict_ids(n, length, ordered=representatives):
+            conflict_grades = {_id : r for r, _id in zip(pair[0], ids0)}
+            if not _can_place(n, [], pair[1], conflict_grades):
+                continue
+            ranking0 = list(zip(pair[0], ids0))
+            for ids1 in iter_conflict_ids(n, length, grades=pair[1],
+                    conflict_grades=conflict_grades):
+                yield (ranking0, list(zip(pair[1], ids1)))
 
 def add_conflicts(pair):
     """Adds id conflicts to a tuple of combinations of relevance grades.
@@ -124,28 +345,145 @@ def add_conflicts(pair):
         of relevance grades with id conflicts.
         Relevance grades from the inputs have been replaced by a tuple
         of relevance grade and id conflict number.
+        Id conflicts only appear where relevance grades match.
     """
+    return list(iter_conflicts(pair))
+
+
+def pack_permutations(permutations, length=None, dtype=np.int8):
+    """Packs tuples of combinations of relevance grades with id conflicts
+    into one integer array.
+    
+    Parameters
+    ----------
+    permutations : iterable
+        Tuples of combinations of relevance grades with id conflicts,
+        as created by `add_conflicts`.
+    length : int
+        Length of the rankings, only needed if there are no permutations.
+    dtype : numpy dtype
+        Integer type of the array.
+    
+    Returns
+    -------
+    out : numpy array
+        Array of shape (number of permutations, 2, length, 2) in which
+        `out[i, k, r]` holds the relevance grade and id conflict at rank
+        `r` of ranking `k` of permutation `i`. Every `out[i]` can be
+        given to the interleaving functions as a ranking pair.
+    """
+    permutations = list(permutations)
+    if permutations == []:
+        return np.zeros((0, 2, length or 0, 2), dtype=dtype)
+    return np.array(permutations, dtype=dtype)
+
+def unpack_permutation(packed):
+    """Turns a packed permutation back into a tuple of combinations
+    of relevance grades with id conflicts.
+    
+    Parameters
+    ----------
+    packed : numpy array
+        Array of shape (2, length, 2), see `pack_permutations`.
+    
+    Returns
+    -------
+    out : tuple
+        Tuple of two lists of (relevance grade, id conflict) tuples.
+    """
+    return tuple([tuple(item) for item in ranking]
+        for ranking in packed.tolist())
+
+def get_conflicts_array(pair, representatives=True, dtype=np.int8):
+    """Creates all ways of adding id conflicts to a tuple of combinations
+    of relevance grades as one packed array, see `iter_conflicts`
+    and `pack_permutations`.
+    
+    Parameters
+    ----------
+    pair : tuple
+        Tuple of combinations of relevance grades.
+    representatives : bool
+        Whether to only number conflicts in order of appearance.
+    dtype : numpy dtype
+        Integer type of the array.
+    
+    Returns
+    -------
+    out : numpy array
+        Array of shape (number of permutations, 2, length, 2).
+    """
+    return pack_permutations(iter_conflicts(pair, representatives),
+        len(pair[0]), dtype)
+
+def save_permutations(path, packed):
+    """Saves packed permutations to a `.npy` file.
+    
+    Parameters
+    ----------
+    path : str
+        Path to the file.
+    packed : numpy array
+        Packed permutations, see `pack_permutations`.
+    
+    Returns
+    -------
+    None
+    """
+    np.save(path, packed)
+    return
+
+def load_permutations(path, mmap=True):
+    """Loads packed permutations from a `.npy` file.
+    
+    Parameters
+    ----------
+    path : str
+        Path to the file.
+    mmap : bool
+        Whether to map the file into memory read-only
+        instead of reading it.
+    
+    Returns
+    -------
+    out : numpy array
+        Packed permutations, see `pack_permutations`.
+    """
+    return np.load(path, mmap_mode='r' if mmap else None)
+
+
+def canonical_pair(pair):
+    """Creates a canonical form of a tuple of combinations of relevance
+    grades with id conflicts.
+    
+    Conflict ids only denote which documents are shared between
+    the two rankings, so pairs that differ only in the numbering
+    of their conflicts lead to the same simulation outcomes.
+    
+    Parameters
+    ----------
+    pair : tuple
+        Tuple of combinations of relevance grades with id conflicts,
+        as created by `add_conflicts`.
+    
+    Returns
+    -------
+    out : tuple
+        Tuple of two tuples of (relevance grade, id conflict) tuples
+        in which conflicts are numbered in order of first appearance,
+        first in the first and then in the second ranking.
+    """
+    ids = {0 : 0}
     out = []
-    # Add all possible id conflicts to input pair.
-    for n in range(len(pair[0]) + 1):
-        for ids0 in get_conflicts(n, len(pair[0]), ordered=True):
-            ranking0 = list(zip(pair[0], ids0))
-            for ids1 in get_conflicts(n, len(pair[0])):
-                out.append((ranking0, list(zip(pair[1], ids1))))
-    # Remove any pairs in which conflicts appear
-    # where relevance grades do not match.
-    for i in range(len(out) - 1, -1, -1):
-        delete = False
-        for r0, id0 in out[i][0]:
-            if id0 > 0:
-                for r1, id1 in out[i][1]:
-                    if id0 == id1 and not r0 == r1:
-                        delete = True
-                        break
-            if delete:
-                out.pop(i)
-                break
-    return out
+    for ranking in pair:
+        canonical = []
+        for r, _id in ranking:
+            _id = int(_id)
+            if _id not in ids:
+                ids[_id] = len(ids)
+            canonical.append((int(r), ids[_id]))
+        out.append(tuple(canonical))
+    return tuple(out)
 
 
 def ERR(g_list, R_func=lambda g, max_g: float(2**g- 1) / 2**max_g):
@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+
+import json
+import resource
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+
+class Metrics:
+    """Metrics
+    =======
+
+    Collects timings, counters and peak memory per stage of a run
+    and writes them as JSON lines.
+
+    Every event is written as one JSON object on its own line with
+    the event name, the time since the start of the run and its fields.
+    Counters are added to every stage that is active when they are
+    counted, so the summary can report rates such as simulations
+    per second for each stage. On Linux the peak resident memory
+    is reset when a stage starts, so it is the peak of that stage
+    rather than of the run so far.
+    """
+    def __init__(self, stream=sys.stderr, trace_memory=False):
+        """Initializes class parameters.
+
+        Parameters
+        ----------
+        stream : file
+            Stream to write events to, events are not written if `None`.
+        trace_memory : bool
+            Whether to trace the peak Python memory of every stage with
+            `tracemalloc`, which slows down allocations considerably.
+            The peak resident memory of the process is always reported.
+        """
+        self.stream = stream
+        self.trace_memory = trace_memory
+        self.start = time.perf_counter()
+        self.stages = {}
+        self.active = []
+        self.counters = {}
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def emit(self, event, **fields):
+        """Writes an event.
+
+        Parameters
+        ----------
+        event : str
+            Name of the event.
+        fields : dict
+            JSON serializable fields of the event.
+
+        Returns
+        -------
+        None
+        """
+        if self.stream is not None:
+            line = {'event' : event,
+                't' : round(time.perf_counter() - self.start, 6)}
+            line.update(fields)
+            self.stream.write(json.dumps(line) + '\n')
+            self.stream.flush()
+        return
+
+    def count(self, name, n=1):
+        """Adds to a counter.
+
+        Parameters
+        ----------
+        name : str
+            Name of the counter.
+        n : int
+            Amount to add.
+
+        Returns
+        -------
+        None
+        """
+        self.counters[name] = self.counters.get(name, 0) + n
+        for stage in self.active:
+            counters = self.stages[stage]['counters']
+            counters[name] = counters.get(name, 0) + n
+        return
+
+    @contextmanager
+    def stage(self, name, **fields):
+        """Times a stage of the run. Stages can be nested and entered
+        more than once, their times and counters are then summed.
+
+        Parameters
+        ----------
+        name : str
+            Name of the stage.
+        fields : dict
+            JSON serializable fields added to the events of the stage.
+
+        Returns
+        -------
+        out : context manager
+        """
+        info = self.stages.setdefault(name, {'calls' : 0, 'seconds' : 0.0,
+            'counters' : {}, 'peak_rss_mb' : 0.0, 'peak_children_rss_mb' : 0.0,
+            'peak_traced_mb' : 0.0})
+        self.emit('stage_start', stage=name, **fields)
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+        # Stages that are already active keep the peak up to here.
+        self.update_peaks()
+        reset_peak_rss()
+        self.active.append(name)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            self.update_peaks()
+            self.active.remove(name)
+            info['calls'] += 1
+            info['seconds'] += seconds
+            info['peak_children_rss_mb'] = get_peak_children_rss_mb()
+            end = {'stage' : name, 'seconds' : round(seconds, 6),
+                'peak_rss_mb' : round(info['peak_rss_mb'], 1),
+                'peak_children_rss_mb' : round(
+                    info['peak_children_rss_mb'], 1)}
+            if self.trace_memory:
+                peak = tracemalloc.get_traced_memory()[1] / 2 ** 20
+                info['peak_traced_mb'] = max(info['peak_traced_mb'], peak)
+                end['peak_traced_mb'] = round(peak, 1)
+            end.update(fields)
+            self.emit('stage_end', **end)
+
+    def update_peaks(self):
+        """Adds the peak resident memory since the last reset to
+        the active stages.
+
+        Returns
+        -------
+        None
+        """
+        peak = get_peak_rss_mb(since_reset=True)
+        for stage in self.active:
+            info = self.stages[stage]
+            info['peak_rss_mb'] = max(info['peak_rss_mb'], peak)
+        return
+
+    def summary(self):
+        """Summarizes all stages and counters.
+
+        Returns
+        -------
+        out : dict
+            A dictionary with the total run time, the counters, the tie rate
+            if `ties` and `simulations` were counted, and per stage
+            its calls, time, peak memory, counters and counters per second.
+        """
+        out = {'seconds' : round(time.perf_counter() - self.start, 6),
+            'counters' : dict(self.counters), 'stages' : {}}
+        if self.counters.get('simulations', 0) > 0:
+            out['tie_rate'] = self.counters.get('ties', 0) \
+                / float(self.counters['simulations'])
+        for name, info in self.stages.items():
+            stage = dict(info)
+            stage['per_second'] = {counter : n / info['seconds']
+                for counter, n in info['counters'].items()
+                if info['seconds'] > 0}
+            out['stages'][name] = stage
+        return out
+
+    def print_summary(self):
+        """Writes the summary as an event and prints it readably.
+
+        Returns
+        -------
+        None
+        """
+        summary = self.summary()
+        self.emit('summary', **summary)
+        print('===== METRICS =====')
+        print('total', round(summary['seconds'], 2), 's')
+        for name, stage in summary['stages'].items():
+            print(name, round(stage['seconds'], 2), 's,',
+                stage['calls'], 'calls,',
+                round(stage['peak_rss_mb'], 1), 'MB peak,',
+                round(stage['peak_children_rss_mb'], 1), 'MB peak of workers')
+            for counter, rate in stage['per_second'].items():
+                print('   ', counter, round(rate, 1), '/ s')
+        if 'tie_rate' in summary:
+            print('tie rate', round(summary['tie_rate'], 4))
+        return
+
+
+# Peak resident memory in megabytes before the last reset of the peak.
+_peak_rss_mb = 0.0
+
+def get_peak_rss_mb(since_reset=False):
+    """Determines the peak resident memory of the current process.
+
+    On Linux the peak is read from `VmHWM` in `/proc/self/status`,
+    elsewhere from `getrusage`.
+
+    Parameters
+    ----------
+    since_reset : bool
+        Whether to report the peak since the last `reset_peak_rss`
+        instead of the peak over the whole run.
+
+    Returns
+    -------
+    out : float
+        Peak resident memory in megabytes.
+    """
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    peak = int(line.split()[1]) / 2 ** 10
+                    break
+            else:
+                raise OSError('no VmHWM in /proc/self/status')
+    except OSError:
+        peak = _get_rusage_mb(resource.RUSAGE_SELF)
+    if since_reset:
+        return peak
+    return max(peak, _peak_rss_mb)
+
+def get_peak_children_rss_mb():
+    """Determines the peak resident memory of the largest child process,
+    such as a worker of a process pool, that has finished.
+
+    Returns
+    -------
+    out : float
+        Peak resident memory in megabytes.
+    """
+    return _get_rusage_mb(resource.RUSAGE_CHILDREN)
+
+def reset_peak_rss():
+    """Resets the peak resident memory of the current process to
+    the current resident memory, so the peak of a stage can be measured.
+    Only has an effect on Linux.
+
+    Returns
+    -------
+    out : bool
+        Whether the peak was reset.
+    """
+    global _peak_rss_mb
+    _peak_rss_mb = get_peak_rss_mb()
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        return False
+    return True
+
+def _get_rusage_mb(who):
+    peak = resource.getrusage(who).ru_maxrss
+    # Linux reports kilobytes, macOS bytes.
+    if sys.platform == 'darwin':
+        return peak / 2 ** 20
+    return peak / 2 ** 10
+
+
+# Metrics of the current process.
+metrics = Metrics()
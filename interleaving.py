@@ -1,5 +1,29 @@
 import numpy as np
+from collections import OrderedDict
 
+import generate_input
+import random_streams
+
+
+def get_duplicate_map(ranking):
+    """Maps the duplicate IDs of a ranking to the indices at which they occur.
+
+    Parameters
+    ----------
+    ranking : List of ranked and labeled results
+        Each element is a tuple of the relevance score and a duplicate ID.
+
+    Returns
+    -------
+    Duplicate map : dict
+        Maps every duplicate ID greater than 0 to the index of its document in the ranking,
+        so the duplicate of a document of the other ranker can be found without a linear search.
+    """
+    duplicate_map = {}
+    for index, (relevance, duplicate_id) in enumerate(ranking):
+        if duplicate_id > 0:
+            duplicate_map[duplicate_id] = index
+    return duplicate_map
 
 def td_interleaving(ranking_pair,max_interleav=3):
     """Run Team-draft interleaving given a ranking pair as input
@@ -17,6 +41,7 @@ def td_interleaving(ranking_pair,max_interleav=3):
     -------
     Interleaved list (of length 3 as default) based on Team-draft method: list
         Index + 1 represents the rank of the interleaved list and element is an tuple of the form (relevance: binary,ranker credit:binary), Credits are assigned as P(0) and E(1)
+        The list is shorter than max_interleav if both rankings run out of new results.
     """
     ranking_p = ranking_pair[0] #[(0,0),(0,0),(0,0)] form or duplicate [(0,1),(0,0),(0,0)]
     ranking_e = ranking_pair[1]
@@ -26,57 +51,110 @@ def td_interleaving(ranking_pair,max_interleav=3):
     e_team = 0
     p_pointer = 0 #Next top result from ranking p
     e_pointer = 0
-    found_duplicates = [] #Duplicate documents have an ID of greater than 0. A matching number is an duplciate
-    limit = len(ranking_p)
+    found_duplicates = set() #Duplicate documents have an ID of greater than 0. A matching number is an duplciate
+    limit_p = len(ranking_p)
+    limit_e = len(ranking_e)
 
-    #while p_pointer < limit and e_pointer < limit:
     while len(interleaved) < max_interleav:
 
-        p_priority = np.random.choice(2, 1)[0]
-        new_result = False
-        if (p_team < e_team) or (p_team == e_team and p_priority == 1):
-
-            while not new_result:
-                top_result_p = ranking_p[p_pointer]
-                relevance_p, duplicate_id_p = top_result_p
-
-                p_pointer += 1
-                if duplicate_id_p not in found_duplicates:
-                    new_result = True
-                    break
-                elif p_pointer == limit:
-                    break
-
-            if new_result:
-                #interleaved.append( (relevance_p,"P") )
-                interleaved.append((relevance_p, 0))
-                p_team += 1
+        if p_pointer == limit_p and e_pointer == limit_e:
+            break
 
-                if duplicate_id_p > 0:
-                    found_duplicates.append(duplicate_id_p)
-        else:
+        p_priority = random_streams.integers(2)
+        p_turn = (p_team < e_team) or (p_team == e_team and p_priority == 1)
+        #Exhausted rankers hand their turn to the other ranker
+        if e_pointer == limit_e:
+            p_turn = True
+        elif p_pointer == limit_p:
+            p_turn = False
 
-            while not new_result:
-                top_result_e = ranking_e[e_pointer]
-                relevance_e, duplicate_id_e = top_result_e
-                e_pointer += 1
+        if p_turn:
+            ranking, pointer, limit = ranking_p, p_pointer, limit_p
+        else:
+            ranking, pointer, limit = ranking_e, e_pointer, limit_e
 
-                if duplicate_id_e not in found_duplicates:
-                    new_result = True
-                    break
-                elif e_pointer == limit:
-                    break
+        #Skip results of which the duplicate is already interleaved
+        new_result = False
+        while pointer < limit:
+            relevance, duplicate_id = ranking[pointer]
+            pointer += 1
+            if duplicate_id not in found_duplicates:
+                new_result = True
+                break
+
+        if p_turn:
+            p_pointer = pointer
+        else:
+            e_pointer = pointer
 
-            if new_result:
-                #interleaved.append((relevance_e, "E"))
-                interleaved.append((relevance_e, 1))
+        if new_result:
+            if p_turn:
+                interleaved.append((relevance, 0))
+                p_team += 1
+            else:
+                interleaved.append((relevance, 1))
                 e_team += 1
 
-                if duplicate_id_e > 0:
-                    found_duplicates.append(duplicate_id_e)
+            if duplicate_id > 0:
+                found_duplicates.add(duplicate_id)
 
     return interleaved
 
+def td_multileaving(rankings,max_multileav=3):
+    """Run Team-draft multileaving given any number of rankings as input
+
+    Source
+    ------
+    The method originates from a paper by A. Schuth et al. named
+    "Multileaved Comparisons for Fast Online Evaluation".
+
+    Parameters
+    ----------
+    Rankings : List of ranked and labeled results for each ranker
+        Each element of a ranking is a tuple of the relevance score and a duplicate ID.
+        If this value is 0, the document does not appear in the results of any other ranker.
+        If the value is greater than 0, the document is the same as every document of the other rankers with that number.
+        Example for three rankers: [[(1,1),(0,0)], [(0,2),(1,1)], [(0,2),(0,0)]]
+    Returns
+    -------
+    Multileaved list (of length 3 as default) based on Team-draft method: list
+        Index + 1 represents the rank of the multileaved list and element is an tuple of the form (relevance, ranker credit),
+        the credit is the index of the ranker in rankings.
+        The list is shorter than max_multileav if all rankings run out of new results.
+    """
+    multileaved = []
+    n_rankers = len(rankings)
+    team_sizes = [0] * n_rankers #Amount results assigned from each ranker
+    pointers = [0] * n_rankers #Next top result of each ranker
+    active = set(range(n_rankers)) #Rankers that may still have new results
+    found_duplicates = set()
+
+    while len(multileaved) < max_multileav and active:
+
+        #The ranker with the smallest team picks next, ties are broken randomly
+        smallest = min(team_sizes[team] for team in active)
+        candidates = [team for team in sorted(active) if team_sizes[team] == smallest]
+        team = candidates[random_streams.integers(len(candidates))]
+
+        ranking = rankings[team]
+        new_result = False
+        while pointers[team] < len(ranking):
+            relevance, duplicate_id = ranking[pointers[team]]
+            pointers[team] += 1
+            if duplicate_id not in found_duplicates:
+                new_result = True
+                break
+
+        if new_result:
+            multileaved.append((relevance, team))
+            team_sizes[team] += 1
+            if duplicate_id > 0:
+                found_duplicates.add(duplicate_id)
+        if pointers[team] == len(ranking):
+            active.discard(team)
+
+    return multileaved
+
 def get_softmax(ranking_indices,tau):
     """Compute softmax distribution for a ranker given the indices of documents that are avaliable to be picked.
 
@@ -110,7 +188,85 @@ def get_softmax(ranking_indices,tau):
 
     return softmax_distribution
 
-def prob_interleaving(ranking_pair,max_interleav=3,tau=3):
+def get_rank_weights(limit,tau):
+    """Compute the unnormalized softmax numerators 1/rank**tau for every rank of a ranking.
+
+    Parameters
+    ----------
+    limit : Length of the ranking.
+    tau : Exponent of the softmax distribution.
+
+    Returns
+    -------
+    Rank weights : numpy array
+        Element i is the numerator of the softmax distribution for the document at index i.
+        Masking out picked documents and normalizing gives the same distribution as get_softmax.
+    """
+    return 1 / np.arange(1, limit + 1, dtype=float) ** tau
+
+def get_weight_tree(weights):
+    """Build a Fenwick tree over rank weights, so a document can be picked and removed in O(log n) time.
+
+    Parameters
+    ----------
+    weights : List of the rank weights of the ranking, see get_rank_weights.
+
+    Returns
+    -------
+    Weight tree : list
+        One-based Fenwick tree, element i holds the sum of the weights at indices i - (i & -i) up to i - 1.
+    """
+    tree = [0.0] + list(weights)
+    for i in range(1, len(tree)):
+        parent = i + (i & -i)
+        if parent < len(tree):
+            tree[parent] += tree[i]
+    return tree
+
+def remove_weight(tree,index,weight):
+    """Remove the weight of a picked document from a weight tree.
+
+    Parameters
+    ----------
+    tree : Weight tree, see get_weight_tree.
+    index : Index of the document in the ranking.
+    weight : Rank weight of the document.
+    """
+    i = index + 1
+    while i < len(tree):
+        tree[i] -= weight
+        i += i & -i
+
+def pick_softmax(tree,total,available):
+    """Pick the index of a document from a ranking according to its softmax distribution.
+
+    Parameters
+    ----------
+    tree : Weight tree of the available documents, see get_weight_tree.
+    total : Sum of the weights of the available documents.
+    available : Boolean numpy array, True for documents that can still be picked.
+
+    Returns
+    -------
+    Picked index : int
+        Index of the picked document in the ranking, the first index at which the cumulative weight
+        exceeds a uniform draw times the total weight.
+    """
+    target = random_streams.random() * total
+    index = 0
+    step = 1 << (len(tree) - 1).bit_length() >> 1
+    while step:
+        if index + step < len(tree) and tree[index + step] <= target:
+            index += step
+            target -= tree[index]
+        step >>= 1
+    #Rounding can end on a picked document or past the last one, then the nearest available document is picked
+    if index >= len(available) or not available[index]:
+        candidates = np.flatnonzero(available)
+        index = int(candidates[min(np.searchsorted(candidates, index), len(candidates) - 1)])
+    return index
+
+def prob_interleaving(ranking_pair,max_interleav=3,tau=3,choices=None):
     """Run Probabilistic interleaving  given a ranking pair as input
 
     Parameters
@@ -122,63 +278,306 @@ def prob_interleaving(ranking_pair,max_interleav=3,tau=3):
         If the value is greater than 0, then it has a duplicate with another result of the other ranker that matches this number
         No duplicate example: E ranked list:  [(0,0),(0,0),(0,0)] and P ranked list: [(1,0),(0,0),(0,0)] form
         2 duplicates example: E ranked list: [(1,1),(0,2),(0,0)]  and P ranked list: [(1,0),(1,1),(0,2)]  for example
+    choices : Optional list to record the softmax draws in.
+        Every draw is appended as a tuple of the picked index and a copy of the boolean mask of documents
+        that were available in the ranking of the picking ranker, see get_choices_log_p.
     Returns
     -------
     Interleaved list (of length 3 as default) based on probabilistc interleaving method: list
         Index + 1 represents the rank of the interleaved list and element is an tuple of the form (relevance: binary,ranker credit:binary), credits are assigned as P(0) and E(1)
+        The list is shorter than max_interleav if both rankings run out of results.
     """
 
     ranking_p = ranking_pair[0] #[(0,0),(0,0),(0,0)] form or duplicate [(0,1),(0,0),(0,0)]
     ranking_e = ranking_pair[1] #[(0,0),(0,0),(0,0)] form or duplicate #[(0,1),(0,0),(0,0)]
     interleaved = []
-    limit = len(ranking_p)
 
-    p_indices = list(range(limit))
-    e_indices = list(range(limit))
+    #Available documents are kept as masks and duplicates are looked up in precomputed maps
+    p_available = np.ones(len(ranking_p), dtype=bool)
+    e_available = np.ones(len(ranking_e), dtype=bool)
+    n_p = len(ranking_p)
+    n_e = len(ranking_e)
+    p_weights = get_rank_weights(n_p, tau).tolist()
+    e_weights = get_rank_weights(n_e, tau).tolist()
+    #Weights of available documents are kept in trees, so every pick and removal takes O(log n) time
+    p_tree = get_weight_tree(p_weights)
+    e_tree = get_weight_tree(e_weights)
+    p_total = sum(p_weights)
+    e_total = sum(e_weights)
+    p_duplicates = get_duplicate_map(ranking_p)
+    e_duplicates = get_duplicate_map(ranking_e)
+
+    while len(interleaved) < max_interleav and (n_p > 0 or n_e > 0):
+
+        p_priority = random_streams.integers(2)
+
+        if (p_priority and n_p > 0) or n_e == 0:
+            doc_index_p = pick_softmax(p_tree, p_total, p_available)
+            if choices is not None:
+                choices.append((doc_index_p, p_available.copy()))
+            p_available[doc_index_p] = False
+            remove_weight(p_tree, doc_index_p, p_weights[doc_index_p])
+            p_total -= p_weights[doc_index_p]
+            n_p -= 1
+
+            relevance_p, duplicate_id_p = ranking_p[doc_index_p]
+            interleaved.append((relevance_p, 0))
+
+            if duplicate_id_p > 0:
+                duplicate_index = e_duplicates[duplicate_id_p]
+                e_available[duplicate_index] = False
+                remove_weight(e_tree, duplicate_index, e_weights[duplicate_index])
+                e_total -= e_weights[duplicate_index]
+                n_e -= 1
+        else:
+            doc_index_e = pick_softmax(e_tree, e_total, e_available)
+            if choices is not None:
+                choices.append((doc_index_e, e_available.copy()))
+            e_available[doc_index_e] = False
+            remove_weight(e_tree, doc_index_e, e_weights[doc_index_e])
+            e_total -= e_weights[doc_index_e]
+            n_e -= 1
+
+            relevance_e, duplicate_id_e = ranking_e[doc_index_e]
+            interleaved.append((relevance_e, 1))
+
+            if duplicate_id_e > 0:
+                duplicate_index = p_duplicates[duplicate_id_e]
+                p_available[duplicate_index] = False
+                remove_weight(p_tree, duplicate_index, p_weights[duplicate_index])
+                p_total -= p_weights[duplicate_index]
+                n_p -= 1
+
+    return interleaved
 
-    found_duplicates = []
+def get_choices_log_p(choices,tau):
+    """Compute the log probability of the softmax draws made by Probabilistic interleaving under a given tau.
 
-    #while len(p_indices) > 0 or len(e_indices) > 0:
-    while len(interleaved) < max_interleav:
+    Parameters
+    ----------
+    choices : List of softmax draws as recorded by prob_interleaving.
+    tau : Exponent of the softmax distribution.
+
+    Returns
+    -------
+    Log probability : float
+        Log probability of making the recorded draws. The coin flips deciding which ranker picks do not depend on tau,
+        so the ratio of this value under two values of tau is the ratio of the probabilities of the whole interleaving.
+    """
+    log_p = 0.0
+    for doc_index, available in choices:
+        weights = get_rank_weights(len(available), tau)
+        log_p += np.log(weights[doc_index]) - np.log((weights * available).sum())
+    return log_p
+
+def get_allowed_interleavings(ranking_pair,max_interleav=3):
+    """Enumerate all interleavings allowed by Optimized interleaving given a ranking pair as input
+
+    Parameters
+    ----------
+    An ranking pair : List of ranked and labeled results
+        Same form as the input of td_interleaving.
+    max_interleav : Maximum length of the interleaved lists.
+
+    Returns
+    -------
+    Allowed interleavings: list
+        Every allowed interleaving is a tuple of (relevance, ranker credit) tuples. Each document in an allowed interleaving
+        is the top result of ranker P or E that was not interleaved yet, so every prefix is made of a top part of both rankings.
+        A document is credited to the ranker that ranks it highest. Documents that both rankers place at the same index
+        appear once with either credit.
+    """
+    ranking_p = ranking_pair[0]
+    ranking_e = ranking_pair[1]
+    p_duplicates = get_duplicate_map(ranking_p)
+    e_duplicates = get_duplicate_map(ranking_e)
+    allowed = []
+
+    def next_new(ranking, pointer, found_duplicates):
+        while pointer < len(ranking) and ranking[pointer][1] in found_duplicates:
+            pointer += 1
+        return pointer
+
+    def get_credits(duplicate_id, p_index, e_index):
+        if duplicate_id == 0:
+            return [0] if e_index is None else [1]
+        if p_index is None:
+            p_index = p_duplicates[duplicate_id]
+        if e_index is None:
+            e_index = e_duplicates[duplicate_id]
+        if p_index < e_index:
+            return [0]
+        if p_index > e_index:
+            return [1]
+        return [0, 1]
+
+    def extend(prefix, p_pointer, e_pointer, found_duplicates):
+        p_pointer = next_new(ranking_p, p_pointer, found_duplicates)
+        e_pointer = next_new(ranking_e, e_pointer, found_duplicates)
+        if len(prefix) == max_interleav or (p_pointer == len(ranking_p) and e_pointer == len(ranking_e)):
+            allowed.append(tuple(prefix))
+            return
+
+        candidates = [] #Tuples of (relevance, duplicate id, credits, next p pointer, next e pointer)
+        if p_pointer < len(ranking_p):
+            relevance_p, duplicate_id_p = ranking_p[p_pointer]
+            candidates.append((relevance_p, duplicate_id_p, get_credits(duplicate_id_p, p_pointer, None),
+                               p_pointer + 1, e_pointer))
+        if e_pointer < len(ranking_e):
+            relevance_e, duplicate_id_e = ranking_e[e_pointer]
+            if not (candidates and duplicate_id_e > 0 and duplicate_id_e == candidates[0][1]):
+                candidates.append((relevance_e, duplicate_id_e, get_credits(duplicate_id_e, None, e_pointer),
+                                   p_pointer, e_pointer + 1))
+            else:
+                #Both rankers have the same next document
+                candidates[0] = (relevance_p, duplicate_id_p, get_credits(duplicate_id_p, p_pointer, e_pointer),
+                                 p_pointer + 1, e_pointer + 1)
+
+        for relevance, duplicate_id, credits, next_p, next_e in candidates:
+            found = found_duplicates | {duplicate_id} if duplicate_id > 0 else found_duplicates
+            for credit in credits:
+                extend(prefix + [(relevance, credit)], next_p, next_e, found)
+
+    extend([], 0, 0, frozenset())
+    return allowed
+
+def solve_optimized_distribution(interleavings):
+    """Solve for a distribution over allowed interleavings that is unbiased under random clicks.
+
+    Source
+    ------
+    The method originates from a paper by F. Radlinski and N. Craswell named
+    "Optimized Interleaving for Online Retrieval Evaluation".
+
+    Parameters
+    ----------
+    interleavings : List of allowed interleavings, see get_allowed_interleavings.
+
+    Returns
+    -------
+    Probabilities : numpy array
+        Probability of showing each interleaving. For every rank k the expected number of documents credited to P
+        in the top k equals that of E, so random clicks favor neither ranker. Among those distributions the one
+        with the least rank-discounted credit imbalance is picked, which keeps the interleavings close to a fair draft.
+        If no distribution is exactly unbiased, the least biased one is returned.
+    """
+    n_interleavings = len(interleavings)
+    if n_interleavings == 1:
+        return np.ones(1)
+    length = max(len(interleaving) for interleaving in interleavings)
+
+    #Credit imbalance between P and E in the top k of every interleaving
+    imbalance = np.zeros((length, n_interleavings))
+    for l, interleaving in enumerate(interleavings):
+        difference = 0
+        for k in range(length):
+            if k < len(interleaving):
+                difference += 1 if interleaving[k][1] == 0 else -1
+            imbalance[k, l] = difference
+    ranks = np.arange(1, length + 1)[:, None]
+    cost = (np.abs(imbalance) / ranks).sum(axis=0)
+
+    #Slack variables absorb any remaining bias at a high cost so the program is always feasible
+    penalty = 1000 * (cost.max() + 1)
+    c = np.concatenate([cost, np.full(2 * length, penalty)])
+    a_eq = np.zeros((length + 1, n_interleavings + 2 * length))
+    a_eq[:length, :n_interleavings] = imbalance
+    a_eq[:length, n_interleavings:n_interleavings + length] = np.eye(length)
+    a_eq[:length, n_interleavings + length:] = -np.eye(length)
+    a_eq[length, :n_interleavings] = 1
+    b_eq = np.zeros(length + 1)
+    b_eq[length] = 1
+
+    from scipy import optimize
+    solution = optimize.linprog(c, A_eq=a_eq, b_eq=b_eq, bounds=(0, None), method='highs')
+    probabilities = np.clip(solution.x[:n_interleavings], 0, None)
+    return probabilities / probabilities.sum()
+
+def get_alias_table(probabilities):
+    """Build an alias table to draw from a discrete distribution in constant time.
+
+    Source
+    ------
+    Vose's alias method, as described in "A Linear Algorithm for Generating Random Numbers
+    with a Given Distribution" by M. D. Vose.
+
+    Parameters
+    ----------
+    probabilities : List of probabilities that sum to 1.
 
-        p_priority = np.random.choice(2, 1)[0]
-
-        if (p_priority and len(p_indices) > 0) or len(e_indices) == 0:
-            softmax_p = get_softmax(p_indices,tau)
-            doc_index_p = np.random.choice(p_indices, 1, p=softmax_p)[0]
-            p_indices.remove(doc_index_p)
-
-            result_p = ranking_p[doc_index_p]
-            relevance_p, duplicate_id_p = result_p
-
-            if duplicate_id_p == 0 :
-                #interleaved.append((relevance_p, "P"))
-                interleaved.append((relevance_p, 0))
-            elif (duplicate_id_p > 0 and duplicate_id_p not in found_duplicates):
-                #interleaved.append((relevance_p, "P"))
-                interleaved.append((relevance_p, 0))
-                found_duplicates.append(duplicate_id_p)
-                duplicate_index = ranking_e.index(result_p)
-                e_indices.remove(duplicate_index)
+    Returns
+    -------
+    Alias table : tuple
+        Tuple of a numpy array with the probability of keeping each column and a numpy array with the alias of each column.
+    """
+    n = len(probabilities)
+    scaled = np.asarray(probabilities, dtype=float) * n
+    keep = np.ones(n)
+    alias = np.arange(n)
+    small = [i for i in range(n) if scaled[i] < 1]
+    large = [i for i in range(n) if scaled[i] >= 1]
+    while small and large:
+        s = small.pop()
+        l = large.pop()
+        keep[s] = scaled[s]
+        alias[s] = l
+        scaled[l] -= 1 - scaled[s]
+        if scaled[l] < 1:
+            small.append(l)
         else:
-            softmax_e = get_softmax(e_indices,tau)
-            doc_index_e = np.random.choice(e_indices, 1, p=softmax_e)[0]
-            e_indices.remove(doc_index_e)
-
-            result_e = ranking_e[doc_index_e]
-            relevance_e, duplicate_id_e = result_e
-
-            if duplicate_id_e == 0:
-                #interleaved.append((relevance_e, "E"))
-                interleaved.append((relevance_e, 1))
-            elif (duplicate_id_e > 0 and duplicate_id_e not in found_duplicates):
-                #interleaved.append((relevance_e, "E"))
-                interleaved.append((relevance_e, 1))
-                found_duplicates.append(duplicate_id_e)
-                duplicate_index = ranking_p.index(result_e)
-                p_indices.remove(duplicate_index)
+            large.append(l)
+    return keep, alias
 
-    return interleaved
+def draw_alias(alias_table):
+    """Draw an index from an alias table using a single uniform random number.
+
+    Parameters
+    ----------
+    alias_table : Alias table, see get_alias_table.
+
+    Returns
+    -------
+    Drawn index : int
+    """
+    keep, alias = alias_table
+    u = random_streams.random() * len(keep)
+    column = int(u)
+    if u - column < keep[column]:
+        return column
+    return alias[column]
+
+MAX_OPTIMIZED = 4096 #Number of ranking pairs of which the solved interleavings are kept
+_optimized_cache = OrderedDict() #Solved interleavings and alias tables per canonical ranking pair
+
+def optimized_interleaving(ranking_pair,max_interleav=3):
+    """Run Optimized interleaving given a ranking pair as input
+
+    Parameters
+    ----------
+    An ranking pair : List of ranked and labeled results
+        Same form as the input of td_interleaving.
+
+    Returns
+    -------
+    Interleaved list (of length 3 as default) based on optimized interleaving method: list
+        Index + 1 represents the rank of the interleaved list and element is an tuple of the form (relevance: binary,ranker credit:binary), credits are assigned as P(0) and E(1)
+        The distribution over interleavings is solved once per ranking pair and cached, later calls draw from it in constant time.
+        Pairs that only differ in the numbering of conflicts share an entry, at most MAX_OPTIMIZED entries are kept.
+    """
+    #Interleavings hold relevance and credit only, so they do not depend on the numbering of conflicts
+    pair = generate_input.canonical_pair(ranking_pair)
+    key = (pair, max_interleav)
+    if key in _optimized_cache:
+        _optimized_cache.move_to_end(key)
+    else:
+        interleavings = get_allowed_interleavings(pair, max_interleav)
+        probabilities = solve_optimized_distribution(interleavings)
+        _optimized_cache[key] = (interleavings, get_alias_table(probabilities))
+        if len(_optimized_cache) > MAX_OPTIMIZED:
+            _optimized_cache.popitem(last=False)
+
+    interleavings, alias_table = _optimized_cache[key]
+    return list(interleavings[draw_alias(alias_table)])
 
 def main():
     pair = [[(0,1),(0,2),(0,3),(0,4)],[(0,2),(0,3),(0,4),(0,1)]]
@@ -192,6 +591,15 @@ def main():
         interleav = prob_interleaving(pair)
         print("Probabilistic:",interleav)
 
+    for i in range(5):
+        interleav = optimized_interleaving(pair)
+        print("Optimized:",interleav)
+
+    rankings = [[(0,1),(0,2),(0,3)],[(0,2),(0,3),(0,1)],[(1,0),(0,1),(0,4)]]
+    for i in range(5):
+        multileav = td_multileaving(rankings)
+        print("Teamdraft multileaving:", multileav)
+
     print("---------------------Softmax ------------\n")
     softmax = get_softmax(list(range(3)),3)
     print(softmax)
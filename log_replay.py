@@ -0,0 +1,408 @@
+#!/usr/bin/env python3
+
+import argparse
+import csv
+from itertools import islice
+
+import numpy as np
+
+import click_model_v2 as cm
+import interleaving as il
+import random_streams
+
+
+def iter_queries(path, n=-1):
+    """Reads the queries of a yandex database one at a time,
+    see `click_model_v2.iter_yandex`.
+
+    Parameters
+    ----------
+    path : str
+        Path to database file.
+    n : int
+        Number of lines to read. Is ignored if value is lower than 0.
+
+    Returns
+    -------
+    out : generator
+        Generator of tuples of the query id and its list of urls.
+    """
+    for item in cm.iter_yandex(path, n):
+        if item['a'] == 'q':
+            yield item['a_id'], item['urls']
+
+def get_alphas(pbm, query_ids, urls, default=0.5):
+    """Looks up the attractiveness learned by a `PBM` of every result.
+
+    Parameters
+    ----------
+    pbm : PBM
+        Trained click model.
+    query_ids : array_like
+        Ids of the queries.
+    urls : array_like
+        Url ids of the results of every query.
+    default : float
+        Attractiveness of results the model did not learn, the value
+        to which `PBM` smooths results without observations.
+
+    Returns
+    -------
+    out : numpy array
+        Attractiveness of shape (number of queries, number of results).
+    """
+    return np.array([[pbm.alphas.get(str((url, q_id)), default)
+        for url in query_urls] for q_id, query_urls in zip(query_ids, urls)])
+
+def td_interleave_batch(rankings, length, rng):
+    """Runs Team-draft interleaving for many pairs of rankings at once,
+    with the same results as `interleaving.td_interleaving`.
+
+    Both rankings of a pair order the same documents, so every document
+    is a duplicate and a team picks its highest ranked document that
+    is not interleaved yet.
+
+    Parameters
+    ----------
+    rankings : numpy array
+        Integer array of shape (2, number of pairs, number of documents)
+        of the documents of the first (P) and second (E) ranking in order.
+    length : int
+        Length of the interleaved lists.
+    rng : numpy Generator
+        Random number generator.
+
+    Returns
+    -------
+    docs : numpy array
+        Documents of shape (number of pairs, length) in interleaved order.
+    teams : numpy array
+        Credit of every interleaved document, P(0) or E(1).
+    """
+    _, n_pairs, n_docs = rankings.shape
+    rows = np.arange(n_pairs)
+    picked = np.zeros((n_pairs, n_docs), dtype=bool)
+    team_sizes = np.zeros((2, n_pairs), dtype=np.int64)
+    docs = np.empty((n_pairs, length), dtype=np.int64)
+    teams = np.empty((n_pairs, length), dtype=np.int8)
+    for rank in range(length):
+        p_priority = rng.random(n_pairs) < 0.5
+        p_turn = (team_sizes[0] < team_sizes[1]) \
+            | ((team_sizes[0] == team_sizes[1]) & p_priority)
+        team = np.where(p_turn, 0, 1)
+        ranking = rankings[team, rows]
+        first = np.argmax(~picked[rows[:, None], ranking], axis=1)
+        docs[:, rank] = ranking[rows, first]
+        teams[:, rank] = team
+        picked[rows, docs[:, rank]] = True
+        team_sizes[team, rows] += 1
+    return docs, teams
+
+def prob_interleave_batch(rankings, length, rng, tau=3):
+    """Runs Probabilistic interleaving for many pairs of rankings
+    at once, with the same results as `interleaving.prob_interleaving`.
+
+    Parameters
+    ----------
+    rankings : numpy array
+        Integer array of shape (2, number of pairs, number of documents)
+        of the documents of the first (P) and second (E) ranking in order,
+        both rankings of a pair ordering the same documents.
+    length : int
+        Length of the interleaved lists.
+    rng : numpy Generator
+        Random number generator.
+    tau : float
+        Exponent of the rank weights, see `interleaving.get_rank_weights`.
+
+    Returns
+    -------
+    docs : numpy array
+        Documents of shape (number of pairs, length) in interleaved order.
+    teams : numpy array
+        Credit of every interleaved document, P(0) or E(1).
+    """
+    _, n_pairs, n_docs = rankings.shape
+    rows = np.arange(n_pairs)
+    weights = il.get_rank_weights(n_docs, tau)
+    picked = np.zeros((n_pairs, n_docs), dtype=bool)
+    docs = np.empty((n_pairs, length), dtype=np.int64)
+    teams = np.empty((n_pairs, length), dtype=np.int8)
+    for rank in range(length):
+        team = np.where(rng.random(n_pairs) < 0.5, 0, 1)
+        ranking = rankings[team, rows]
+        cumulative = np.cumsum(weights * ~picked[rows[:, None], ranking],
+            axis=1)
+        target = rng.random(n_pairs) * cumulative[:, -1]
+        index = (cumulative <= target[:, None]).sum(axis=1)
+        docs[:, rank] = ranking[rows, index]
+        teams[:, rank] = team
+        picked[rows, docs[:, rank]] = True
+    return docs, teams
+
+# Batched interleaving methods by name.
+INTERLEAVINGS = {
+    'td' : td_interleave_batch,
+    'pi' : prob_interleave_batch
+}
+
+
+class Replay:
+    """Log Replay
+    ==========
+
+    Interleaving evaluation on the queries of a click log.
+
+    For every logged query the logged order of its urls (P) is
+    interleaved with a re-ranking by the attractiveness learned by
+    a `PBM` (E), and clicks on the interleaved lists are simulated
+    with the gammas and alphas of that model, or with the `rho` of
+    an `RCM`. Queries are streamed from the log and processed in
+    batches, in which all interleavings and clicks are drawn as arrays.
+    Wins are summed per query id.
+    """
+    def __init__(self, pbm, click_model=None, interleaving='td', length=10,
+            n_impressions=10, seed=0):
+        """Initializes class parameters.
+
+        Parameters
+        ----------
+        pbm : PBM
+            Trained click model of which the alphas re-rank the results.
+        click_model : PBM or RCM
+            Trained click model that simulates clicks, defaults to `pbm`.
+        interleaving : str
+            Name of the interleaving method in `INTERLEAVINGS`.
+        length : int
+            Length of the interleaved lists.
+        n_impressions : int
+            Number of simulated impressions of every logged query.
+        seed : int
+            Seed of the simulations.
+        """
+        self.pbm = pbm
+        self.click_model = pbm if click_model is None else click_model
+        self.interleave = INTERLEAVINGS[interleaving]
+        self.length = length
+        self.n_impressions = n_impressions
+        self.rng = random_streams.RandomStream(seed).generator
+        # Wins of P, wins of E and ties per replayed query, in the rows
+        # given by the index of its query id.
+        self.index = {}
+        self.counts = np.zeros((0, 3), dtype=np.int64)
+
+    def get_click_probabilities(self, alphas, docs):
+        """Determines the click probability of every interleaved document.
+
+        Parameters
+        ----------
+        alphas : numpy array
+            Attractiveness of every result of every impression.
+        docs : numpy array
+            Interleaved documents of every impression.
+
+        Returns
+        -------
+        out : numpy array
+            Click probabilities of the shape of `docs`.
+        """
+        if isinstance(self.click_model, cm.RCM):
+            return np.full(docs.shape, self.click_model.rho)
+        gammas = np.zeros(docs.shape[1])
+        n_gammas = min(len(self.click_model.gammas), docs.shape[1])
+        gammas[:n_gammas] = self.click_model.gammas[:n_gammas]
+        return gammas * np.take_along_axis(alphas, docs, axis=1)
+
+    def run_batch(self, query_ids, urls):
+        """Simulates the impressions of a batch of queries.
+
+        Parameters
+        ----------
+        query_ids : array_like
+            Ids of the queries.
+        urls : array_like
+            Url ids of the results of every query, all of the same length.
+
+        Returns
+        -------
+        out : numpy array
+            Wins of P, wins of E and ties of every query.
+        """
+        alphas = get_alphas(self.pbm, query_ids, urls)
+        n_queries, n_docs = alphas.shape
+        logged = np.broadcast_to(np.arange(n_docs), (n_queries, n_docs))
+        reranked = np.argsort(-alphas, axis=1, kind='stable')
+        rankings = np.repeat(np.stack([logged, reranked]),
+            self.n_impressions, axis=1)
+        alphas = np.repeat(alphas, self.n_impressions, axis=0)
+        docs, teams = self.interleave(rankings, min(self.length, n_docs),
+            self.rng)
+        clicks = self.rng.random(docs.shape) \
+            < self.get_click_probabilities(alphas, docs)
+        e_clicks = (clicks & (teams == 1)).sum(axis=1)
+        p_clicks = (clicks & (teams == 0)).sum(axis=1)
+        outcomes = np.where(e_clicks == p_clicks, 2,
+            np.where(e_clicks > p_clicks, 1, 0))
+        out = np.zeros((n_queries, 3), dtype=np.int64)
+        np.add.at(out, (np.repeat(np.arange(n_queries), self.n_impressions),
+            outcomes), 1)
+        return out
+
+    def add(self, query_ids, counts):
+        """Adds the counts of a batch to the counts per query id.
+
+        Parameters
+        ----------
+        query_ids : array_like
+            Ids of the queries.
+        counts : numpy array
+            Wins of P, wins of E and ties of every query.
+
+        Returns
+        -------
+        None
+        """
+        unique, inverse = np.unique(np.asarray(query_ids, dtype=np.int64),
+            return_inverse=True)
+        rows = np.array([self.index.setdefault(q_id, len(self.index))
+            for q_id in unique.tolist()], dtype=np.int64)
+        if len(self.index) > len(self.counts):
+            counts_all = np.zeros((max(len(self.index),
+                2 * len(self.counts)), 3), dtype=np.int64)
+            counts_all[:len(self.counts)] = self.counts
+            self.counts = counts_all
+        np.add.at(self.counts, rows[inverse], counts)
+        return
+
+    def run(self, queries, batch_size=4096):
+        """Replays queries.
+
+        Parameters
+        ----------
+        queries : iterable
+            Tuples of a query id and its list of urls, such as
+            generated by `iter_queries`.
+        batch_size : int
+            Number of queries simulated at once.
+
+        Returns
+        -------
+        n_queries : int
+            Number of replayed queries.
+        """
+        n_queries = 0
+        queries = iter(queries)
+        batch = list(islice(queries, batch_size))
+        while batch != []:
+            # Queries with the same number of results are simulated together.
+            by_length = {}
+            for q_id, urls in batch:
+                if len(urls) > 1:
+                    by_length.setdefault(len(urls), []).append((q_id, urls))
+            for group in by_length.values():
+                query_ids = [q_id for q_id, _ in group]
+                self.add(query_ids, self.run_batch(query_ids,
+                    [urls for _, urls in group]))
+                n_queries += len(group)
+            batch = list(islice(queries, batch_size))
+        return n_queries
+
+    def get_wins(self):
+        """Lists the counts of the replayed queries.
+
+        Returns
+        -------
+        query_ids : numpy array
+            Ids of the queries that were replayed, in increasing order.
+        counts : numpy array
+            Wins of P, wins of E and ties of every query.
+        """
+        query_ids = np.fromiter(self.index, dtype=np.int64,
+            count=len(self.index))
+        rows = np.fromiter(self.index.values(), dtype=np.int64,
+            count=len(self.index))
+        order = np.argsort(query_ids)
+        return query_ids[order], self.counts[rows[order]]
+
+    def print_summary(self):
+        """Prints the total wins and the share of queries won by
+        each ranking.
+
+        Returns
+        -------
+        None
+        """
+        query_ids, counts = self.get_wins()
+        total = counts.sum(axis=0)
+        decided = total[0] + total[1]
+        print('queries', len(query_ids))
+        print('impressions', int(total.sum()))
+        print('wins logged', int(total[0]), 'wins re-ranked', int(total[1]),
+            'ties', int(total[2]))
+        if decided > 0:
+            print('p re-ranked', round(total[1] / float(decided), 4))
+        print('queries won by logged', int((counts[:, 0] > counts[:, 1]).sum()),
+            'by re-ranked', int((counts[:, 1] > counts[:, 0]).sum()))
+        return
+
+    def write(self, path):
+        """Writes the counts per query to a CSV file.
+
+        Parameters
+        ----------
+        path : str
+            Path of the CSV file.
+
+        Returns
+        -------
+        None
+        """
+        query_ids, counts = self.get_wins()
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['query_id', 'wins_logged', 'wins_reranked',
+                'ties'])
+            for q_id, (wins_p, wins_e, ties) in zip(query_ids.tolist(),
+                    counts.tolist()):
+                writer.writerow([q_id, wins_p, wins_e, ties])
+        return
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Replays logged queries with interleaving of the logged '
+        'order and a re-ranking by learned PBM alphas.')
+    parser.add_argument('path', help='path to the yandex log')
+    parser.add_argument('--train-lines', type=int, default=10**6,
+        help='number of lines to train the PBM on, -1 for the whole log')
+    parser.add_argument('--interleaving', choices=list(INTERLEAVINGS),
+        default='td')
+    parser.add_argument('--click-model', choices=['pbm', 'rcm'],
+        default='pbm')
+    parser.add_argument('--length', type=int, default=10)
+    parser.add_argument('--impressions', type=int, default=10)
+    parser.add_argument('--batch-size', type=int, default=4096)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='path to write wins per query to')
+    args = parser.parse_args()
+
+    database = cm.read_yandex(args.path, args.train_lines)
+    pbm = cm.PBM()
+    pbm.learn(database, 3, 5)
+    click_model = pbm
+    if args.click_model == 'rcm':
+        click_model = cm.RCM()
+        click_model.learn(database)
+    del database
+
+    replay = Replay(pbm, click_model, args.interleaving, args.length,
+        args.impressions, args.seed)
+    replay.run(iter_queries(args.path), args.batch_size)
+    replay.print_summary()
+    if args.output is not None:
+        replay.write(args.output)
+    return
+
+
+if __name__ == '__main__':
+    main()
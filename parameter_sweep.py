@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+
+from functools import partial
+
+import numpy as np
+
+import generate_input
+import interleaving as il
+import click_model_v2 as cm
+import power_analysis as pa
+
+
+def get_p(click_model, relevance_grades, epsilon=None):
+    """Determines chance of clicking on the documents of a search result
+    for a click model with or without an `epsilon` parameter.
+
+    Parameters
+    ----------
+    click_model : object
+        Click model with a `get_p` method, such as `RCM` or `PBM`.
+    relevance_grades : array_like
+        Array containing relevance grades for all documents
+        returned by a search query.
+    epsilon : float
+        Value passed on as `epsilon` to the click model.
+        Is ignored if `None`.
+
+    Returns
+    -------
+    out : list
+        List of click probabilities, see `PBM.get_p`.
+    """
+    if epsilon is None:
+        return click_model.get_p(relevance_grades)
+    return click_model.get_p(relevance_grades, epsilon)
+
+def get_reference(values):
+    """Picks the middle value of a parameter grid as reference setting,
+    which keeps importance weights of the other values in the grid small.
+
+    Parameters
+    ----------
+    values : array_like
+        Grid of parameter values, may contain `None`.
+
+    Returns
+    -------
+    out : object
+        Middle value of the sorted grid.
+    """
+    if None in values:
+        return None
+    values = sorted(values)
+    return values[len(values) // 2]
+
+
+def record_impressions(pair, k, click_model, length_interleaving,
+        tau=None, epsilon=None, interleaving_func=il.td_interleaving):
+    """Simulates user interaction on interleaved search results once
+    and records everything needed to re-weight the impressions
+    to other values of `tau` and `epsilon`.
+
+    Parameters
+    ----------
+    pair : tuple
+        Pair of ranking combinations.
+    k : int
+        Number of simulations.
+    click_model : object
+        Click model with `get_p` and `get_clicks` methods.
+    length_interleaving : int
+        Length of the interleaved lists.
+    tau : float
+        Value of `tau` used for probabilistic interleaving. If `None`,
+        `interleaving_func` is used instead, which then must not depend
+        on `tau`.
+    epsilon : float
+        Value of `epsilon` passed on to the click model. Is ignored
+        if `None`.
+    interleaving_func : function(tuple, int) -> list
+        Function to interleave the pair if `tau` is `None`.
+
+    Returns
+    -------
+    out : dict
+        Dictionary containing the reference `tau` and `epsilon`,
+        the softmax draws (`choices`) and the relevance grades and clicks
+        (`clicks`) of every impression as hashable tuples, and
+        a numpy array `outcome` that is 1 when the second ranking
+        combination won, -1 when the first won and 0 for a tie.
+    """
+    out = {'tau' : tau, 'epsilon' : epsilon,
+        'choices' : [], 'clicks' : [], 'outcome' : np.zeros(k, dtype=int)}
+    for i in range(k):
+        choices = []
+        if tau is None:
+            search_results = interleaving_func(pair, length_interleaving)
+        else:
+            search_results = il.prob_interleaving(
+                pair, length_interleaving, tau, choices)
+        relevance_grades = tuple(r for r, _ in search_results)
+        if epsilon is None:
+            clicked = click_model.get_clicks(list(relevance_grades))
+        else:
+            clicked = click_model.get_clicks(list(relevance_grades), epsilon)
+        # Determine who got most clicks.
+        n_E_click = sum(search_results[click][1] for click in clicked)
+        n_P_click = len(clicked) - n_E_click
+        out['outcome'][i] = np.sign(n_E_click - n_P_click)
+        out['choices'].append(tuple((int(doc_index), tuple(available))
+            for doc_index, available in choices))
+        clicked = set(clicked)
+        out['clicks'].append((relevance_grades,
+            tuple(j in clicked for j in range(len(relevance_grades)))))
+    return out
+
+def get_log_weights(records, click_model, tau=None, epsilon=None):
+    """Computes the importance weight of every recorded impression
+    for other values of `tau` and `epsilon`.
+
+    Parameters
+    ----------
+    records : dict
+        Recorded impressions, see `record_impressions`.
+    click_model : object
+        Click model the impressions were recorded with.
+    tau : float
+        Value of `tau` to re-weight to. Must be `None` if the impressions
+        were recorded without probabilistic interleaving.
+    epsilon : float
+        Value of `epsilon` to re-weight to.
+
+    Returns
+    -------
+    out : numpy array
+        Log of the ratio between the probability of each impression
+        under the given values and under the recorded values.
+        Impressions that are repeated share their computation.
+    """
+    cache = {}
+    def log_ratio(key, log_p_func):
+        if key not in cache:
+            with np.errstate(divide='ignore'):
+                cache[key] = log_p_func(key, True) - log_p_func(key, False)
+        return cache[key]
+
+    def choices_log_p(choices, new):
+        _tau = tau if new else records['tau']
+        return il.get_choices_log_p(
+            [(doc_index, np.array(available)) for doc_index, available
+            in choices], _tau)
+
+    def clicks_log_p(clicks, new):
+        relevance_grades, clicked = clicks
+        _epsilon = epsilon if new else records['epsilon']
+        p = get_p(click_model, list(relevance_grades), _epsilon)
+        log_p = 0.0
+        for p_i, clicked_i in zip(p, clicked):
+            log_p += np.log(p_i if clicked_i else 1 - p_i)
+        return log_p
+
+    out = np.zeros(len(records['outcome']))
+    if tau != records['tau']:
+        out += [log_ratio(('choices', choices), lambda key, new:
+            choices_log_p(key[1], new)) for choices in records['choices']]
+    if epsilon != records['epsilon']:
+        out += [log_ratio(('clicks', clicks), lambda key, new:
+            clicks_log_p(key[1], new)) for clicks in records['clicks']]
+    return out
+
+def effective_sample_size(weights):
+    """Computes the effective sample size of a set of importance weights.
+
+    Parameters
+    ----------
+    weights : numpy array
+        Importance weights.
+
+    Returns
+    -------
+    out : float
+        Effective sample size, equal to the number of weights if all
+        weights are equal.
+    """
+    total = weights.sum()
+    if total == 0:
+        return 0.0
+    return total ** 2 / (weights ** 2).sum()
+
+def reweighted_p(outcome, weights):
+    """Estimates the proportion of wins of the second ranking combination
+    from re-weighted impressions.
+
+    Parameters
+    ----------
+    outcome : numpy array
+        Outcome of every impression, see `record_impressions`.
+    weights : numpy array
+        Importance weight of every impression.
+
+    Returns
+    -------
+    p : float
+        Proportion of wins of second ranking combination in pair.
+        Is `None` if no impression with a winner has any weight.
+    """
+    decisive = weights[outcome != 0].sum()
+    if decisive == 0:
+        return None
+    return weights[outcome == 1].sum() / decisive
+
+
+def sweep(pair, k, click_model, length_interleaving, taus=(None,),
+        epsilons=(None,), interleaving_func=il.td_interleaving, min_ess=0.1):
+    """Estimates the proportion of wins of the second ranking combination
+    for a grid of `tau` and `epsilon` values from a single simulation.
+
+    Impressions are simulated once under the middle values of the grids
+    and re-weighted to every other grid point. Grid points at which
+    the effective sample size drops below `min_ess` times `k` are
+    simulated anew with `interleaving_simulation`.
+
+    Parameters
+    ----------
+    pair : tuple
+        Pair of ranking combinations.
+    k : int
+        Number of simulations.
+    click_model : object
+        Click model with `get_p` and `get_clicks` methods.
+    length_interleaving : int
+        Length of the interleaved lists.
+    taus : array_like
+        Values of `tau` for probabilistic interleaving. If `(None,)`,
+        `interleaving_func` is used instead.
+    epsilons : array_like
+        Values of `epsilon` for the click model. If `(None,)`,
+        the click model is called without `epsilon`.
+    interleaving_func : function(tuple, int) -> list
+        Function to interleave the pair if `taus` is `(None,)`.
+    min_ess : float
+        Minimum fraction of effective samples for a re-weighted estimate.
+
+    Returns
+    -------
+    out : dict
+        Dictionary mapping every `(tau, epsilon)` grid point to
+        a dictionary with the proportion `p`, the fraction of effective
+        samples `ess` and whether the point was simulated anew
+        (`resimulated`).
+    """
+    tau_ref = get_reference(taus)
+    epsilon_ref = get_reference(epsilons)
+    records = record_impressions(pair, k, click_model, length_interleaving,
+        tau_ref, epsilon_ref, interleaving_func)
+    out = {}
+    for tau in taus:
+        for epsilon in epsilons:
+            weights = np.exp(get_log_weights(
+                records, click_model, tau, epsilon))
+            ess = effective_sample_size(weights) / k
+            p = reweighted_p(records['outcome'], weights)
+            resimulated = p is None or ess < min_ess
+            if resimulated:
+                if tau is None:
+                    _interleaving_func = interleaving_func
+                else:
+                    _interleaving_func = partial(il.prob_interleaving, tau=tau)
+                if epsilon is None:
+                    click_model_func = click_model.get_clicks
+                else:
+                    click_model_func = partial(
+                        click_model.get_clicks, epsilon=epsilon)
+                p = pa.interleaving_simulation(pair, k, _interleaving_func,
+                    click_model_func, length_interleaving)
+            out[(tau, epsilon)] = {'p' : float(p), 'ess' : float(ess),
+                'resimulated' : bool(resimulated)}
+    return out
+
+
+def main():
+    length_interleaving = 3
+    n_simulations = 500
+    n_bins = 10
+    cut_sides = 0.05
+    taus = [1, 2, 3, 4, 5]
+    epsilons = [0.05, 0.1, 0.15, 0.2]
+    inputs = generate_input.gen_input_pairs(length_interleaving, 2)
+    # Click model training.
+    pbm = cm.PBM()
+    database = cm.read_yandex('./YandexRelPredChallenge.txt')
+    pbm.learn(database, 3, 5, length_interleaving)
+    # Simulate once per permutation for the whole grid.
+    bins = {(tau, epsilon) : [[] for _ in range(n_bins)]
+        for tau in taus for epsilon in epsilons}
+    n_resimulated = 0
+    for pair in inputs:
+        dERR = generate_input.ERR(pair[1]) - generate_input.ERR(pair[0])
+        if dERR >= cut_sides and dERR < 1.0 - cut_sides:
+            for permutation in generate_input.add_conflicts(pair):
+                results = sweep(permutation, n_simulations, pbm,
+                    length_interleaving, taus, epsilons)
+                for point, result in results.items():
+                    bins[point][int(dERR * 10)].append(
+                        pa.compute_sample_size(result['p']))
+                    n_resimulated += result['resimulated']
+    # Process bins.
+    bin_labels = pa.get_bin_labels(n_bins, cut_sides=cut_sides)
+    for (tau, epsilon), cur_bins in bins.items():
+        print('===== tau ' + str(tau) + ', epsilon ' + str(epsilon)
+            + ' =====')
+        pa.print_bin_info(pa.process_bins(cur_bins), bin_labels)
+    print('Simulated anew:', n_resimulated)
+    return
+
+
+if __name__ == '__main__':
+    main()
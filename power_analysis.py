@@ -1,12 +1,15 @@
 #!/usr/bin/env python3
 
+import bin_statistics
 import generate_input
-import random
+import simulation_memo
+import html
+import io
+import random_streams
 
-from scipy import stats, sqrt
-from math import ceil
-
-import matplotlib.pyplot as plt
+import numpy as np
+from math import ceil, log, sqrt
+from functools import lru_cache
 
 def tmp_interleaving(pair, length=-1):
     """Temporary interleaving function for simulation test.
@@ -25,7 +28,7 @@ def tmp_interleaving(pair, length=-1):
     if length < 0:
         length = sum([len(p) for p in pair])
     for item0, item1 in zip(pair[0], pair[1]):
-        if random.random() < 0.5:
+        if random_streams.random() < 0.5:
             out.append((item0, 0))
             out.append((item1, 1))
         else:
@@ -49,12 +52,12 @@ def tmp_click_model(search_results):
     """
     index = len(search_results)
     while index >= len(search_results):
-        index = int(abs(random.gauss(0, 1) / 2 * len(search_results)))
+        index = int(abs(random_streams.gauss(0, 1) / 2 * len(search_results)))
     out = [index]
     return out
 
 
-def interleaving_simulation(pair, k, interleaving_func, click_model_func, length_interleaving=-1):
+def interleaving_simulation(pair, k, interleaving_func, click_model_func, length_interleaving=-1, memo=None, return_counts=False):
     """Simulates user interaction on interleaved search results.
 
     Parameters
@@ -67,13 +70,29 @@ def interleaving_simulation(pair, k, interleaving_func, click_model_func, length
         Function to interleave the two lists of ranking combinations.
     click_model : function(array_like) -> int
         Function to simulate user click.
+    memo : SimulationMemo
+        Store of earlier simulation results that is consulted
+        before simulating and updated afterwards. Is ignored if `None`.
+    return_counts : bool
+        Whether to return the numbers of wins and ties as well.
 
     Returns
     -------
     p : float
         Proportion of wins of second ranking combination in pair.
+    counts : list
+        Numbers of wins of the first and the second ranking combination
+        and number of ties. Is only returned if `return_counts` is `True`.
     """
+    if memo is not None:
+        key = simulation_memo.get_memo_key(pair, k, interleaving_func,
+            click_model_func, length_interleaving, memo.seed)
+        stored = memo.get(key)
+        if stored is not None:
+            p, counts = stored
+            return (p, counts) if return_counts else p
     wins = [0] * len(pair)
+    ties = 0
     while sum(wins) == 0:
         for _ in range(k):
             # Create interleaved list
@@ -96,16 +115,109 @@ def interleaving_simulation(pair, k, interleaving_func, click_model_func, length
                     n_P_click += 1
 
             if n_E_click == n_P_click:
-                continue
+                ties += 1
             elif n_E_click > n_P_click:
                 wins[1] += 1
             else:
                 wins[0] += 1
 
     p = wins[1] / float(wins[0] + wins[1])
+    counts = [wins[0], wins[1], ties]
+    if memo is not None:
+        memo.put(key, p, counts)
+    return (p, counts) if return_counts else p
+
+
+def multileaving_simulation(rankings, k, multileaving_func, click_model_func, length_multileaving=3):
+    """Simulates user interaction on multileaved search results
+    and compares all rankers against each other at once.
+
+    Parameters
+    ----------
+    rankings : array_like
+        List of ranking combinations, one for each ranker.
+    k : int
+        Number of simulations.
+    multileaving_func : function(array_like, int) -> list
+        Function to multileave the lists of ranking combinations.
+        Credits in the multileaved list are indices in `rankings`.
+    click_model_func : function(array_like) -> list
+        Function to simulate user clicks.
+    length_multileaving : int
+        Length of the multileaved lists, must be positive.
+
+    Returns
+    -------
+    p : list
+        Matrix in which `p[a][b]` is the proportion of wins of ranker `b`
+        over ranker `a`, counted over the simulations in which one of both
+        got more clicks than the other. Is `None` if they always tied.
+    """
+    if length_multileaving < 1:
+        # Empty multileaved lists would make every simulation a tie.
+        raise ValueError('length_multileaving must be positive')
+    n_rankers = len(rankings)
+    wins = [[0] * n_rankers for _ in range(n_rankers)]
+    for _ in range(k):
+        # Create multileaved list
+        search_results = multileaving_func(rankings, length_multileaving)
+        relevance_grades = [relevance for relevance, _ in search_results]
+        # Count clicks per ranker
+        n_clicks = [0] * n_rankers
+        for click in click_model_func(relevance_grades):
+            n_clicks[search_results[click][1]] += 1
+        # Every ranker with more clicks wins from every ranker with fewer
+        for a in range(n_rankers):
+            for b in range(n_rankers):
+                if n_clicks[a] > n_clicks[b]:
+                    wins[a][b] += 1
+
+    p = [[None] * n_rankers for _ in range(n_rankers)]
+    for a in range(n_rankers):
+        for b in range(n_rankers):
+            if a != b and wins[a][b] + wins[b][a] > 0:
+                p[a][b] = wins[b][a] / float(wins[a][b] + wins[b][a])
     return p
 
 
+@lru_cache(maxsize=None)
+def get_z(q):
+    """Computes a quantile of the standard normal distribution.
+    Quantiles are computed once per process and then reused.
+    
+    Parameters
+    ----------
+        q : float
+            Probability of the quantile.
+    
+    Returns
+    -------
+        z : float
+            Quantile.
+    """
+    # Imported here so that workers do not load scipy.
+    from scipy import stats
+    return float(stats.norm.ppf(q))
+
+def get_z_array(q):
+    """Computes quantiles of the standard normal distribution
+    for an array of probabilities with `get_z`.
+    
+    Parameters
+    ----------
+        q : numpy array
+            Probabilities of the quantiles.
+    
+    Returns
+    -------
+        z : numpy array
+            Quantiles.
+    """
+    q = np.asarray(q, dtype=float)
+    unique, inverse = np.unique(q, return_inverse=True)
+    z = np.array([get_z(float(u)) for u in unique])
+    return z[inverse].reshape(q.shape)
+
 def compute_sample_size(p1, alpha=0.05, beta=0.10):
     """Computes sample size for a given proportion
     based on power analysis. Returns -1 if p1 == 0.5.
@@ -130,13 +242,339 @@ def compute_sample_size(p1, alpha=0.05, beta=0.10):
     if diff == 0:
         return -1
     # Compute sample size.
-    z_alpha = stats.norm.ppf(1 - alpha)
-    z_beta = stats.norm.ppf(1 - beta)
+    z_alpha = get_z(1 - alpha)
+    z_beta = get_z(1 - beta)
     sigma0 = sqrt(p0 * (1 - p0))
     sigma1 = sqrt(p1 * (1 - p1))
     n = ((z_alpha * sigma0 + z_beta * sigma1) / diff) ** 2
     return ceil(n)
 
+def compute_sample_sizes(p1, alpha=0.05, beta=0.10, two_sided=False,
+        exact=False, max_n=10**9):
+    """Computes sample sizes for arrays of proportions based on
+    power analysis. Proportions, type I and type II error parameters
+    are broadcast against each other, so a grid of error parameters
+    can be computed in one call. Returns -1 where p1 == 0.5.
+    
+    Parameters
+    ----------
+        p1 : numpy array
+            Proportions for which sample sizes are to be calculated.
+        alpha : float or numpy array
+            Type I error parameters.
+        beta : float or numpy array
+            Type II error parameters.
+        two_sided : bool
+            Whether to test for a difference in either direction
+            instead of only in the direction of `p1`.
+        exact : bool
+            Whether to search sample sizes of the exact binomial test,
+            see `compute_exact_sample_sizes`, instead of using the normal
+            approximation of `compute_sample_size`.
+        max_n : int
+            Largest sample size, for proportions close to 0.5.
+    
+    Returns
+    -------
+        n : numpy array
+            Sample sizes.
+    """
+    p1, alpha, beta = np.broadcast_arrays(np.asarray(p1, dtype=float),
+        np.asarray(alpha, dtype=float), np.asarray(beta, dtype=float))
+    if exact:
+        return compute_exact_sample_sizes(p1, alpha, beta, two_sided, max_n)
+    p0 = 0.5
+    diff = p1 - p0
+    z_alpha = get_z_array(1 - alpha / 2 if two_sided else 1 - alpha)
+    z_beta = get_z_array(1 - beta)
+    sigma0 = sqrt(p0 * (1 - p0))
+    sigma1 = np.sqrt(p1 * (1 - p1))
+    with np.errstate(divide='ignore'):
+        n = ((z_alpha * sigma0 + z_beta * sigma1) / diff) ** 2
+    n = np.ceil(np.minimum(n, max_n)).astype(np.int64)
+    n[diff == 0] = -1
+    return n
+
+def get_exact_power(n, p1, alpha, two_sided=False):
+    """Computes the power of the exact binomial test of
+    proportion 0.5 against proportion `p1`.
+    
+    Parameters
+    ----------
+        n : numpy array
+            Sample sizes.
+        p1 : numpy array
+            True proportions.
+        alpha : numpy array
+            Type I error parameters.
+        two_sided : bool
+            Whether the test is two-sided.
+    
+    Returns
+    -------
+        power : numpy array
+            Probability that the test rejects proportion 0.5.
+    """
+    # The test is symmetric, so proportions below 0.5 are mirrored.
+    p1 = np.maximum(p1, 1 - p1)
+    level = alpha / 2 if two_sided else alpha
+    from scipy import stats
+    # Proportion 0.5 is rejected when more than k wins are observed.
+    k = stats.binom.isf(level, n, 0.5)
+    power = stats.binom.sf(k, n, p1)
+    if two_sided:
+        power += stats.binom.cdf(n - k - 1, n, p1)
+    return power
+
+def compute_exact_sample_sizes(p1, alpha=0.05, beta=0.10, two_sided=False,
+        max_n=10**9):
+    """Searches sample sizes of the exact binomial test for arrays
+    of proportions with a bisection over all proportions at once.
+    Returns -1 where p1 == 0.5.
+
+    The power of the exact test does not increase monotonically with the
+    sample size, so the result is the sample size at which the bisection
+    finds the power crossing 1 - beta, starting from twice the normal
+    approximation.
+    
+    Parameters
+    ----------
+        p1 : numpy array
+            Proportions for which sample sizes are to be calculated.
+        alpha : numpy array
+            Type I error parameters.
+        beta : numpy array
+            Type II error parameters.
+        two_sided : bool
+            Whether the test is two-sided.
+        max_n : int
+            Largest sample size, for proportions close to 0.5.
+    
+    Returns
+    -------
+        n : numpy array
+            Sample sizes.
+    """
+    p1, alpha, beta = np.broadcast_arrays(np.asarray(p1, dtype=float),
+        np.asarray(alpha, dtype=float), np.asarray(beta, dtype=float))
+    valid = p1 != 0.5
+    # Search every combination of parameters only once.
+    combinations, inverse = np.unique(np.stack([p1[valid], alpha[valid],
+        beta[valid]], axis=1), axis=0, return_inverse=True)
+    p1, alpha, beta = combinations.T
+    low = np.zeros(len(p1), dtype=np.int64)
+    high = 2 * compute_sample_sizes(p1, alpha, beta, two_sided,
+        max_n=max_n) + 1
+    high = np.minimum(high, max_n)
+    # Widen the search where the power at the upper end is too low.
+    short = get_exact_power(high, p1, alpha, two_sided) < 1 - beta
+    while short.any():
+        high[short] = np.minimum(2 * high[short], max_n)
+        short &= high < max_n
+        short[short] = get_exact_power(high[short], p1[short], alpha[short],
+            two_sided) < 1 - beta[short]
+    while ((high - low) > 1).any():
+        middle = (low + high) // 2
+        enough = get_exact_power(middle, p1, alpha, two_sided) >= 1 - beta
+        high = np.where(enough, middle, high)
+        low = np.where(enough, low, middle)
+    out = np.full(valid.shape, -1, dtype=np.int64)
+    out[valid] = high[inverse.reshape(-1)]
+    return out
+
+
+def simulate_sprt(p1, alpha=0.05, beta=0.10, n_experiments=2000,
+        max_n=100000, seed=0):
+    """Simulates many sequential probability ratio tests at once.
+    Every test observes wins of the second ranking combination
+    one comparison at a time and stops as soon as the log likelihood
+    ratio of proportion `p1` against 0.5 crosses one of the bounds
+    of Wald, or after `max_n` comparisons.
+
+    Parameters
+    ----------
+    p1 : float
+        True proportion of wins of the second ranking combination.
+    alpha : float
+        Type I error parameter.
+    beta : float
+        Type II error parameter.
+    n_experiments : int
+        Number of simulated tests.
+    max_n : int
+        Number of comparisons after which a test is stopped.
+    seed : int
+        Seed of the simulated comparisons.
+
+    Returns
+    -------
+    n : numpy array
+        Number of comparisons at which every test stopped.
+    reject : numpy array
+        Whether every test stopped by rejecting the proportion 0.5.
+    """
+    p0 = 0.5
+    rng = np.random.default_rng(seed)
+    upper = log((1 - beta) / alpha)
+    lower = log(beta / (1 - alpha))
+    with np.errstate(divide='ignore'):
+        step_win = np.log(p1 / p0)
+        step_loss = np.log((1 - p1) / (1 - p0))
+    llr = np.zeros(n_experiments)
+    n = np.full(n_experiments, max_n)
+    reject = np.zeros(n_experiments, dtype=bool)
+    active = np.arange(n_experiments)
+    done = 0
+    while active.size > 0 and done < max_n:
+        # Simulate the active tests in blocks of about a million comparisons.
+        size = min(max_n - done, max(1, 2 ** 20 // active.size))
+        wins = rng.random((active.size, size)) < p1
+        path = llr[active, None] + np.cumsum(
+            np.where(wins, step_win, step_loss), axis=1)
+        crossed = (path >= upper) | (path <= lower)
+        stopped = crossed.any(axis=1)
+        first = crossed.argmax(axis=1)[stopped]
+        n[active[stopped]] = done + first + 1
+        reject[active[stopped]] = path[stopped, first] >= upper
+        llr[active] = path[:, -1]
+        active = active[~stopped]
+        done += size
+    return n, reject
+
+def compute_sequential_sample_size(p1, alpha=0.05, beta=0.10,
+        n_experiments=2000, max_n=100000, resolution=0.005):
+    """Computes the expected and 95th percentile stopping sample size
+    of a sequential probability ratio test for a given proportion.
+    Returns -1 for both if p1 == 0.5.
+
+    Proportions are rounded to multiples of `resolution`, so the tests
+    of every multiple are simulated only once. Proportions that are
+    rounded to 0.5 get `max_n` for both, as nearly all of their tests
+    run until they are stopped.
+
+    Parameters
+    ----------
+        p1 : float
+            Proportion for which sample size is to be calculated.
+        alpha : float
+            Type I error parameter.
+        beta : float
+            Type II error parameter.
+        n_experiments : int
+            Number of simulated tests, see `simulate_sprt`.
+        max_n : int
+            Number of comparisons after which a test is stopped.
+        resolution : float
+            Resolution to which proportions are rounded.
+
+    Returns
+    -------
+        expected : int
+            Mean stopping sample size.
+        p95 : int
+            95th percentile of the stopping sample size.
+    """
+    if p1 == 0.5:
+        return -1, -1
+    p1 = round(round(p1 / resolution) * resolution, 10)
+    if p1 == 0.5:
+        return max_n, max_n
+    return _get_sequential_sample_size(p1, alpha, beta, n_experiments, max_n)
+
+@lru_cache(maxsize=None)
+def _get_sequential_sample_size(p1, alpha, beta, n_experiments, max_n):
+    n, _ = simulate_sprt(p1, alpha, beta, n_experiments, max_n)
+    return int(ceil(n.mean())), int(ceil(np.percentile(n, 95)))
+
+def bootstrap_median_ci(p, n_trials, alpha=0.05, beta=0.10, n_bootstrap=1000,
+        confidence=0.95, two_sided=False, exact=False, resample_pairs=True,
+        seed=0, max_n=10**9, max_block_size=2**22):
+    """Computes a bootstrap confidence interval of the median sample size
+    of a bin.
+
+    Every bootstrap replicate resamples the rows of the bin with
+    replacement and then redraws their proportions as the wins of
+    `n_trials` simulated comparisons, so the interval covers the
+    Monte Carlo noise of the simulations as well as the differences
+    between pairs. Without `resample_pairs` the rows are kept and only
+    the Monte Carlo noise is covered. Replicates are drawn as matrices
+    of indices and wins in blocks of at most `max_block_size` values.
+
+    Sample sizes decrease with the distance of a proportion to 0.5,
+    so the median distance is bootstrapped instead. The redrawn
+    proportions are noisier than the simulated ones and thus further
+    from 0.5, so the basic bootstrap interval is used, which reflects
+    the replicates around the estimate to correct for this.
+
+    Parameters
+    ----------
+    p : array_like
+        Proportions of wins of the second ranking combination
+        of the rows in the bin.
+    n_trials : array_like
+        Numbers of comparisons with a winner behind every proportion.
+    alpha : float
+        Type I error parameter.
+    beta : float
+        Type II error parameter.
+    n_bootstrap : int
+        Number of bootstrap replicates.
+    confidence : float
+        Confidence level of the interval.
+    two_sided : bool
+        Whether sample sizes are for two-sided tests.
+    exact : bool
+        Whether sample sizes are for exact binomial tests.
+    resample_pairs : bool
+        Whether to resample the rows as well as the simulations.
+    seed : int
+        Seed of the replicates.
+    max_n : int
+        Upper bound of the interval if proportion 0.5 is within it.
+    max_block_size : int
+        Largest number of proportions redrawn at once.
+
+    Returns
+    -------
+    out : tuple
+        Lower and upper bound of the interval, `None` if the bin
+        has no proportions other than 0.5. Rows of which `n_trials`
+        is 0 are left out.
+    """
+    p = np.asarray(p, dtype=float)
+    n_trials = np.asarray(n_trials, dtype=np.int64)
+    # Rows without comparisons with a winner cannot be redrawn.
+    simulated = n_trials > 0
+    p = p[simulated]
+    n_trials = n_trials[simulated]
+    # Proportions of exactly 0.5 are excluded, as in `BinStatistics`.
+    distance = np.abs(p - 0.5)
+    if not (distance > 0).any():
+        return None
+    estimate = np.median(distance[distance > 0])
+    rng = np.random.default_rng(seed)
+    medians = np.full(n_bootstrap, np.nan)
+    block = max(1, max_block_size // p.size)
+    for start in range(0, n_bootstrap, block):
+        size = min(block, n_bootstrap - start)
+        if resample_pairs:
+            index = rng.integers(0, p.size, (size, p.size))
+        else:
+            index = np.broadcast_to(np.arange(p.size), (size, p.size))
+        wins = rng.binomial(n_trials[index], p[index])
+        replicates = np.abs(wins / n_trials[index] - 0.5)
+        replicates[replicates == 0] = np.nan
+        included = ~np.isnan(replicates).all(axis=1)
+        medians[start:start + size][included] = np.nanmedian(
+            replicates[included], axis=1)
+    tail = (1 - confidence) / 2 * 100
+    lower, upper = np.nanpercentile(medians, [tail, 100 - tail])
+    # The largest distance gives the smallest sample size.
+    bounds = np.clip([2 * estimate - lower, 2 * estimate - upper], 0, 0.5)
+    sample_sizes = compute_sample_sizes(0.5 + bounds, alpha, beta,
+        two_sided, exact, max_n)
+    sample_sizes[sample_sizes < 0] = max_n
+    return int(sample_sizes[0]), int(sample_sizes[1])
 
 def get_bin_labels(n_bins, n_decimals=3, cut_sides=0.0):
     """Creates labels containing ranges for bins.
@@ -170,37 +608,33 @@ def get_bin_labels(n_bins, n_decimals=3, cut_sides=0.0):
         out.append('[' + str(dmin) + ' - ' + str(dmax) + ')')
     return out
 
-def process_bins(bins):
+def process_bins(bins, percentiles=()):
     """Determines minimum value, maximum value and median
     for each of the given bins.
     
     Parameters
     ----------
     bins : array_like
-        Array of bins containing numerical values.
+        Array of bins containing numerical values, or of
+        `BinStatistics` accumulators.
+    percentiles : array_like
+        Percentiles between 0 and 100 to determine as well.
     
     Returns
     -------
     out : list
         A list of dictionaries containing the minimum value,
-        maximum value and median for each bin.
+        maximum value and median for each bin, see
+        `BinStatistics.get_info`.
     """
     out = []
     for cur in bins:
-        if cur == []:
-            out.append({'has_info' : False})
-        else:
-            # Sort bin and remove error-data.
-            cur.sort()
-            cur.reverse()
-            while cur[-1] == -1:
-                cur.pop()
-            cur.reverse()
-            # Determine minimum, median and maximum.
-            d, m = divmod(len(cur), 2)
-            median = ceil((cur[d] + cur[-int(not bool(m))]) / 2.0)
-            out.append({'min' : min(cur), 'max' : max(cur),
-                'median' : median, 'has_info' : True})
+        if not isinstance(cur, bin_statistics.BinStatistics):
+            # Error-data of -1 is counted as excluded.
+            statistics = bin_statistics.BinStatistics()
+            statistics.extend(cur)
+            cur = statistics
+        out.append(cur.get_info(percentiles))
     return out
 
 def print_bin_info(bin_info, labels=None):
@@ -213,6 +647,8 @@ def print_bin_info(bin_info, labels=None):
         Array of dictionaries containing `min`, `max` and `median`
         fields, also contains a `has_info` field which is to be turned
         set `False` if not all other fields are present.
+        Percentiles, numbers of excluded values and confidence
+        intervals of the median are printed if present.
         
     Returns
     -------
@@ -224,20 +660,33 @@ def print_bin_info(bin_info, labels=None):
         print('BIN', label)
         if info['has_info']:
             print('     min', info['min'])
+            for q, value in sorted(info.get('percentiles', {}).items()):
+                if q < 50:
+                    print('    ' + ('p' + str(q)).rjust(4), value)
             print('  median', info['median'])
+            for name in ['median_ci', 'noise_ci']:
+                if info.get(name) is not None:
+                    print(name.rjust(9), list(info[name]))
+            for q, value in sorted(info.get('percentiles', {}).items()):
+                if q > 50:
+                    print('    ' + ('p' + str(q)).rjust(4), value)
             print('     max', info['max'])
         else:
             print('  NO DATA')
+        if info.get('n_excluded', 0) > 0:
+            print('excluded', info['n_excluded'])
         print()
     return
 
 
-def plot_bin_info(bin_info_list, bin_set_labels=[], bin_labels=[]):
-    """Plots min/median/max information for the bins
-    in the given bin sets.
+def draw_bin_info(ax, bin_info_list, bin_set_labels=[], bin_labels=[]):
+    """Draws min/median/max information for the bins
+    in the given bin sets on matplotlib axes.
     
     Parameters
     ----------
+    ax : matplotlib Axes
+        Axes to draw on.
     bin_info_list : array_like
         A list of sets of bins containing dictionaries
         with min/median/max/has_info information.
@@ -262,18 +711,157 @@ def plot_bin_info(bin_info_list, bin_set_labels=[], bin_labels=[]):
             for info in bin_info],
             [info['max'] - info['median'] if info['has_info'] else 0
             for info in bin_info])
-        plt.errorbar(x, y, err, label=label)
+        lines = ax.errorbar(x, y, err, label=label)
+        # Shade the confidence intervals of the medians if present.
+        cis = [info.get('median_ci') for info in bin_info]
+        if any(ci is not None for ci in cis):
+            lower = [ci[0] if ci else y_j for ci, y_j in zip(cis, y)]
+            upper = [ci[1] if ci else y_j for ci, y_j in zip(cis, y)]
+            ax.fill_between(x, lower, upper, color=lines[0].get_color(),
+                alpha=0.2)
+    # Unbounded intervals would hide the error bars.
+    maxima = [info['max'] for bin_info in bin_info_list for info in bin_info
+        if info['has_info'] and info.get('median_ci') is not None]
+    if maxima != []:
+        top = max(info['max'] for bin_info in bin_info_list
+            for info in bin_info if info['has_info'])
+        ax.set_ylim(-0.05 * top, 1.05 * top)
     # Apply bin labels.
     if bin_labels != []:
-        plt.xticks(range(len(bin_labels)), bin_labels + [''], rotation=30)
-    plt.legend()
-    plt.xlabel('$\Delta$ERR')
-    plt.ylabel('sample size')
-    plt.title('Determined sample size')
-    plt.tight_layout()
+        ax.set_xticks(range(len(bin_labels)))
+        ax.set_xticklabels(bin_labels, rotation=30)
+    ax.legend()
+    ax.set_xlabel('$\\Delta$ERR')
+    ax.set_ylabel('sample size')
+    ax.set_title('Determined sample size')
+    return
+
+def plot_bin_info(bin_info_list, bin_set_labels=[], bin_labels=[]):
+    """Plots min/median/max information for the bins
+    in the given bin sets, see `draw_bin_info`.
+    
+    Parameters
+    ----------
+    bin_info_list : array_like
+        A list of sets of bins containing dictionaries
+        with min/median/max/has_info information.
+    bin_set_labels : array_like
+        A list of labels for the different sets of bins.
+    bin_labels : array_like
+        A list of labels of the different bins in the bin sets.
+        Is used to label the x axis.
+    
+    Returns
+    -------
+    None
+    """
+    # Imported here so that only plotting needs matplotlib and a display.
+    import matplotlib.pyplot as plt
+    fig, ax = plt.subplots()
+    draw_bin_info(ax, bin_info_list, bin_set_labels, bin_labels)
+    fig.tight_layout()
     plt.show()
     return
 
+def get_bin_info_table(bin_info, bin_labels=[]):
+    """Creates an HTML table of the bin information of a bin set.
+    
+    Parameters
+    ----------
+    bin_info : array_like
+        A list of dictionaries containing min/median/max/has_info
+        information, and optionally percentiles, excluded counts
+        and confidence intervals.
+    bin_labels : array_like
+        A list of labels of the bins.
+    
+    Returns
+    -------
+    out : str
+        HTML table with a row per bin.
+    """
+    if bin_labels == []:
+        bin_labels = list(range(len(bin_info)))
+    percentiles = sorted(set(q for info in bin_info
+        for q in info.get('percentiles', {})))
+    columns = (['min'] + ['p' + str(q) for q in percentiles if q < 50]
+        + ['median'] + ['p' + str(q) for q in percentiles if q > 50]
+        + ['max', 'excluded'])
+    for name in ['noise_ci', 'median_ci']:
+        if any(info.get(name) is not None for info in bin_info):
+            columns.insert(columns.index('median') + 1, name)
+    rows = ['<tr><th>bin</th>' + ''.join('<th>' + column + '</th>'
+        for column in columns) + '</tr>']
+    for info, label in zip(bin_info, bin_labels):
+        values = {'excluded' : info.get('n_excluded', 0)}
+        if info['has_info']:
+            values.update(min=info['min'], median=info['median'],
+                max=info['max'])
+            for q, value in info.get('percentiles', {}).items():
+                values['p' + str(q)] = value
+            for name in ['median_ci', 'noise_ci']:
+                if info.get(name) is not None:
+                    values[name] = list(info[name])
+        rows.append('<tr><td>' + html.escape(str(label)) + '</td>'
+            + ''.join('<td>' + str(values.get(column, '')) + '</td>'
+            for column in columns) + '</tr>')
+    return '<table>\n' + '\n'.join(rows) + '\n</table>'
+
+def write_report(bin_info_list, bin_set_labels=[], bin_labels=[],
+        path_prefix='./report', formats=('png', 'svg', 'html')):
+    """Renders the plot of `draw_bin_info` and tables of the bin
+    information to files, without a display.
+    
+    Parameters
+    ----------
+    bin_info_list : array_like
+        A list of sets of bins containing dictionaries
+        with min/median/max/has_info information.
+    bin_set_labels : array_like
+        A list of labels for the different sets of bins.
+    bin_labels : array_like
+        A list of labels of the different bins in the bin sets.
+    path_prefix : str
+        Path of the files without extension.
+    formats : array_like
+        Formats to write, any of 'png', 'svg' and 'html'. The HTML page
+        contains the tables and the SVG plot.
+    
+    Returns
+    -------
+    paths : list
+        Paths of the written files.
+    """
+    # The figure is not attached to pyplot, so no display is opened.
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+    if bin_set_labels == []:
+        bin_set_labels = list(range(len(bin_info_list)))
+    fig = Figure(figsize=(8, 5))
+    FigureCanvasAgg(fig)
+    draw_bin_info(fig.add_subplot(), bin_info_list, bin_set_labels,
+        bin_labels)
+    fig.tight_layout()
+    paths = []
+    for image_format in ['png', 'svg']:
+        if image_format in formats:
+            paths.append(path_prefix + '.' + image_format)
+            fig.savefig(paths[-1], format=image_format)
+    if 'html' in formats:
+        svg = io.StringIO()
+        fig.savefig(svg, format='svg')
+        sections = ['<h2>' + html.escape(str(label)) + '</h2>\n'
+            + get_bin_info_table(bin_info, bin_labels)
+            for bin_info, label in zip(bin_info_list, bin_set_labels)]
+        paths.append(path_prefix + '.html')
+        with open(paths[-1], 'w') as f:
+            f.write('<!DOCTYPE html>\n<html>\n<head><meta charset="utf-8">'
+                '<title>Determined sample size</title></head>\n<body>\n'
+                '<h1>Determined sample size</h1>\n'
+                + svg.getvalue()[svg.getvalue().index('<svg'):] + '\n'
+                + '\n'.join(sections) + '\n</body>\n</html>\n')
+    return paths
+
 
 def main():
     n_bins = 10
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+
+import timeit
+from collections import deque
+from itertools import chain, islice
+from math import cos, log, pi, sqrt
+
+import numpy as np
+
+
+class RandomStream:
+    """Random Stream
+    =============
+
+    Stream of random numbers drawn from a NumPy `Generator`.
+
+    Uniform numbers are generated in bulk into buffers that are chained
+    together, so a draw with `random` is a single call of the iterator
+    instead of a call into NumPy. The numbers only depend on the seed
+    and the order of the draws, not on the size of the buffers.
+    Streams made from different seed sequences, such as those of
+    `spawn`, are statistically independent.
+    """
+    def __init__(self, seed=0, buffer_size=4096):
+        """Initializes class parameters.
+
+        Parameters
+        ----------
+        seed : int or array_like or numpy SeedSequence
+            Seed of the stream.
+        buffer_size : int
+            Number of uniform numbers generated at once.
+        """
+        self.buffer_size = buffer_size
+        self.buffer = iter([])
+        self.seed(seed)
+        self.draws = chain.from_iterable(self.iter_buffers())
+        # Draws a uniform number in [0, 1).
+        self.random = self.draws.__next__
+
+    def seed(self, seed):
+        """Restarts the stream from a seed.
+
+        Parameters
+        ----------
+        seed : int or array_like or numpy SeedSequence
+            Seed of the stream.
+
+        Returns
+        -------
+        None
+        """
+        if not isinstance(seed, np.random.SeedSequence):
+            seed = np.random.SeedSequence(seed)
+        self.seed_sequence = seed
+        self.generator = np.random.default_rng(seed)
+        # Drop what is left of the buffer of the previous seed.
+        deque(self.buffer, maxlen=0)
+        return
+
+    def spawn(self, n):
+        """Creates independent child streams.
+
+        Parameters
+        ----------
+        n : int
+            Number of streams.
+
+        Returns
+        -------
+        out : list
+            A list of `RandomStream` objects.
+        """
+        return [RandomStream(seed_sequence, self.buffer_size)
+            for seed_sequence in self.seed_sequence.spawn(n)]
+
+    def iter_buffers(self):
+        """Generates buffers of uniform numbers.
+
+        Returns
+        -------
+        out : generator
+            Generator of iterators over `buffer_size` uniform numbers.
+        """
+        while True:
+            self.buffer = iter(
+                self.generator.random(self.buffer_size).tolist())
+            yield self.buffer
+
+    def uniforms(self, n):
+        """Draws uniform numbers in [0, 1).
+
+        Parameters
+        ----------
+        n : int
+            Number of uniform numbers.
+
+        Returns
+        -------
+        out : list
+            A list of `n` floats.
+        """
+        return list(islice(self.draws, n))
+
+    def bernoulli(self, p):
+        """Draws Bernoulli outcomes, one for every probability.
+
+        Parameters
+        ----------
+        p : array_like
+            Success probabilities.
+
+        Returns
+        -------
+        out : list
+            A list of booleans, `True` with probability `p[i]`.
+        """
+        return [u < p_i for u, p_i in zip(self.uniforms(len(p)), p)]
+
+    def integers(self, n):
+        """Draws an integer in [0, n) uniformly.
+
+        Parameters
+        ----------
+        n : int
+            Number of possible integers.
+
+        Returns
+        -------
+        out : int
+        """
+        return min(int(self.random() * n), n - 1)
+
+    def choice(self, p):
+        """Draws an index in proportion to the given weights.
+
+        Parameters
+        ----------
+        p : array_like
+            Non-negative weights, which need not sum to 1.
+
+        Returns
+        -------
+        out : int
+        """
+        cumulative = np.cumsum(p)
+        index = int(np.searchsorted(cumulative, self.random() * cumulative[-1],
+            side='right'))
+        # Never return an index of weight 0 at the end.
+        return min(index, int(np.flatnonzero(np.asarray(p) > 0)[-1]))
+
+    def gauss(self, mu=0.0, sigma=1.0):
+        """Draws a normally distributed number with the Box-Muller
+        transform of two uniform numbers of the stream.
+
+        Parameters
+        ----------
+        mu : float
+            Mean.
+        sigma : float
+            Standard deviation.
+
+        Returns
+        -------
+        out : float
+        """
+        u1, u2 = self.uniforms(2)
+        return mu + sigma * sqrt(-2 * log(1 - u1)) * cos(2 * pi * u2)
+
+
+# Stream of the current process. It is seeded again in place, so the
+# functions below stay bound to it.
+_stream = RandomStream()
+
+random = _stream.random
+uniforms = _stream.uniforms
+bernoulli = _stream.bernoulli
+integers = _stream.integers
+choice = _stream.choice
+gauss = _stream.gauss
+
+def seed(root_seed, *keys):
+    """Seeds the stream of the current process.
+
+    The stream only depends on the root seed and the keys, such as
+    a task id, so results do not depend on which process draws them.
+
+    Parameters
+    ----------
+    root_seed : int
+        Seed of the whole run.
+    keys : int
+        Further keys, such as the id of a task.
+
+    Returns
+    -------
+    None
+    """
+    _stream.seed(np.random.SeedSequence([root_seed] + list(keys)))
+    return
+
+def get_stream():
+    """Returns the stream of the current process.
+
+    Returns
+    -------
+    out : RandomStream
+    """
+    return _stream
+
+
+def main():
+    stream = RandomStream(0)
+    n = 10 ** 6
+    print('buffered random   ', round(timeit.timeit(stream.random,
+        number=n) / n * 1e9, 1), 'ns / draw')
+    print('numpy choice(2, 1)', round(timeit.timeit(
+        lambda: np.random.choice(2, 1)[0], number=n // 100) / n * 1e11, 1),
+        'ns / draw')
+    # The numbers do not depend on the size of the buffer.
+    small = RandomStream(1, buffer_size=7)
+    large = RandomStream(1)
+    print('identical for different buffer sizes:',
+        [small.random() for _ in range(100)] == large.uniforms(100))
+    return
+
+
+if __name__ == '__main__':
+    main()
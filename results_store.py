@@ -0,0 +1,412 @@
+#!/usr/bin/env python3
+
+import argparse
+import csv
+import json
+import os
+
+import bin_statistics
+import power_analysis as pa
+
+
+FIELDS = ['task_id', 'click_model', 'interleaving', 'pair', 'permutation',
+    'dERR', 'wins_p', 'wins_e', 'ties', 'p']
+
+
+class ResultsStore:
+    """Results Store
+    =============
+
+    Persistent store of the raw results of sweep tasks.
+
+    Every finished task is appended as a row to a CSV file,
+    so a sweep that is interrupted can resume with the tasks
+    that are not stored yet and the results can be analysed again
+    with other settings without simulating. The sweep settings
+    are kept in a JSON file next to the CSV file, a store can only
+    be reopened with the same settings.
+    """
+    def __init__(self, path, settings=None):
+        """Opens or creates the store.
+
+        Parameters
+        ----------
+        path : str
+            Path to the CSV file.
+        settings : dict
+            Settings of the sweep that determine the task results,
+            compared against the stored settings. Is ignored if `None`.
+        """
+        self.path = path
+        settings_path = path + '.json'
+        if settings is not None:
+            if os.path.exists(settings_path):
+                with open(settings_path) as f:
+                    stored = json.load(f)
+                if stored != json.loads(json.dumps(settings)):
+                    raise ValueError('Results in ' + path
+                        + ' were created with other settings: ' + str(stored))
+            else:
+                with open(settings_path, 'w') as f:
+                    json.dump(settings, f)
+        self.file = None
+
+    def read(self):
+        """Reads all stored rows. A last row that was cut off
+        by an interruption is skipped.
+
+        Returns
+        -------
+        out : list
+            A list of dictionaries containing the fields in `FIELDS`.
+        """
+        out = []
+        if not os.path.exists(self.path):
+            return out
+        with open(self.path, newline='') as f:
+            for row in csv.DictReader(line for line in f
+                    if line.endswith('\n')):
+                try:
+                    out.append({
+                        'task_id' : int(row['task_id']),
+                        'click_model' : row['click_model'],
+                        'interleaving' : row['interleaving'],
+                        'pair' : json.loads(row['pair']),
+                        'permutation' : json.loads(row['permutation']),
+                        'dERR' : float(row['dERR']),
+                        'wins_p' : int(row['wins_p']),
+                        'wins_e' : int(row['wins_e']),
+                        'ties' : int(row['ties']),
+                        'p' : float(row['p'])
+                    })
+                except (TypeError, ValueError):
+                    continue
+        return out
+
+    def get_done(self):
+        """Determines which tasks are stored.
+
+        Returns
+        -------
+        out : set
+            A set of task ids.
+        """
+        return set(row['task_id'] for row in self.read())
+
+    def truncate_partial_row(self):
+        """Removes a last row that was cut off by an interruption,
+        so appended rows start on a line of their own.
+
+        Returns
+        -------
+        None
+        """
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'rb+') as f:
+            size = f.seek(0, os.SEEK_END)
+            end = size
+            while end > 0:
+                start = max(0, end - 4096)
+                f.seek(start)
+                newline = f.read(end - start).rfind(b'\n')
+                if newline >= 0:
+                    end = start + newline + 1
+                    break
+                end = start
+            if end < size:
+                f.truncate(end)
+        return
+
+    def append(self, task, click_model, interleaving, p, counts):
+        """Appends the result of a task to the store.
+
+        Parameters
+        ----------
+        task : tuple
+            Task as created by `sweep.get_tasks`.
+        click_model : str
+            Name of the click model.
+        interleaving : str
+            Name of the interleaving method.
+        p : float
+            Proportion of wins of second ranking combination.
+        counts : array_like
+            Numbers of wins of both rankings and number of ties.
+
+        Returns
+        -------
+        None
+        """
+        if self.file is None:
+            self.truncate_partial_row()
+            new = not os.path.exists(self.path) \
+                or os.path.getsize(self.path) == 0
+            self.file = open(self.path, 'a', newline='')
+            self.writer = csv.writer(self.file)
+            if new:
+                self.writer.writerow(FIELDS)
+        task_id, _, _, _, dERR, permutation = task
+        pair = [[int(r) for r, _ in ranking] for ranking in permutation]
+        permutation = [[[int(r), int(_id)] for r, _id in ranking]
+            for ranking in permutation]
+        self.writer.writerow([task_id, click_model, interleaving,
+            json.dumps(pair), json.dumps(permutation), repr(float(dERR))]
+            + [int(count) for count in counts] + [repr(float(p))])
+        self.file.flush()
+        return
+
+    def close(self):
+        """Closes the store.
+
+        Returns
+        -------
+        None
+        """
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        return
+
+
+def get_bins(rows, n_bins=10, cut_sides=0.05, alpha=0.05, beta=0.10,
+        bin_set_labels=None, sample_size_func=None, two_sided=False,
+        exact=False):
+    """Computes sample sizes from stored rows and sorts them into bins.
+
+    Parameters
+    ----------
+    rows : array_like
+        Rows as read by `ResultsStore.read`.
+    n_bins : int
+        Number of delta ERR bins.
+    cut_sides : float
+        Amount by which first and last bin have their ranges cut.
+    alpha : float
+        Type I error parameter.
+    beta : float
+        Type II error parameter.
+    bin_set_labels : array_like
+        Labels of the click model and interleaving method combinations
+        in the order in which their bins are returned. Combinations
+        that are not in it are added in order of first appearance.
+    sample_size_func : function(float, float, float) -> int
+        Function that computes the sample size of a proportion
+        given the type I and type II error parameters. If `None`,
+        all sample sizes are computed at once with
+        `power_analysis.compute_sample_sizes`.
+    two_sided : bool
+        Whether sample sizes are for two-sided tests,
+        if `sample_size_func` is `None`.
+    exact : bool
+        Whether sample sizes are for exact binomial tests,
+        if `sample_size_func` is `None`.
+
+    Returns
+    -------
+    bin_set_labels : list
+        A list of labels of the click model and interleaving method
+        combinations.
+    bins : list
+        A list containing for each combination a list of
+        `BinStatistics` of the sample sizes of the rows in that bin.
+    """
+    bin_set_labels = list(bin_set_labels or [])
+    bins = [[bin_statistics.BinStatistics() for _ in range(n_bins)]
+        for _ in bin_set_labels]
+    rows = [row for row in sorted(rows, key=lambda row: row['task_id'])
+        if cut_sides <= row['dERR'] < 1.0 - cut_sides]
+    if sample_size_func is None:
+        sample_sizes = pa.compute_sample_sizes(
+            [row['p'] for row in rows], alpha, beta, two_sided, exact)
+    else:
+        sample_sizes = [sample_size_func(row['p'], alpha, beta)
+            for row in rows]
+    for row, sample_size in zip(rows, sample_sizes):
+        label = row['click_model'] + ' & ' + row['interleaving']
+        if label not in bin_set_labels:
+            bin_set_labels.append(label)
+            bins.append([bin_statistics.BinStatistics()
+                for _ in range(n_bins)])
+        bins[bin_set_labels.index(label)][int(row['dERR'] * n_bins)].add(
+            int(sample_size))
+    return bin_set_labels, bins
+
+def get_bootstrap_cis(rows, n_bins=10, cut_sides=0.05, alpha=0.05,
+        beta=0.10, bin_set_labels=None, two_sided=False, exact=False,
+        n_bootstrap=1000, confidence=0.95, seed=0):
+    """Computes bootstrap confidence intervals of the median sample size
+    of every bin, see `power_analysis.bootstrap_median_ci`.
+
+    Parameters
+    ----------
+    rows : array_like
+        Rows as read by `ResultsStore.read`.
+    n_bins : int
+        Number of delta ERR bins.
+    cut_sides : float
+        Amount by which first and last bin have their ranges cut.
+    alpha : float
+        Type I error parameter.
+    beta : float
+        Type II error parameter.
+    bin_set_labels : array_like
+        Labels of the click model and interleaving method combinations,
+        see `get_bins`.
+    two_sided : bool
+        Whether sample sizes are for two-sided tests.
+    exact : bool
+        Whether sample sizes are for exact binomial tests.
+    n_bootstrap : int
+        Number of bootstrap replicates.
+    confidence : float
+        Confidence level of the intervals.
+    seed : int
+        Seed of the replicates.
+
+    Returns
+    -------
+    bin_set_labels : list
+        A list of labels of the click model and interleaving method
+        combinations.
+    cis : list
+        A list containing for each combination a list of dictionaries
+        with the interval of the median `median_ci` and the interval
+        covering only the Monte Carlo noise of the simulations
+        `noise_ci`, `None` for empty bins.
+    """
+    bin_set_labels = list(bin_set_labels or [])
+    groups = [[[] for _ in range(n_bins)] for _ in bin_set_labels]
+    for row in rows:
+        if not cut_sides <= row['dERR'] < 1.0 - cut_sides:
+            continue
+        label = row['click_model'] + ' & ' + row['interleaving']
+        if label not in bin_set_labels:
+            bin_set_labels.append(label)
+            groups.append([[] for _ in range(n_bins)])
+        groups[bin_set_labels.index(label)][int(row['dERR'] * n_bins)].append(
+            (row['p'], row['wins_p'] + row['wins_e']))
+    cis = []
+    for group in groups:
+        cis.append([])
+        for bin_rows in group:
+            p = [row_p for row_p, _ in bin_rows]
+            n_trials = [row_n for _, row_n in bin_rows]
+            cis[-1].append({name : pa.bootstrap_median_ci(p, n_trials,
+                alpha, beta, n_bootstrap, confidence, two_sided, exact,
+                resample_pairs, seed) for name, resample_pairs
+                in [('median_ci', True), ('noise_ci', False)]})
+    return bin_set_labels, cis
+
+def analyse(path, n_bins=10, cut_sides=0.05, alpha=0.05, beta=0.10,
+        plot=True, sequential=False, percentiles=(), two_sided=False,
+        exact=False, report=None, n_bootstrap=1000):
+    """Prints and plots bin information from a results store
+    without simulating.
+
+    Bootstrap confidence intervals of the median sample size are added
+    to the fixed sample size bins, see `get_bootstrap_cis`.
+
+    With `sequential` the expected and 95th percentile stopping
+    sample sizes of sequential tests are analysed next to the
+    fixed sample sizes, see `power_analysis.simulate_sprt`.
+
+    Parameters
+    ----------
+    path : str
+        Path to the CSV file of the store.
+    n_bins : int
+        Number of delta ERR bins.
+    cut_sides : float
+        Amount by which first and last bin have their ranges cut.
+    alpha : float
+        Type I error parameter.
+    beta : float
+        Type II error parameter.
+    plot : bool
+        Whether to plot the bin information.
+    sequential : bool
+        Whether to analyse the sample sizes of sequential tests as well.
+    percentiles : array_like
+        Percentiles between 0 and 100 to print next to the median.
+    two_sided : bool
+        Whether fixed sample sizes are for two-sided tests.
+    exact : bool
+        Whether fixed sample sizes are for exact binomial tests.
+    report : str
+        Path prefix of PNG, SVG and HTML files to render the plot
+        and tables to instead of showing the plot,
+        see `power_analysis.write_report`.
+    n_bootstrap : int
+        Number of bootstrap replicates, intervals are left out if 0.
+
+    Returns
+    -------
+    bin_sets : list
+        A list of processed bin sets, see `power_analysis.process_bins`.
+    """
+    rows = ResultsStore(path).read()
+    bin_set_labels, bins = get_bins(rows, n_bins, cut_sides, alpha, beta,
+        two_sided=two_sided, exact=exact)
+    cis = []
+    if n_bootstrap > 0:
+        _, cis = get_bootstrap_cis(rows, n_bins, cut_sides, alpha, beta,
+            bin_set_labels, two_sided, exact, n_bootstrap)
+    if sequential:
+        for i, name in enumerate(['expected', '95th percentile']):
+            sequential_labels, sequential_bins = get_bins(rows, n_bins,
+                cut_sides, alpha, beta, sample_size_func=lambda p, a, b:
+                pa.compute_sequential_sample_size(p, a, b)[i])
+            bin_set_labels += [label + ' (sequential, ' + name + ')'
+                for label in sequential_labels]
+            bins += sequential_bins
+    bin_labels = pa.get_bin_labels(n_bins, cut_sides=cut_sides)
+    bin_sets = []
+    for k, (bin_set, label) in enumerate(zip(bins, bin_set_labels)):
+        print('===== ' + label + ' =====')
+        bin_info = pa.process_bins(bin_set, percentiles)
+        # Sequential bin sets come after those with intervals.
+        for info, bin_cis in zip(bin_info, cis[k] if k < len(cis) else []):
+            if info['has_info']:
+                info.update(bin_cis)
+        pa.print_bin_info(bin_info, bin_labels)
+        bin_sets.append(bin_info)
+    if report is not None:
+        for report_path in pa.write_report(bin_sets, bin_set_labels,
+                bin_labels, report):
+            print('written', report_path)
+    elif plot:
+        pa.plot_bin_info(bin_sets, bin_set_labels, bin_labels)
+    return bin_sets
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Analyses stored sweep results without simulating.')
+    parser.add_argument('path', help='path to the results CSV file')
+    parser.add_argument('--n-bins', type=int, default=10)
+    parser.add_argument('--cut-sides', type=float, default=0.05)
+    parser.add_argument('--alpha', type=float, default=0.05)
+    parser.add_argument('--beta', type=float, default=0.10)
+    parser.add_argument('--no-plot', action='store_true')
+    parser.add_argument('--sequential', action='store_true',
+        help='analyse stopping sample sizes of sequential tests as well')
+    parser.add_argument('--percentiles', type=int, nargs='*', default=[],
+        help='percentiles to print next to the median')
+    parser.add_argument('--two-sided', action='store_true',
+        help='compute sample sizes of two-sided tests')
+    parser.add_argument('--exact', action='store_true',
+        help='compute sample sizes of exact binomial tests')
+    parser.add_argument('--report', metavar='PREFIX',
+        help='render PNG, SVG and HTML files instead of showing the plot')
+    parser.add_argument('--n-bootstrap', type=int, default=1000,
+        help='bootstrap replicates of the median intervals, 0 to skip')
+    args = parser.parse_args()
+    analyse(args.path, args.n_bins, args.cut_sides, args.alpha, args.beta,
+        not args.no_plot, args.sequential, args.percentiles, args.two_sided,
+        args.exact, args.report, args.n_bootstrap)
+    return
+
+
+if __name__ == '__main__':
+    main()
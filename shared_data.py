@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+
+from collections.abc import Mapping
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+import click_model_v2 as cm
+
+
+# Shared memory blocks attached by the current process, by name.
+_attached = {}
+# Models attached by the current process, by the name of their first block.
+_models = {}
+
+
+class Publisher:
+    """Shared Memory Publisher
+    =======================
+
+    Owner of the shared memory blocks of published arrays.
+
+    Arrays are copied once into shared memory, after which any process
+    can attach to them with `attach_arrays` without copying.
+    The blocks are freed by `close`, or at the end of a `with` block.
+    """
+    def __init__(self):
+        """Initializes class parameters.
+        """
+        self.blocks = []
+
+    def publish(self, arrays):
+        """Copies arrays into shared memory.
+
+        Parameters
+        ----------
+        arrays : dict
+            A dictionary of numpy arrays.
+
+        Returns
+        -------
+        descriptor : dict
+            A picklable dictionary mapping array names to the name,
+            shape and data type of their shared memory block.
+        """
+        descriptor = {}
+        for name, array in arrays.items():
+            array = np.ascontiguousarray(array)
+            block = shared_memory.SharedMemory(create=True,
+                size=max(1, array.nbytes))
+            np.ndarray(array.shape, array.dtype, block.buf)[...] = array
+            self.blocks.append(block)
+            descriptor[name] = (block.name, array.shape, array.dtype.str)
+        return descriptor
+
+    def close(self):
+        """Frees all published blocks. Processes that are still
+        attached keep their mapping until they exit.
+
+        Returns
+        -------
+        None
+        """
+        for block in self.blocks:
+            block.close()
+            block.unlink()
+        self.blocks = []
+        return
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def _attach_untracked(block_name):
+    # Python before 3.13 registers every attached block with the resource
+    # tracker. Unregistering afterwards would also drop the registration
+    # of the publisher when the tracker is shared with it, so the block
+    # is not registered at all.
+    register = resource_tracker.register
+    resource_tracker.register = lambda name, rtype: None
+    try:
+        return shared_memory.SharedMemory(name=block_name)
+    finally:
+        resource_tracker.register = register
+
+def attach_arrays(descriptor):
+    """Attaches to published arrays without copying them.
+
+    Parameters
+    ----------
+    descriptor : dict
+        Descriptor as created by `Publisher.publish`.
+
+    Returns
+    -------
+    out : dict
+        A dictionary of read-only numpy arrays backed by shared memory.
+    """
+    out = {}
+    for name, (block_name, shape, dtype) in descriptor.items():
+        if block_name not in _attached:
+            # Attached blocks are owned by the publisher, so they must not
+            # be unlinked by the resource tracker when this process exits.
+            try:
+                block = shared_memory.SharedMemory(name=block_name,
+                    track=False)
+            except TypeError:
+                block = _attach_untracked(block_name)
+            _attached[block_name] = block
+        array = np.ndarray(shape, np.dtype(dtype), _attached[block_name].buf)
+        array.flags.writeable = False
+        out[name] = array
+    return out
+
+
+def get_alpha_key(u, q):
+    """Combines a document id and query id into one integer.
+
+    Parameters
+    ----------
+    u : int or numpy array
+        Document id, lower than 2**31.
+    q : int or numpy array
+        Query id, lower than 2**32.
+
+    Returns
+    -------
+    out : int or numpy array
+        Combined key.
+    """
+    return (np.int64(u) << 32) | np.int64(q)
+
+
+class SharedAlphas(Mapping):
+    """Shared Alphas
+    =============
+
+    Read-only replacement of the `alphas` dictionary of `PBM`
+    backed by sorted arrays in shared memory.
+
+    Keys are looked up by binary search and can be given in the string
+    format used by `PBM` or as (document id, query id) tuples.
+    """
+    def __init__(self, keys, values):
+        """Initializes class parameters.
+
+        Parameters
+        ----------
+        keys : numpy array
+            Sorted keys, see `get_alpha_key`.
+        values : numpy array
+            Alpha value of every key.
+        """
+        self._keys = keys
+        self._values = values
+
+    def _index(self, key):
+        if isinstance(key, str):
+            key = [int(x) for x in key.strip('()').split(',')]
+        key = get_alpha_key(*key)
+        i = np.searchsorted(self._keys, key)
+        if i == len(self._keys) or self._keys[i] != key:
+            return None
+        return i
+
+    def __getitem__(self, key):
+        i = self._index(key)
+        if i is None:
+            raise KeyError(key)
+        return float(self._values[i])
+
+    def __contains__(self, key):
+        return self._index(key) is not None
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __iter__(self):
+        for key in self._keys:
+            yield str((int(key >> 32), int(key & 0xffffffff)))
+
+
+def model_to_arrays(model):
+    """Converts the parameters of a trained click model to arrays.
+
+    Parameters
+    ----------
+    model : RCM or PBM
+        Trained click model.
+
+    Returns
+    -------
+    out : dict
+        A dictionary of arrays. `RCM` is stored as `rho`, `PBM` as
+        `gammas` and its `alphas` as sorted `alpha_keys` and
+        `alpha_values`.
+    """
+    if isinstance(model, cm.RCM):
+        return {'rho' : np.array([model.rho])}
+    keys = np.zeros(len(model.alphas), dtype=np.int64)
+    values = np.zeros(len(model.alphas))
+    for i, (uq, alpha) in enumerate(model.alphas.items()):
+        u, q = [int(x) for x in uq.strip('()').split(',')]
+        keys[i] = get_alpha_key(u, q)
+        values[i] = alpha
+    order = np.argsort(keys)
+    return {'gammas' : np.array(model.gammas, dtype=float),
+        'alpha_keys' : keys[order], 'alpha_values' : values[order]}
+
+def attach_model(descriptor):
+    """Creates a click model from published parameters.
+    Models are created once per process and then reused.
+
+    Parameters
+    ----------
+    descriptor : dict
+        Descriptor of arrays created by `model_to_arrays`.
+
+    Returns
+    -------
+    model : RCM or PBM
+        Click model of which `alphas` is a `SharedAlphas`.
+    """
+    name = descriptor[sorted(descriptor)[0]][0]
+    if name not in _models:
+        arrays = attach_arrays(descriptor)
+        if 'rho' in arrays:
+            model = cm.RCM()
+            model.rho = float(arrays['rho'][0])
+        else:
+            model = cm.PBM()
+            model.gammas = [float(gamma) for gamma in arrays['gammas']]
+            model.alphas = SharedAlphas(arrays['alpha_keys'],
+                arrays['alpha_values'])
+        _models[name] = model
+    return _models[name]
+
+
+class SharedMethod:
+    """Shared Method
+    =============
+
+    Picklable stand-in for a method of a click model of which
+    the parameters are published in shared memory.
+    Use `resolve` to turn it back into a method in a worker.
+    """
+    def __init__(self, descriptor, name):
+        """Initializes class parameters.
+
+        Parameters
+        ----------
+        descriptor : dict
+            Descriptor of the published model parameters.
+        name : str
+            Name of the method.
+        """
+        self.descriptor = descriptor
+        self.name = name
+
+def share_methods(funcs, publisher):
+    """Publishes the click models of bound methods in shared memory.
+
+    Parameters
+    ----------
+    funcs : array_like
+        Functions, bound methods of `RCM` or `PBM` are published.
+    publisher : Publisher
+        Owner of the published blocks.
+
+    Returns
+    -------
+    out : list
+        A list in which bound methods of click models are replaced
+        by `SharedMethod` stand-ins.
+    """
+    out = []
+    descriptors = {}
+    for func in funcs:
+        model = getattr(func, '__self__', None)
+        if isinstance(model, (cm.RCM, cm.PBM)):
+            if id(model) not in descriptors:
+                descriptors[id(model)] = publisher.publish(
+                    model_to_arrays(model))
+            func = SharedMethod(descriptors[id(model)], func.__name__)
+        out.append(func)
+    return out
+
+def resolve(func):
+    """Turns a `SharedMethod` back into a bound method of an attached
+    click model. Other functions are returned unchanged.
+
+    Parameters
+    ----------
+    func : function or SharedMethod
+        Function to resolve.
+
+    Returns
+    -------
+    out : function
+        Function that can be called.
+    """
+    if isinstance(func, SharedMethod):
+        return getattr(attach_model(func.descriptor), func.name)
+    return func
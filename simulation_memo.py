@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+
+import hashlib
+import json
+import sqlite3
+from functools import partial
+
+import generate_input
+
+
+# Columns of the memo table, older memos are moved aside on opening.
+MEMO_COLUMNS = ['key', 'p', 'wins_p', 'wins_e', 'ties']
+
+def get_function_key(func):
+    """Creates a description of an interleaving or click model function
+    that identifies the simulation outcomes it leads to.
+
+    Parameters
+    ----------
+    func : function
+        Plain function, bound method of a click model or a `partial`
+        of either of them.
+
+    Returns
+    -------
+    out : str
+        Name of the function, including its fixed keyword arguments
+        and a hash of the parameters of the click model it is bound to.
+        Click models describe their parameters with `get_params`.
+    """
+    if isinstance(func, partial):
+        keywords = json.dumps(func.keywords, sort_keys=True)
+        return get_function_key(func.func) + keywords
+    out = func.__module__ + '.' + func.__qualname__
+    model = getattr(func, '__self__', None)
+    if model is not None and hasattr(model, 'get_params'):
+        params = json.dumps(model.get_params(), sort_keys=True)
+        out += '@' + hashlib.sha1(params.encode()).hexdigest()
+    return out
+
+def get_memo_key(pair, k, interleaving_func, click_model_func,
+        length_interleaving=-1, seed=None, batch_index=None):
+    """Creates the memo key of a simulation.
+
+    Parameters
+    ----------
+    pair : tuple
+        Pair of ranking combinations with id conflicts.
+    k : int
+        Number of simulations.
+    interleaving_func : function(tuple) -> list
+        Function to interleave the two lists of ranking combinations.
+    click_model_func : function(array_like) -> list
+        Function to simulate user clicks.
+    length_interleaving : int
+        Length of the interleaved lists.
+    seed : int
+        Seed of the run the simulation belongs to, so runs with another
+        seed simulate again instead of reusing its outcome.
+    batch_index : int
+        Index of the batch within its task, for tasks of which the
+        simulations are spread over batches of `k` simulations.
+
+    Returns
+    -------
+    out : str
+        Key that is equal for simulations with the same settings and
+        seed of pairs that only differ in the numbering of conflicts.
+    """
+    key = [generate_input.canonical_pair(pair),
+        get_function_key(interleaving_func),
+        get_function_key(click_model_func),
+        k, length_interleaving, seed]
+    if batch_index is not None:
+        key.append(batch_index)
+    return json.dumps(key)
+
+
+class SimulationMemo:
+    """Simulation Memo
+    ===============
+
+    Persistent store of simulation results.
+
+    Results are stored in an SQLite database under a key made of
+    the canonical form of the simulated pair, the interleaving method,
+    a hash of the click model parameters, the simulation settings and
+    the seed of the run. Pairs from `add_conflicts` are already in
+    canonical form, so the memo mainly lets an interrupted or repeated
+    run with the same seed skip the tasks it finished; a run with
+    another seed simulates everything again.
+    """
+    def __init__(self, path, seed=None):
+        """Opens or creates the database.
+
+        Parameters
+        ----------
+        path : str
+            Path to the database file.
+        seed : int
+            Seed of the run of which outcomes are looked up and stored.
+        """
+        self.path = path
+        self.seed = seed
+        self.connection = sqlite3.connect(path, timeout=60)
+        with self.connection:
+            columns = [row[1] for row in
+                self.connection.execute('PRAGMA table_info(memo)')]
+            if columns != [] and columns != MEMO_COLUMNS:
+                # Memos of an older layout lack the win counts, so they
+                # are kept aside instead of being read.
+                self.connection.execute('DROP TABLE IF EXISTS memo_old')
+                self.connection.execute('ALTER TABLE memo RENAME TO memo_old')
+            self.connection.execute('CREATE TABLE IF NOT EXISTS memo '
+                '(key TEXT PRIMARY KEY, p REAL, wins_p INTEGER, '
+                'wins_e INTEGER, ties INTEGER)')
+
+    def get(self, key):
+        """Looks up a simulation result.
+
+        Parameters
+        ----------
+        key : str
+            Memo key, see `get_memo_key`.
+
+        Returns
+        -------
+        out : tuple
+            Tuple of the stored proportion of wins and a list of
+            the numbers of wins of both rankings and the number of ties.
+            Is `None` if the key is not stored.
+        """
+        row = self.connection.execute('SELECT p, wins_p, wins_e, ties '
+            'FROM memo WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        return row[0], list(row[1:])
+
+    def put(self, key, p, counts):
+        """Stores a simulation result.
+
+        Parameters
+        ----------
+        key : str
+            Memo key, see `get_memo_key`.
+        p : float
+            Proportion of wins.
+        counts : array_like
+            Numbers of wins of both rankings and number of ties.
+
+        Returns
+        -------
+        None
+        """
+        self.connection.execute('INSERT OR REPLACE INTO memo '
+            'VALUES (?, ?, ?, ?, ?)', (key, p) + tuple(counts))
+        self.connection.commit()
+        return
+
+    def close(self):
+        """Closes the database.
+
+        Returns
+        -------
+        None
+        """
+        self.connection.close()
+        return
+
+    def __getstate__(self):
+        return {'path' : self.path, 'seed' : self.seed}
+
+    def __setstate__(self, state):
+        self.__init__(state['path'], state['seed'])
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+
+from math import comb, factorial
+
+import numpy as np
+
+import batch_metrics
+import generate_input
+
+
+def sample_input_pairs_array(length, n, n_per_bin, n_bins=10, cut_sides=0.05,
+        metric=batch_metrics.err, seed=0, batch_size=2**16, max_draws=10**7):
+    """Draws distinct pairs of combinations of relevance scores,
+    stratified to reach a number of pairs in every delta bin.
+
+    Pairs are drawn uniformly and rejected when their bin is full,
+    so within a bin every pair is as likely as with `gen_input_pairs`.
+    Small input spaces are enumerated instead.
+
+    Parameters
+    ----------
+    length : int
+        Length of a combination of relevance scores.
+    n : int
+        Maximum relevance score
+    n_per_bin : int
+        Number of pairs to draw for every bin.
+    n_bins : int
+        Number of delta bins.
+    cut_sides : float
+        Amount by which first and last bin have their ranges cut.
+    metric : function(numpy array) -> numpy array
+        Metric of which the delta is binned, see `batch_metrics`.
+    seed : int
+        Seed of the draws.
+    batch_size : int
+        Number of pairs drawn at once.
+    max_draws : int
+        Number of draws after which bins that are rare or empty
+        are left with fewer pairs.
+
+    Returns
+    -------
+    pairs : numpy array
+        Array of shape (number of pairs, 2, length) of the drawn pairs,
+        sorted by bin and then in order of drawing.
+    bin_indices : numpy array
+        Bin index of every pair.
+    """
+    rng = np.random.default_rng(np.random.SeedSequence(seed))
+    total = generate_input.count_input_pairs(length, n)
+    if total <= batch_size:
+        # Draw from all pairs without replacement.
+        pairs = generate_input.get_input_pairs_array(length, n)
+        pairs = pairs[rng.permutation(total)]
+        bin_indices = batch_metrics.get_bin_indices(
+            batch_metrics.get_deltas(pairs, metric), n_bins, cut_sides)
+        chosen = [np.flatnonzero(bin_indices == b)[:n_per_bin]
+            for b in range(n_bins)]
+    else:
+        seen = set()
+        # Only the accepted pairs are kept, not the batches they came from.
+        found = [[] for _ in range(n_bins)]
+        n_draws = 0
+        while n_draws < max_draws and min(map(len, found)) < n_per_bin:
+            batch = rng.integers(0, n, (batch_size, 2, length), dtype=np.int8)
+            bin_indices = batch_metrics.get_bin_indices(
+                batch_metrics.get_deltas(batch, metric), n_bins, cut_sides)
+            # Bins that are full are given index -1 as well.
+            full = np.array([len(found_b) >= n_per_bin for found_b in found]
+                + [True])
+            for l in np.flatnonzero(~full[bin_indices]):
+                b = bin_indices[l]
+                key = batch[l].tobytes()
+                if len(found[b]) < n_per_bin and key not in seen:
+                    seen.add(key)
+                    found[b].append(batch[l].copy())
+            n_draws += batch_size
+        pairs = np.array([pair for found_b in found for pair in found_b],
+            dtype=np.int8).reshape(-1, 2, length)
+        ends = np.cumsum([len(found_b) for found_b in found])
+        chosen = [np.arange(end - len(found_b), end)
+            for end, found_b in zip(ends, found)]
+    order = np.concatenate(chosen).astype(np.int64)
+    bin_indices = np.repeat(np.arange(n_bins), [len(c) for c in chosen])
+    return pairs[order].reshape(-1, 2, length), bin_indices
+
+def sample_input_pairs(length, n, n_per_bin, n_bins=10, cut_sides=0.05,
+        metric=batch_metrics.err, seed=0):
+    """Draws pairs of combinations of relevance scores stratified by
+    delta bin, see `sample_input_pairs_array`.
+
+    Parameters
+    ----------
+    length : int
+        Length of a combination of relevance scores.
+    n : int
+        Maximum relevance score
+    n_per_bin : int
+        Number of pairs to draw for every bin.
+    n_bins : int
+        Number of delta bins.
+    cut_sides : float
+        Amount by which first and last bin have their ranges cut.
+    metric : function(numpy array) -> numpy array
+        Metric of which the delta is binned, see `batch_metrics`.
+    seed : int
+        Seed of the draws.
+
+    Returns
+    -------
+    out : list
+        A list of tuples of two lists of relevance scores,
+        in the format of `generate_input.gen_input_pairs`.
+    """
+    pairs, _ = sample_input_pairs_array(length, n, n_per_bin, n_bins,
+        cut_sides, metric, seed)
+    return [(pair[0].tolist(), pair[1].tolist()) for pair in pairs]
+
+
+def _get_grade_ranks(pair):
+    # Ranks of every relevance grade in both rankings.
+    out = {}
+    for i, ranking in enumerate(pair):
+        for rank, grade in enumerate(ranking):
+            out.setdefault(grade, ([], []))[i].append(rank)
+    return out
+
+def _get_conflict_weights(a, b):
+    # Number of ways to create k conflicts between a and b documents
+    # of the same grade, for every k.
+    return [comb(a, k) * comb(b, k) * factorial(k)
+        for k in range(min(a, b) + 1)]
+
+def count_conflicts(pair):
+    """Counts the tuples created by `generate_input.add_conflicts`
+    without creating them.
+
+    Parameters
+    ----------
+    pair : tuple
+        Tuple of combinations of relevance grades.
+
+    Returns
+    -------
+    out : int
+        Number of ways to add id conflicts to the pair.
+    """
+    out = 1
+    for ranks0, ranks1 in _get_grade_ranks(pair).values():
+        out *= sum(_get_conflict_weights(len(ranks0), len(ranks1)))
+    return out
+
+def draw_conflicts(pair, rng):
+    """Draws one of the tuples of `generate_input.add_conflicts`
+    uniformly without creating the others.
+
+    Conflicts between documents of different grades are independent,
+    so for every grade the number of conflicts is drawn in proportion
+    to the number of ways to create them, after which the ranks and
+    the matching of the conflicting documents are drawn uniformly.
+
+    Parameters
+    ----------
+    pair : tuple
+        Tuple of combinations of relevance grades.
+    rng : numpy Generator
+        Random number generator.
+
+    Returns
+    -------
+    out : tuple
+        Tuple of combinations of relevance grades with id conflicts.
+    """
+    ids0 = [0] * len(pair[0])
+    ids1 = [0] * len(pair[1])
+    matches = []
+    for ranks0, ranks1 in _get_grade_ranks(pair).values():
+        weights = _get_conflict_weights(len(ranks0), len(ranks1))
+        k = rng.choice(len(weights), p=np.array(weights) / float(sum(weights)))
+        chosen0 = rng.choice(ranks0, k, replace=False)
+        chosen1 = rng.choice(ranks1, k, replace=False)
+        matches += zip(chosen0.tolist(), chosen1.tolist())
+    # Number conflicts in order of appearance in the first ranking.
+    for _id, (rank0, rank1) in enumerate(sorted(matches), 1):
+        ids0[rank0] = _id
+        ids1[rank1] = _id
+    return (list(zip(pair[0], ids0)), list(zip(pair[1], ids1)))
+
+def sample_conflicts(pair, k, seed=0):
+    """Draws distinct tuples of `generate_input.add_conflicts` uniformly.
+    All tuples are returned if there are no more than `k`.
+
+    Parameters
+    ----------
+    pair : tuple
+        Tuple of combinations of relevance grades.
+    k : int
+        Number of tuples to draw.
+    seed : int
+        Seed of the draws, combined with the relevance grades of the pair
+        so that every pair gets its own draws.
+
+    Returns
+    -------
+    out : list
+        A list of tuples of combinations of relevance grades
+        with id conflicts.
+    """
+    total = count_conflicts(pair)
+    if total <= k:
+        return generate_input.add_conflicts(pair)
+    rng = np.random.default_rng(np.random.SeedSequence(
+        [seed] + [int(r) for ranking in pair for r in ranking]))
+    if total <= 4 * k:
+        # Rejecting duplicates would be slow, choose from all instead.
+        out = generate_input.add_conflicts(pair)
+        return [out[l] for l in sorted(rng.choice(total, k, replace=False))]
+    out = []
+    seen = set()
+    while len(out) < k:
+        permutation = draw_conflicts(pair, rng)
+        key = generate_input.canonical_pair(permutation)
+        if key not in seen:
+            seen.add(key)
+            out.append(permutation)
+    return out
+
+
+def main():
+    length = 8
+    n = 3
+    pairs, bin_indices = sample_input_pairs_array(length, n, 100)
+    print(generate_input.count_input_pairs(length, n), 'pairs in total')
+    print('pairs per bin:', np.bincount(bin_indices, minlength=10).tolist())
+    pair = (pairs[0][0].tolist(), pairs[0][1].tolist())
+    print('\nConflicts of', pair, ':', count_conflicts(pair))
+    for permutation in sample_conflicts(pair, 5):
+        print(permutation)
+    return
+
+
+if __name__ == '__main__':
+    main()
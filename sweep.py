@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+import numpy as np
+
+import batch_metrics
+import generate_input
+import power_analysis as pa
+import random_streams
+import shared_data
+import simulation_memo
+
+
+# Settings shared by all tasks run in the current process.
+_worker = {}
+
+
+def get_tasks(inputs, n_click_models, n_interleavings, n_bins=10,
+        cut_sides=0.05, metric=batch_metrics.err, chunk_size=4096,
+        conflicts_func=generate_input.add_conflicts, packed=False):
+    """Creates independent simulation tasks for all permutations
+    of the input pairs that fall within the delta ERR bins.
+
+    Parameters
+    ----------
+    inputs : iterable
+        Pairs of combinations of relevance grades, such as created
+        by `generate_input.iter_input_pairs`.
+    n_click_models : int
+        Number of click models to simulate with.
+    n_interleavings : int
+        Number of interleaving methods to simulate with.
+    n_bins : int
+        Number of delta ERR bins.
+    cut_sides : float
+        Amount by which first and last bin have their ranges cut.
+    metric : function(numpy array) -> numpy array
+        Metric of which the delta is binned, see `batch_metrics`.
+    chunk_size : int
+        Number of input pairs of which the metric is computed at once.
+    conflicts_func : function(tuple) -> list
+        Function that creates the permutations of an input pair,
+        such as `stratified_sampler.sample_conflicts`.
+    packed : bool
+        Whether to pack the permutations of every input pair into one
+        array, tasks then hold views of it, see
+        `generate_input.pack_permutations`.
+
+    Returns
+    -------
+    out : list
+        A list of tasks in the order of the nested simulation loops.
+        Each task is a tuple of the task id, the click model index,
+        the interleaving method index, the bin index, delta ERR
+        and the permutation to simulate.
+    """
+    out = []
+    inputs = iter(inputs)
+    chunk = list(islice(inputs, chunk_size))
+    while chunk != []:
+        deltas = batch_metrics.get_deltas(np.array(chunk), metric)
+        bin_indices = batch_metrics.get_bin_indices(deltas, n_bins, cut_sides)
+        for pair, dERR, bin_index in zip(chunk, deltas, bin_indices):
+            if bin_index < 0:
+                continue
+            permutations = conflicts_func(pair)
+            if packed:
+                permutations = generate_input.pack_permutations(
+                    permutations, len(pair[0]))
+            for i in range(n_click_models):
+                for j in range(n_interleavings):
+                    for permutation in permutations:
+                        out.append((len(out), i, j, int(bin_index),
+                            float(dERR), permutation))
+        chunk = list(islice(inputs, chunk_size))
+    return out
+
+def seed_task(root_seed, task_id, *keys):
+    """Seeds the random stream of the current process for one task,
+    see `random_streams.seed`.
+
+    The seed only depends on the root seed, the task id and any
+    further keys, so results do not depend on which worker runs the task.
+
+    Parameters
+    ----------
+    root_seed : int
+        Seed of the whole sweep.
+    task_id : int
+        Id of the task.
+    keys : int
+        Further keys, such as the index of a batch of simulations
+        of the task.
+
+    Returns
+    -------
+    None
+    """
+    random_streams.seed(root_seed, task_id, *keys)
+    return
+
+def init_worker(click_model_fs, interleaving_fs, n_simulations,
+        length_interleaving, root_seed=0, memo=None):
+    """Stores the settings shared by all tasks in the current process.
+
+    Parameters
+    ----------
+    click_model_fs : array_like
+        Functions to simulate user clicks, may be stand-ins for methods
+        of click models in shared memory, see `shared_data.resolve`.
+    interleaving_fs : array_like
+        Functions to interleave pairs of ranking combinations.
+    n_simulations : int
+        Number of simulations per task.
+    length_interleaving : int
+        Length of the interleaved lists.
+    root_seed : int
+        Seed of the whole sweep.
+    memo : SimulationMemo
+        Store of earlier simulation results. Is ignored if `None`.
+
+    Returns
+    -------
+    None
+    """
+    _worker['click_model_fs'] = [shared_data.resolve(click_model_f)
+        for click_model_f in click_model_fs]
+    _worker['interleaving_fs'] = interleaving_fs
+    _worker['n_simulations'] = n_simulations
+    _worker['length_interleaving'] = length_interleaving
+    _worker['root_seed'] = root_seed
+    _worker['memo'] = memo
+    return
+
+def run_task(task):
+    """Simulates one task with the settings of the current process.
+
+    Parameters
+    ----------
+    task : tuple
+        Task as created by `get_tasks`.
+
+    Returns
+    -------
+    out : tuple
+        Tuple of the task id, the click model index, the interleaving
+        method index, the bin index, the proportion of wins `p` and
+        the numbers of wins and ties, see `interleaving_simulation`.
+    """
+    task_id, i, j, bin_index, dERR, permutation = task
+    seed_task(_worker['root_seed'], task_id)
+    p, counts = pa.interleaving_simulation(permutation,
+        _worker['n_simulations'], _worker['interleaving_fs'][j],
+        _worker['click_model_fs'][i], _worker['length_interleaving'],
+        _worker['memo'], return_counts=True)
+    return task_id, i, j, bin_index, p, counts
+
+def run_task_timed(task):
+    """Simulates one task like `run_task` and measures its time
+    in the process that runs it.
+
+    Parameters
+    ----------
+    task : tuple
+        Task as created by `get_tasks`.
+
+    Returns
+    -------
+    out : tuple
+        Result of `run_task` followed by the seconds it took.
+    """
+    start = time.perf_counter()
+    out = run_task(task)
+    return out + (time.perf_counter() - start,)
+
+def split_memo_hits(tasks, memo, click_model_fs, interleaving_fs,
+        n_simulations, length_interleaving):
+    """Looks up tasks in a memo, so tasks of which the outcome is stored
+    are neither simulated nor counted as simulations.
+
+    Parameters
+    ----------
+    tasks : array_like
+        Tasks as created by `get_tasks`.
+    memo : SimulationMemo
+        Store of earlier simulation results.
+    click_model_fs : array_like
+        Functions to simulate user clicks.
+    interleaving_fs : array_like
+        Functions to interleave pairs of ranking combinations.
+    n_simulations : int
+        Number of simulations per task.
+    length_interleaving : int
+        Length of the interleaved lists.
+
+    Returns
+    -------
+    hits : list
+        A list of task results, see `run_task`, of the stored tasks.
+    todo : list
+        A list of the tasks that are not stored.
+    """
+    hits = []
+    todo = []
+    for task in tasks:
+        task_id, i, j, bin_index, dERR, permutation = task
+        key = simulation_memo.get_memo_key(permutation, n_simulations,
+            interleaving_fs[j], click_model_fs[i], length_interleaving,
+            memo.seed)
+        stored = memo.get(key)
+        if stored is None:
+            todo.append(task)
+        else:
+            hits.append((task_id, i, j, bin_index) + stored)
+    return hits, todo
+
+def run_batch(batch):
+    """Simulates one batch of a task with the settings of the current
+    process, for schedulers that spread the simulations of a task over
+    several batches. Batches are memoized by their index, so a schedule
+    that is run again only simulates the batches it did not finish.
+
+    Parameters
+    ----------
+    batch : tuple
+        Tuple of a task as created by `get_tasks`, the number
+        of simulations and the index of the batch within the task.
+
+    Returns
+    -------
+    out : tuple
+        Tuple of the task id, the batch index and the numbers of wins
+        and ties, see `interleaving_simulation`.
+    """
+    task, n_simulations, batch_index = batch
+    task_id, i, j, bin_index, dERR, permutation = task
+    interleaving_func = _worker['interleaving_fs'][j]
+    click_model_func = _worker['click_model_fs'][i]
+    memo = _worker['memo']
+    if memo is not None:
+        key = simulation_memo.get_memo_key(permutation, n_simulations,
+            interleaving_func, click_model_func,
+            _worker['length_interleaving'], memo.seed, batch_index)
+        stored = memo.get(key)
+        if stored is not None:
+            return task_id, batch_index, stored[1]
+    seed_task(_worker['root_seed'], task_id, batch_index)
+    p, counts = pa.interleaving_simulation(permutation, n_simulations,
+        interleaving_func, click_model_func, _worker['length_interleaving'],
+        return_counts=True)
+    if memo is not None:
+        memo.put(key, p, counts)
+    return task_id, batch_index, counts
+
+def run_sweep(tasks, click_model_fs, interleaving_fs, n_simulations,
+        length_interleaving, n_workers=None, chunksize=16, root_seed=0,
+        memo=None, func=run_task, shared=True):
+    """Runs simulation tasks on a pool of processes.
+
+    Parameters
+    ----------
+    tasks : array_like
+        Tasks as created by `get_tasks`.
+    click_model_fs : array_like
+        Functions to simulate user clicks.
+    interleaving_fs : array_like
+        Functions to interleave pairs of ranking combinations.
+    n_simulations : int
+        Number of simulations per task.
+    length_interleaving : int
+        Length of the interleaved lists.
+    n_workers : int
+        Number of worker processes. Defaults to the number of cores,
+        tasks are run in the current process if 1.
+    chunksize : int
+        Number of tasks sent to a worker at once.
+    root_seed : int
+        Seed of the whole sweep.
+    memo : SimulationMemo
+        Store of earlier simulation results. Is ignored if `None`.
+    func : function(tuple) -> tuple
+        Function that runs a task, `run_task` or `run_batch`.
+    shared : bool
+        Whether to publish the click models in shared memory once
+        instead of copying them into every worker.
+
+    Returns
+    -------
+    out : generator
+        Generator of task results, see `run_task`, in task order.
+        Results do not depend on the number of workers.
+    """
+    if n_workers == 1:
+        init_worker(click_model_fs, interleaving_fs, n_simulations,
+            length_interleaving, root_seed, memo)
+        for task in tasks:
+            yield func(task)
+        return
+    with shared_data.Publisher() as publisher:
+        if shared:
+            click_model_fs = shared_data.share_methods(click_model_fs,
+                publisher)
+        settings = (click_model_fs, interleaving_fs, n_simulations,
+            length_interleaving, root_seed, memo)
+        with ProcessPoolExecutor(n_workers, initializer=init_worker,
+                initargs=settings) as executor:
+            for result in executor.map(func, tasks, chunksize=chunksize):
+                yield result
+    return
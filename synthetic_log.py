@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+
+import argparse
+
+import numpy as np
+
+import click_model_v2 as cm
+
+
+class SyntheticLog:
+    """Synthetic Click Log
+    ===================
+
+    Generator of click logs in the format read by
+    `click_model_v2.read_yandex`, with known click model parameters.
+
+    Every query has a fixed list of distinct result urls and every
+    url an attractiveness `alpha` for that query. Queries are drawn
+    from a Zipfian distribution, so a few queries are frequent and
+    most are rare, and users click as in `PBM`, in which rank `r` is
+    examined with probability `gammas[r]`, or as in `RCM`, in which
+    every result is clicked with probability `rho`. Lines are
+    generated in batches of sessions, so logs of any size can be
+    streamed to disk.
+    """
+    def __init__(self, n_queries=10000, n_urls=10, n_distinct_urls=1000000,
+            zipf_s=1.1, gammas=(1.0, 0.7, 0.5, 0.4, 0.3, 0.25, 0.2, 0.15,
+            0.12, 0.1), alphas=None, rho=None, queries_per_session=2.0,
+            seed=0):
+        """Initializes class parameters.
+
+        Parameters
+        ----------
+        n_queries : int
+            Number of different queries.
+        n_urls : int
+            Number of results of a query.
+        n_distinct_urls : int
+            Number of different urls that results are drawn from.
+        zipf_s : float
+            Exponent of the Zipfian distribution of queries, query `q`
+            is drawn with probability proportional to `(q + 1)**-zipf_s`.
+        gammas : array_like
+            Probability of examining every rank with `PBM`.
+        alphas : numpy array
+            Attractiveness of every result, of shape (n_queries, n_urls).
+            Is drawn uniformly if `None`.
+        rho : float
+            Click probability of `RCM`. Clicks follow `PBM` if `None`.
+        queries_per_session : float
+            Average number of queries in a session.
+        seed : int
+            Seed of the parameters and the log.
+        """
+        if len(gammas) != n_urls:
+            raise ValueError('gammas must have a value for every rank')
+        self.rng = np.random.default_rng(np.random.SeedSequence(seed))
+        self.n_urls = n_urls
+        self.gammas = np.asarray(gammas, dtype=float)
+        self.rho = rho
+        self.queries_per_session = queries_per_session
+        self.urls = self.get_results(n_queries, n_urls, n_distinct_urls)
+        if alphas is None:
+            alphas = self.rng.random((n_queries, n_urls))
+        self.alphas = np.asarray(alphas, dtype=float)
+        weights = (np.arange(n_queries) + 1.0) ** -zipf_s
+        self.query_cdf = np.cumsum(weights) / weights.sum()
+        self.session_id = 0
+
+    def get_results(self, n_queries, n_urls, n_distinct_urls):
+        """Draws distinct result urls for every query.
+
+        Parameters
+        ----------
+        n_queries : int
+            Number of different queries.
+        n_urls : int
+            Number of results of a query.
+        n_distinct_urls : int
+            Number of different urls.
+
+        Returns
+        -------
+        out : numpy array
+            Url ids of shape (n_queries, n_urls).
+        """
+        if n_distinct_urls < n_urls:
+            raise ValueError('n_distinct_urls must be at least n_urls')
+        out = self.rng.integers(0, n_distinct_urls, (n_queries, n_urls))
+        # Clicks are matched to results by url id,
+        # so duplicates within a result list are redrawn.
+        duplicates = np.flatnonzero([len(set(row)) < n_urls for row in out])
+        for q in duplicates:
+            out[q] = self.rng.choice(n_distinct_urls, n_urls, replace=False)
+        return out
+
+    def get_click_probabilities(self, query_ids):
+        """Determines the click probability of every result.
+
+        Parameters
+        ----------
+        query_ids : numpy array
+            Ids of the queries.
+
+        Returns
+        -------
+        out : numpy array
+            Click probabilities of shape (number of queries, n_urls).
+        """
+        if self.rho is not None:
+            return np.full((len(query_ids), self.n_urls), self.rho)
+        return self.gammas * self.alphas[query_ids]
+
+    def iter_lines(self, n_sessions, batch_size=10000):
+        """Generates the lines of a log.
+
+        Parameters
+        ----------
+        n_sessions : int
+            Number of sessions to generate.
+        batch_size : int
+            Number of sessions generated at once.
+
+        Returns
+        -------
+        out : generator
+            Tab separated lines ending in a newline. Session ids continue
+            from earlier calls.
+        """
+        for start in range(0, n_sessions, batch_size):
+            n = min(batch_size, n_sessions - start)
+            lengths = self.rng.geometric(1.0 / self.queries_per_session, n)
+            query_ids = np.searchsorted(self.query_cdf,
+                self.rng.random(lengths.sum()), side='right')
+            query_ids = np.minimum(query_ids, len(self.query_cdf) - 1)
+            clicked = self.rng.random((len(query_ids), self.n_urls)) \
+                < self.get_click_probabilities(query_ids)
+            urls = self.urls[query_ids].tolist()
+            clicked = clicked.tolist()
+            l = 0
+            for length in lengths.tolist():
+                session = str(self.session_id)
+                t = 0
+                for _ in range(length):
+                    q_id = int(query_ids[l])
+                    yield session + '\t' + str(t) + '\tQ\t' + str(q_id) \
+                        + '\t0\t' + '\t'.join(map(str, urls[l])) + '\n'
+                    t += 1
+                    for url, click in zip(urls[l], clicked[l]):
+                        if click:
+                            yield session + '\t' + str(t) + '\tC\t' \
+                                + str(url) + '\n'
+                            t += 1
+                    l += 1
+                self.session_id += 1
+
+    def write(self, path, n_sessions, batch_size=10000):
+        """Writes a log to a file.
+
+        Parameters
+        ----------
+        path : str
+            Path of the log file.
+        n_sessions : int
+            Number of sessions to write.
+        batch_size : int
+            Number of sessions generated at once.
+
+        Returns
+        -------
+        n_lines : int
+            Number of lines written.
+        """
+        n_lines = 0
+        with open(path, 'w') as f:
+            for start in range(0, n_sessions, batch_size):
+                lines = list(self.iter_lines(
+                    min(batch_size, n_sessions - start), batch_size))
+                f.writelines(lines)
+                n_lines += len(lines)
+        return n_lines
+
+
+def write_log(path, n_sessions, seed=0, **kwargs):
+    """Writes a synthetic log, see `SyntheticLog`.
+
+    Parameters
+    ----------
+    path : str
+        Path of the log file.
+    n_sessions : int
+        Number of sessions to write.
+    seed : int
+        Seed of the parameters and the log.
+    kwargs : dict
+        Further parameters of `SyntheticLog`.
+
+    Returns
+    -------
+    n_lines : int
+        Number of lines written.
+    """
+    return SyntheticLog(seed=seed, **kwargs).write(path, n_sessions)
+
+def check_recovery(path, n_sessions=20000, n_rank=3, seed=0, **kwargs):
+    """Writes a synthetic log, learns a `PBM` on it and compares
+    the learned parameters with the known ones.
+
+    The clicks of `PBM` only determine the products of gammas and
+    alphas, so the learned gammas are compared after scaling them
+    to the known gamma of the first rank, and the click probabilities
+    are compared for every query and result up to rank `n_rank`.
+
+    Parameters
+    ----------
+    path : str
+        Path of the log file.
+    n_sessions : int
+        Number of sessions to write.
+    n_rank : int
+        Maximum rank at which parameters are learned.
+    seed : int
+        Seed of the parameters and the log.
+    kwargs : dict
+        Further parameters of `SyntheticLog`.
+
+    Returns
+    -------
+    out : dict
+        A dictionary containing the known and learned `gammas`,
+        the learned gammas after scaling `scaled_gammas`, and the
+        mean absolute error of the click probabilities `click_mae`,
+        weighted by how often each query occurs in the log.
+    """
+    log = SyntheticLog(seed=seed, **kwargs)
+    log.write(path, n_sessions)
+    pbm = cm.PBM()
+    pbm.learn(cm.read_yandex(path), 3, 5, n_rank)
+    gammas = np.array(pbm.gammas[:n_rank])
+    known = log.gammas[:n_rank]
+    errors = []
+    weights = []
+    for q_id, urls in enumerate(log.urls.tolist()):
+        learned = [pbm.alphas.get(str((url, q_id))) for url in urls[:n_rank]]
+        if None in learned:
+            continue
+        errors.append(np.abs(gammas * learned
+            - known * log.alphas[q_id, :n_rank]).mean())
+        weights.append(log.query_cdf[q_id]
+            - (log.query_cdf[q_id - 1] if q_id > 0 else 0))
+    return {
+        'gammas' : known.tolist(),
+        'learned_gammas' : gammas.tolist(),
+        'scaled_gammas' : (gammas * known[0] / gammas[0]).tolist(),
+        'click_mae' : float(np.average(errors, weights=weights))
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Writes a synthetic click log in the Yandex format.')
+    parser.add_argument('path', help='path of the log file')
+    parser.add_argument('n_sessions', type=int)
+    parser.add_argument('--n-queries', type=int, default=10000)
+    parser.add_argument('--zipf-s', type=float, default=1.1)
+    parser.add_argument('--gammas', type=float, nargs=10,
+        default=[1.0, 0.7, 0.5, 0.4, 0.3, 0.25, 0.2, 0.15, 0.12, 0.1])
+    parser.add_argument('--rho', type=float,
+        help='click as RCM with this probability instead of PBM')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--check', action='store_true',
+        help='learn a PBM on the log and compare it with the known gammas')
+    args = parser.parse_args()
+    kwargs = {'n_queries' : args.n_queries, 'zipf_s' : args.zipf_s,
+        'gammas' : args.gammas, 'rho' : args.rho}
+    if args.check:
+        out = check_recovery(args.path, args.n_sessions, seed=args.seed,
+            **kwargs)
+        for key, value in out.items():
+            print(key, value)
+    else:
+        print(write_log(args.path, args.n_sessions, args.seed, **kwargs),
+            'lines written')
+    return
+
+
+if __name__ == '__main__':
+    main()
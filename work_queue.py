@@ -0,0 +1,463 @@
+#!/usr/bin/env python3
+
+import argparse
+import hashlib
+import os
+import pickle
+import socket
+import sqlite3
+import time
+import traceback
+
+import sweep
+from instrumentation import metrics
+
+
+class WorkQueue:
+    """Work Queue
+    ==========
+
+    Queue of sweep tasks shared by any number of worker processes
+    on any number of machines.
+
+    Tasks, results and the settings shared by all tasks are stored
+    in an SQLite database. Workers lease a batch of tasks for a limited
+    time. Tasks of which the lease expires, for example because
+    the worker crashed, are handed out again until they have been
+    attempted `max_attempts` times. Workers renew the leases of their
+    batch before every task. Tasks and results belong to a generation,
+    the hash of the settings they were filled with, and a result is
+    only stored from the worker that holds the lease of the task in
+    the current generation, so a task that is finished by two workers
+    or by a worker with outdated settings is harmless.
+    On a shared filesystem the database needs working file locks
+    (as on NFS with lock support).
+    """
+    def __init__(self, path, lease_seconds=600, max_attempts=3):
+        """Opens or creates the queue.
+
+        Parameters
+        ----------
+        path : str
+            Path to the database file.
+        lease_seconds : float
+            Time after which leased tasks are handed out again.
+        max_attempts : int
+            Number of times a task is handed out before it is marked
+            as failed.
+        """
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.connection = sqlite3.connect(path, timeout=60,
+            isolation_level=None)
+        columns = [row[1] for row in
+            self.connection.execute('PRAGMA table_info(tasks)')]
+        if columns != [] and 'generation' not in columns:
+            # Queues of an older layout are only a cache of unfinished
+            # work, so they are dropped.
+            for table in ('tasks', 'results', 'meta'):
+                self.connection.execute('DROP TABLE IF EXISTS ' + table)
+        self.connection.execute('CREATE TABLE IF NOT EXISTS tasks '
+            '(task_id INTEGER PRIMARY KEY, task BLOB, status TEXT, '
+            'owner TEXT, lease_expires REAL, attempts INTEGER, '
+            'generation TEXT)')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS results '
+            '(task_id INTEGER PRIMARY KEY, result BLOB, generation TEXT)')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS meta '
+            '(key TEXT PRIMARY KEY, value BLOB)')
+
+    def put_meta(self, key, value):
+        """Stores a value shared by all workers.
+
+        Parameters
+        ----------
+        key : str
+            Name of the value.
+        value : object
+            Picklable value.
+
+        Returns
+        -------
+        None
+        """
+        self.connection.execute('INSERT OR REPLACE INTO meta VALUES (?, ?)',
+            (key, pickle.dumps(value)))
+        return
+
+    def get_meta(self, key):
+        """Looks up a value shared by all workers.
+
+        Parameters
+        ----------
+        key : str
+            Name of the value.
+
+        Returns
+        -------
+        value : object
+            Stored value, `None` if the key is not stored.
+        """
+        row = self.connection.execute(
+            'SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        return pickle.loads(row[0])
+
+    def put_tasks(self, tasks):
+        """Adds tasks to the queue. Tasks with an id that is already
+        in the queue are ignored, so the queue can be filled again
+        after a restart.
+
+        Parameters
+        ----------
+        tasks : array_like
+            Tasks as created by `sweep.get_tasks`.
+
+        Returns
+        -------
+        None
+        """
+        self.connection.execute('BEGIN IMMEDIATE')
+        self._insert_tasks(tasks, self.get_meta('generation'))
+        self.connection.execute('COMMIT')
+        return
+
+    def _insert_tasks(self, tasks, generation):
+        self.connection.executemany('INSERT OR IGNORE INTO tasks '
+            'VALUES (?, ?, \'pending\', NULL, NULL, 0, ?)',
+            ((task[0], pickle.dumps(task), generation) for task in tasks))
+
+    def get_settings(self):
+        """Looks up the settings shared by all tasks and their generation.
+
+        Returns
+        -------
+        settings : tuple
+            Arguments of `sweep.init_worker`, `None` if the queue
+            has not been filled.
+        generation : str
+            Hash of the settings, `None` if the queue has not been filled.
+        """
+        rows = dict(self.connection.execute('SELECT key, value FROM meta '
+            'WHERE key IN (\'settings\', \'generation\')').fetchall())
+        if 'settings' not in rows or 'generation' not in rows:
+            return None, None
+        return pickle.loads(rows['settings']), pickle.loads(rows['generation'])
+
+    def fill(self, tasks, settings):
+        """Adds tasks and their settings in one transaction.
+
+        The settings are stored after the tasks, so a worker that finds
+        them never sees the queue as drained before it was filled.
+        A queue that holds tasks of other settings is cleared first,
+        so results of an earlier sweep are not returned again.
+
+        Parameters
+        ----------
+        tasks : array_like
+            Tasks as created by `sweep.get_tasks`.
+        settings : tuple
+            Arguments of `sweep.init_worker` shared by all tasks.
+
+        Returns
+        -------
+        None
+        """
+        value = pickle.dumps(settings)
+        generation = hashlib.sha1(value).hexdigest()
+        self.connection.execute('BEGIN IMMEDIATE')
+        if self.get_meta('generation') != generation:
+            for table in ('tasks', 'results', 'meta'):
+                self.connection.execute('DELETE FROM ' + table)
+        self._insert_tasks(tasks, generation)
+        self.connection.executemany('INSERT OR REPLACE INTO meta '
+            'VALUES (?, ?)', [('settings', value),
+            ('generation', pickle.dumps(generation))])
+        self.connection.execute('COMMIT')
+        return
+
+    def lease(self, owner, n=16):
+        """Leases pending tasks and tasks of which the lease expired.
+
+        Parameters
+        ----------
+        owner : str
+            Name of the worker.
+        n : int
+            Maximum number of tasks to lease.
+
+        Returns
+        -------
+        out : list
+            A list of tuples of a leased task and its generation.
+        """
+        now = time.time()
+        self.connection.execute('BEGIN IMMEDIATE')
+        # Leases that are renewed do not expire, so only tasks of which
+        # every attempt was abandoned are marked as failed.
+        self.connection.execute('UPDATE tasks SET status = \'failed\' '
+            'WHERE status = \'leased\' AND lease_expires < ? '
+            'AND attempts >= ?', (now, self.max_attempts))
+        rows = self.connection.execute('SELECT task_id, task, generation '
+            'FROM tasks WHERE status = \'pending\' OR (status = \'leased\' '
+            'AND lease_expires < ?) ORDER BY task_id LIMIT ?',
+            (now, n)).fetchall()
+        self.connection.executemany('UPDATE tasks SET status = \'leased\', '
+            'owner = ?, lease_expires = ?, attempts = attempts + 1 '
+            'WHERE task_id = ?',
+            ((owner, now + self.lease_seconds, task_id)
+            for task_id, _, _ in rows))
+        self.connection.execute('COMMIT')
+        return [(pickle.loads(task), generation)
+            for _, task, generation in rows]
+
+    def renew(self, task_ids, owner):
+        """Extends the leases of tasks that a worker still holds.
+
+        Parameters
+        ----------
+        task_ids : array_like
+            Ids of the tasks.
+        owner : str
+            Name of the worker.
+
+        Returns
+        -------
+        out : set
+            A set of the ids of the tasks of which the lease was renewed.
+        """
+        task_ids = list(task_ids)
+        self.connection.execute('BEGIN IMMEDIATE')
+        self.connection.executemany('UPDATE tasks SET lease_expires = ? '
+            'WHERE task_id = ? AND owner = ? AND status = \'leased\'',
+            ((time.time() + self.lease_seconds, task_id, owner)
+            for task_id in task_ids))
+        rows = self.connection.execute('SELECT task_id FROM tasks '
+            'WHERE owner = ? AND status = \'leased\' AND task_id IN ('
+            + ', '.join('?' * len(task_ids)) + ')',
+            [owner] + task_ids).fetchall()
+        self.connection.execute('COMMIT')
+        return set(task_id for task_id, in rows)
+
+    def complete(self, task_id, owner, generation, result):
+        """Stores the result of a task and marks it as done, if the worker
+        still holds the lease of the task in the current generation.
+
+        Parameters
+        ----------
+        task_id : int
+            Id of the task.
+        owner : str
+            Name of the worker that leased the task.
+        generation : str
+            Generation of the settings the task was run with.
+        result : object
+            Picklable result of the task.
+
+        Returns
+        -------
+        out : bool
+            Whether the result was stored.
+        """
+        self.connection.execute('BEGIN IMMEDIATE')
+        stored = self.connection.execute('UPDATE tasks SET status = '
+            '\'done\' WHERE task_id = ? AND owner = ? AND generation = ? '
+            'AND status = \'leased\'',
+            (task_id, owner, generation)).rowcount == 1
+        if stored:
+            self.connection.execute('INSERT OR REPLACE INTO results '
+                'VALUES (?, ?, ?)', (task_id, pickle.dumps(result),
+                generation))
+        self.connection.execute('COMMIT')
+        return stored
+
+    def release(self, task_id, owner):
+        """Hands a leased task back after it failed, or marks it
+        as failed when it has been attempted too often.
+
+        Parameters
+        ----------
+        task_id : int
+            Id of the task.
+        owner : str
+            Name of the worker that leased the task.
+
+        Returns
+        -------
+        None
+        """
+        self.connection.execute('UPDATE tasks SET status = CASE '
+            'WHEN attempts >= ? THEN \'failed\' ELSE \'pending\' END '
+            'WHERE task_id = ? AND owner = ? AND status = \'leased\'',
+            (self.max_attempts, task_id, owner))
+        return
+
+    def get_counts(self):
+        """Counts tasks per status.
+
+        Returns
+        -------
+        out : dict
+            A dictionary mapping statuses to numbers of tasks.
+        """
+        return dict(self.connection.execute(
+            'SELECT status, COUNT(*) FROM tasks GROUP BY status').fetchall())
+
+    def is_drained(self):
+        """Checks whether every task is done or failed.
+
+        Returns
+        -------
+        out : bool
+            `True` if no task is pending or leased.
+        """
+        counts = self.get_counts()
+        return counts.get('pending', 0) + counts.get('leased', 0) == 0
+
+    def get_results(self):
+        """Reads the results of all tasks finished in the current
+        generation.
+
+        Returns
+        -------
+        out : list
+            A list of results in task order.
+        """
+        rows = self.connection.execute('SELECT result FROM results '
+            'WHERE generation = ? ORDER BY task_id',
+            (self.get_meta('generation'),)).fetchall()
+        return [pickle.loads(result) for result, in rows]
+
+    def close(self):
+        """Closes the database.
+
+        Returns
+        -------
+        None
+        """
+        self.connection.close()
+        return
+
+
+def coordinate(path, tasks, settings, poll=5.0):
+    """Fills a queue with sweep tasks and waits until workers drained it.
+
+    Parameters
+    ----------
+    path : str
+        Path to the queue database.
+    tasks : array_like
+        Tasks as created by `sweep.get_tasks`.
+    settings : tuple
+        Arguments of `sweep.init_worker` shared by all tasks.
+    poll : float
+        Seconds between checks of the queue.
+
+    Returns
+    -------
+    out : list
+        A list of task results, see `sweep.run_task`, in task order.
+        Failed tasks have no result.
+    """
+    queue = WorkQueue(path)
+    queue.fill(tasks, settings)
+    while not queue.is_drained():
+        counts = queue.get_counts()
+        metrics.emit('queue', done=counts.get('done', 0), total=len(tasks))
+        time.sleep(poll)
+    counts = queue.get_counts()
+    if counts.get('failed', 0) > 0:
+        metrics.count('failed_tasks', counts['failed'])
+        metrics.emit('failed', tasks=counts['failed'])
+    # Results of tasks that were stored before a restart stay in the queue.
+    task_ids = set(task[0] for task in tasks)
+    out = [result for result in queue.get_results() if result[0] in task_ids]
+    queue.close()
+    return out
+
+def work(path, owner=None, n=16, poll=5.0, lease_seconds=600):
+    """Runs sweep tasks from a queue until it is drained.
+
+    The leases of a batch are renewed before every task, so a single
+    task must take less than `lease_seconds`.
+
+    Parameters
+    ----------
+    path : str
+        Path to the queue database.
+    owner : str
+        Name of the worker, defaults to the host name and process id.
+    n : int
+        Number of tasks leased at once.
+    poll : float
+        Seconds to wait when no task can be leased.
+    lease_seconds : float
+        Time after which tasks of a worker that stopped renewing
+        are handed out again.
+
+    Returns
+    -------
+    n_done : int
+        Number of tasks this worker finished.
+    """
+    if owner is None:
+        owner = socket.gethostname() + ':' + str(os.getpid())
+    queue = WorkQueue(path, lease_seconds)
+    settings, generation = queue.get_settings()
+    while settings is None:
+        time.sleep(poll)
+        settings, generation = queue.get_settings()
+    sweep.init_worker(*settings)
+    n_done = 0
+    while True:
+        leased = queue.lease(owner, n)
+        if leased == []:
+            if queue.is_drained():
+                break
+            time.sleep(poll)
+            continue
+        for l, (task, task_generation) in enumerate(leased):
+            # Leases of the rest of the batch are renewed, so they do not
+            # expire while earlier tasks run.
+            if task[0] not in queue.renew(
+                    [task[0] for task, _ in leased[l:]], owner):
+                continue
+            if task_generation != generation:
+                # The queue was filled again with other settings.
+                settings, generation = queue.get_settings()
+                sweep.init_worker(*settings)
+                if task_generation != generation:
+                    continue
+            try:
+                result = sweep.run_task(task)
+            except Exception:
+                traceback.print_exc()
+                queue.release(task[0], owner)
+                continue
+            if queue.complete(task[0], owner, generation, result):
+                n_done += 1
+    queue.close()
+    return n_done
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Runs a worker on an all_combined sweep queue.')
+    parser.add_argument('path', help='path to the queue database')
+    parser.add_argument('--batch', type=int, default=16,
+        help='number of tasks leased at once')
+    parser.add_argument('--poll', type=float, default=5.0,
+        help='seconds to wait when no task can be leased')
+    parser.add_argument('--lease-seconds', type=float, default=600,
+        help='seconds after which tasks of a stopped worker are handed out '
+        'again, must exceed the time of a single task')
+    args = parser.parse_args()
+    n_done = work(args.path, n=args.batch, poll=args.poll,
+        lease_seconds=args.lease_seconds)
+    metrics.emit('worker_done', tasks=n_done)
+    return
+
+
+if __name__ == '__main__':
+    main()